@@ -0,0 +1,96 @@
+import logging
+import random
+import time
+from typing import Optional
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+
+access_logger = logging.getLogger("app.access")
+
+
+class AccessLogMiddleware:
+    """
+    Pure ASGI middleware logging one record per HTTP request.
+
+    Records carry the method, path, status, request and response body sizes
+    and the duration, both in the message and as record attributes for
+    structured formatters. Only a sample of the requests is logged, except
+    server errors, which always are. Unlike a BaseHTTPMiddleware it passes
+    messages straight through, so streaming responses are unaffected.
+    """
+
+    def __init__(self, app: ASGIApp, sample_rate: Optional[float] = None):
+        """
+        Initialize the middleware.
+
+        Args:
+            app: Wrapped ASGI application
+            sample_rate: Fraction of requests logged (defaults to settings)
+        """
+        self.app = app
+        self.sample_rate = sample_rate if sample_rate is not None else settings.access_log_sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        status_code = 500
+        content_length = 0
+        bytes_in = 0
+        bytes_out = 0
+
+        async def receive_counted() -> Message:
+            nonlocal bytes_in
+            message = await receive()
+            if message["type"] == "http.request":
+                bytes_in += len(message.get("body", b""))
+            return message
+
+        async def send_counted(message: Message) -> None:
+            nonlocal status_code, content_length, bytes_out
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                for name, value in message.get("headers", ()):
+                    if name.lower() == b"content-length":
+                        content_length = int(value)
+            elif message["type"] == "http.response.body":
+                bytes_out += len(message.get("body", b""))
+            elif message["type"] == "http.response.pathsend":
+                bytes_out += content_length
+            await send(message)
+
+        try:
+            await self.app(scope, receive_counted, send_counted)
+        finally:
+            if status_code >= 500 or random.random() < self.sample_rate:
+                self._log(scope, status_code, bytes_in, bytes_out, time.perf_counter() - start_time)
+
+    @staticmethod
+    def _log(scope: Scope, status_code: int, bytes_in: int, bytes_out: int, duration: float) -> None:
+        method = scope["method"]
+        path = scope["path"]
+        if status_code >= 500:
+            level = logging.WARNING
+        elif method == "OPTIONS":
+            # CORS preflights are noise at the default level
+            level = logging.DEBUG
+        else:
+            level = logging.INFO
+        if not access_logger.isEnabledFor(level):
+            return
+
+        access_logger.log(
+            level,
+            f"{method} {path} {status_code} in={bytes_in} out={bytes_out} {duration * 1000:.1f}ms",
+            extra={
+                "method": method,
+                "path": path,
+                "status": status_code,
+                "bytes_in": bytes_in,
+                "bytes_out": bytes_out,
+                "duration": duration
+            }
+        )
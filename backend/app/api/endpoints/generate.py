@@ -1,31 +1,165 @@
+import asyncio
 import logging
-from typing import Optional
-from fastapi import APIRouter, HTTPException, Depends, status
-from fastapi.responses import JSONResponse
+import time
+from typing import Optional, List, Dict, Any, AsyncIterator, Callable
+from fastapi import APIRouter, HTTPException, Depends, Request, status
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from starlette.datastructures import UploadFile
 
+from app.api.responses import ImageJSONResponse, image_result_content
+from app.api.routing import TimedRoute
 from app.models.schemas import (
+    BatchGenerateItem,
+    BatchGenerateRequest,
     GenerateImageRequest,
-    ImageResponse,
-    HealthResponse
+    ImageResponse
+)
+from app.services.admission import (
+    AdmissionController,
+    AdmissionRejected,
+    get_admission_controller
 )
 from app.services.gemini import get_gemini_service, GeminiService
+from app.services.image_store import get_image_store, ImageStore
 from app.config import settings
+from app.utils.image import sniff_image_mime_type
+from app.utils.sse import STREAMING_HEADERS, format_ndjson, format_sse
+from app.utils.timing import current_timing, record_stage, timing_scope
+from app.utils.uploads import UploadRejected, parse_upload_form
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/api", tags=["Image Generation"])
+router = APIRouter(prefix="/api", tags=["Image Generation"], route_class=TimedRoute)
 
+# OpenAPI body of /generate/upload, which parses the form itself
+UPLOAD_REQUEST_BODY = {
+    "required": True,
+    "content": {
+        "multipart/form-data": {
+            "schema": {
+                "type": "object",
+                "required": ["prompt"],
+                "properties": {
+                    "prompt": {"type": "string", "minLength": 1, "maxLength": 5000},
+                    "model": {"type": "string"},
+                    "temperature": {"type": "number", "minimum": 0.0, "maximum": 2.0},
+                    "cache": {"type": "boolean", "default": False},
+                    "context_images": {
+                        "type": "array",
+                        "items": {"type": "string", "format": "binary"},
+                        "description": "Context image files"
+                    },
+                    "context_image_ids": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "IDs of context images previously uploaded to /api/images"
+                    }
+                }
+            }
+        }
+    }
+}
 
-@router.post("/generate", response_model=ImageResponse)
-async def generate_image(
+
+async def load_referenced_images(
+    image_ids: Optional[List[str]],
+    image_store: ImageStore
+) -> List[bytes]:
+    """
+    Load context images referenced by ID from the image store.
+    
+    Args:
+        image_ids: Image IDs from the request
+        image_store: Store the images were uploaded to
+        
+    Returns:
+        Raw image bytes in request order
+    """
+    if not image_ids:
+        return []
+    
+    images = await asyncio.to_thread(image_store.get_many, image_ids)
+    missing = [image_id for image_id, data in zip(image_ids, images) if data is None]
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Unknown or expired image ids: {', '.join(missing)}"
+        )
+    
+    return images
+
+
+async def generate_with_admission(
+    gemini_service: GeminiService,
+    admission: AdmissionController,
+    prompt: str,
+    context_images: List[bytes],
+    temperature: Optional[float] = None,
+    use_cache: bool = False,
+    prepared_context: Optional[Any] = None,
+    model: Optional[str] = None,
+    on_admitted: Optional[Callable[[], None]] = None
+) -> Dict[str, Any]:
+    """
+    Run one generation once the admission controller grants a slot.
+    
+    Args:
+        gemini_service: Service performing the generation
+        admission: Controller bounding concurrent generations
+        prompt: Text prompt
+        context_images: Raw context image bytes
+        temperature: Generation temperature
+        use_cache: Allow a cached result
+        prepared_context: Already preprocessed context images
+        model: Model to generate with (defaults to the configured model)
+        on_admitted: Called once the slot is granted, before generating
+        
+    Returns:
+        Generation result dictionary, with the queue wait and the time
+        spent in each stage in its metadata
+        
+    Raises:
+        AdmissionRejected: If no slot could be obtained
+    """
+    with timing_scope() as timing:
+        async with admission.admit() as outcome:
+            record_stage("queue", outcome["queue_wait"])
+            if on_admitted is not None:
+                on_admitted()
+            result = await gemini_service.generate_image(
+                prompt=prompt,
+                context_images=context_images or None,
+                temperature=temperature,
+                use_cache=use_cache,
+                prepared_context=prepared_context,
+                model=model
+            )
+    
+    if result.get("metadata") is not None:
+        result["metadata"]["queue_wait"] = outcome["queue_wait"]
+        result["metadata"]["timings"] = timing.snapshot()
+    
+    return result
+
+
+async def generate_image_response(
     request: GenerateImageRequest,
-    gemini_service: GeminiService = Depends(get_gemini_service)
-) -> ImageResponse:
+    inline_images: List[bytes],
+    gemini_service: GeminiService,
+    image_store: ImageStore,
+    admission: AdmissionController
+) -> ImageJSONResponse:
     """
-    Generate a new image based on text prompt and optional context images.
+    Run a generation request and build its response.
     
     Args:
-        request: Generation request with prompt and optional context images
+        request: Validated generation request
+        inline_images: Raw context images sent with the request
+        gemini_service: Service performing the generation
+        image_store: Store of previously uploaded context images
+        admission: Controller bounding concurrent generations
         
     Returns:
         Generated image as base64 string with metadata
@@ -36,28 +170,40 @@ async def generate_image(
         # Extract settings
         settings_dict = request.settings.model_dump() if request.settings else {}
         temperature = settings_dict.get('temperature')
+        use_cache = settings_dict.get('cache', False)
+        
+        # Inline images first, then images referenced by ID
+        context_images = list(inline_images)
+        context_images.extend(
+            await load_referenced_images(request.context_image_ids, image_store)
+        )
         
-        # Generate image
-        result = await gemini_service.generate_image(
+        # Generate image once a concurrency slot is available
+        result = await generate_with_admission(
+            gemini_service,
+            admission,
             prompt=request.prompt,
-            context_images=request.context_images,
-            temperature=temperature
+            context_images=context_images,
+            temperature=temperature,
+            use_cache=use_cache,
+            model=settings_dict.get('model')
         )
         
-        if result["success"]:
-            return ImageResponse(
-                success=True,
-                image=result["image"],
-                metadata=result["metadata"]
-            )
-        else:
+        if not result["success"]:
             logger.error(f"Generation failed: {result.get('error')}")
-            return ImageResponse(
-                success=False,
-                error=result.get("error", "Image generation failed"),
-                metadata=result.get("metadata")
-            )
+        
+        # Returned as is: the result needs no second validation pass
+        return ImageJSONResponse(image_result_content(result, default_error="Image generation failed"))
             
+    except AdmissionRejected as e:
+        logger.warning(f"Generation request rejected: {e.detail}")
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=e.detail,
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Unexpected error in generate_image: {e}")
         raise HTTPException(
@@ -66,37 +212,329 @@ async def generate_image(
         )
 
 
-@router.get("/health", response_model=HealthResponse)
-async def health_check(
-    gemini_service: GeminiService = Depends(get_gemini_service)
-) -> HealthResponse:
+@router.post("/generate", response_model=ImageResponse)
+async def generate_image(
+    request: GenerateImageRequest,
+    gemini_service: GeminiService = Depends(get_gemini_service),
+    image_store: ImageStore = Depends(get_image_store),
+    admission: AdmissionController = Depends(get_admission_controller)
+) -> ImageJSONResponse:
     """
-    Check the health status of the API and Gemini service.
+    Generate a new image based on text prompt and optional context images.
     
+    Args:
+        request: Generation request with prompt, optional context images
+            and optional IDs of previously uploaded context images
+        
     Returns:
-        Health status information
+        Generated image as base64 string with metadata
     """
-    try:
-        # Check Gemini service health
-        is_healthy = await gemini_service.health_check()
+    return await generate_image_response(
+        request,
+        request.decoded_context_images,
+        gemini_service,
+        image_store,
+        admission
+    )
+
+
+@router.post(
+    "/generate/upload",
+    response_model=ImageResponse,
+    openapi_extra={"requestBody": UPLOAD_REQUEST_BODY}
+)
+async def generate_image_upload(
+    http_request: Request,
+    gemini_service: GeminiService = Depends(get_gemini_service),
+    image_store: ImageStore = Depends(get_image_store),
+    admission: AdmissionController = Depends(get_admission_controller)
+) -> ImageJSONResponse:
+    """
+    Generate an image from a multipart/form-data request.
+    
+    Same as /api/generate, but context images are sent as binary file
+    parts instead of base64 strings, which keeps the body a third smaller
+    and avoids parsing it as one JSON document. Files are spooled while the
+    body streams in; a disallowed extension or a file over MAX_FILE_SIZE
+    is rejected without reading the rest of the body, and files that are
+    not a supported image are rejected before generating.
+    
+    Args:
+        http_request: Multipart request with the prompt, optional
+            model, temperature and cache fields, context_images files and
+            repeated context_image_ids
         
-        if not is_healthy:
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail="Gemini service is not available"
+    Returns:
+        Generated image as base64 string with metadata
+    """
+    start_time = time.perf_counter()
+    try:
+        form = await parse_upload_form(
+            http_request,
+            max_file_size=settings.max_file_size,
+            allowed_extensions=settings.allowed_extensions_list,
+            max_files=settings.upload_max_files
+        )
+    except UploadRejected as e:
+        logger.warning(f"Multipart generation request rejected: {e.detail}")
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    
+    try:
+        generation_settings = {
+            field: form[field] for field in ("model", "temperature", "cache") if form.get(field)
+        }
+        fields = {
+            "prompt": form.get("prompt"),
+            "context_image_ids": form.getlist("context_image_ids") or None,
+            "settings": generation_settings or None
+        }
+        try:
+            request = GenerateImageRequest.model_validate(
+                {name: value for name, value in fields.items() if value is not None}
             )
+        except ValidationError as e:
+            raise RequestValidationError([
+                {**error, "loc": ("body", *error["loc"])}
+                for error in e.errors(include_url=False)
+            ])
         
-        return HealthResponse(
-            status="healthy",
-            version=settings.app_version,
-            model=settings.model_name
+        inline_images = []
+        for index, file in enumerate(form.getlist("context_images")):
+            if not isinstance(file, UploadFile):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"context_images[{index}] must be a file part"
+                )
+            data = await file.read()
+            if sniff_image_mime_type(data) is None:
+                raise HTTPException(
+                    status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                    detail=f"context_images[{index}] is not a supported image: {file.filename}"
+                )
+            inline_images.append(data)
+        record_stage("parse", time.perf_counter() - start_time)
+    finally:
+        await form.close()
+    
+    return await generate_image_response(
+        request,
+        inline_images,
+        gemini_service,
+        image_store,
+        admission
+    )
+
+
+@router.post(
+    "/generate/stream",
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "description": "\"start\", then \"text\" and \"image\" events as the model produces "
+                           "them, then a final \"done\" (preceded by \"error\" on failure)",
+            "content": {"text/event-stream": {}}
+        }
+    }
+)
+async def generate_image_stream(
+    request: GenerateImageRequest,
+    gemini_service: GeminiService = Depends(get_gemini_service),
+    image_store: ImageStore = Depends(get_image_store),
+    admission: AdmissionController = Depends(get_admission_controller)
+) -> StreamingResponse:
+    """
+    Generate an image, streaming the response parts with Server-Sent Events.
+    
+    Text commentary and images are forwarded as soon as the model produces
+    them. Disconnecting cancels the upstream generation. Results are never
+    served from or stored in the result cache.
+    
+    Args:
+        request: Same body as /api/generate
+    
+    Returns:
+        Event stream of the generation
+    """
+    logger.info(f"Received streaming generation request with prompt: {request.prompt[:100]}...")
+    
+    settings_dict = request.settings.model_dump() if request.settings else {}
+    
+    context_images = list(request.decoded_context_images)
+    context_images.extend(
+        await load_referenced_images(request.context_image_ids, image_store)
+    )
+    
+    # Fail fast with a proper status while we still can; the slot itself is
+    # taken inside the stream so it is always released with it
+    try:
+        admission.check_queue_capacity()
+    except AdmissionRejected as e:
+        logger.warning(f"Streaming generation request rejected: {e.detail}")
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=e.detail,
+            headers={"Retry-After": str(e.retry_after)}
         )
+    
+    # The stream runs after the route returned, so keep its timing for it
+    request_timing = current_timing()
+    
+    async def stream_events() -> AsyncIterator[bytes]:
+        try:
+            with timing_scope(parent=request_timing) as timing:
+                async with admission.admit() as outcome:
+                    record_stage("queue", outcome["queue_wait"])
+                    yield format_sse({"queue_wait": outcome["queue_wait"]}, event="start")
+                    async for event in gemini_service.generate_image_stream(
+                        prompt=request.prompt,
+                        context_images=context_images or None,
+                        temperature=settings_dict.get('temperature'),
+                        model=settings_dict.get('model')
+                    ):
+                        if event["event"] == "done":
+                            event["data"]["metadata"]["queue_wait"] = outcome["queue_wait"]
+                            event["data"]["metadata"]["timings"] = timing.snapshot()
+                        yield format_sse(event["data"], event=event["event"])
+        except AdmissionRejected as e:
+            yield format_sse({"error": e.detail, "retry_after": e.retry_after}, event="error")
+            yield format_sse({"success": False, "metadata": {}}, event="done")
+    
+    return StreamingResponse(
+        stream_events(),
+        media_type="text/event-stream",
+        headers=STREAMING_HEADERS
+    )
+
+
+@router.post(
+    "/generate/batch",
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "description": "One result per item as soon as it finishes, then a summary",
+            "content": {"application/x-ndjson": {}, "text/event-stream": {}}
+        }
+    }
+)
+async def generate_batch(
+    request: BatchGenerateRequest,
+    gemini_service: GeminiService = Depends(get_gemini_service),
+    image_store: ImageStore = Depends(get_image_store),
+    admission: AdmissionController = Depends(get_admission_controller)
+) -> StreamingResponse:
+    """
+    Generate several variants from one set of context images.
+    
+    The context images are preprocessed once and shared by every item. Items
+    run concurrently up to BATCH_MAX_CONCURRENCY and each result is streamed
+    as soon as it is ready, as NDJSON lines or SSE "result" events with the
+    item index, followed by a final "done" summary.
+    
+    Args:
+        request: Batch request with the items and shared context images
         
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Health check failed: {e}")
+    Returns:
+        Streaming response with one record per item
+    """
+    if len(request.items) > settings.batch_max_items:
         raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail=f"Service health check failed: {str(e)}"
-        )
\ No newline at end of file
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Batch exceeds the maximum of {settings.batch_max_items} items"
+        )
+    
+    logger.info(f"Received batch generation request with {len(request.items)} items")
+    
+    settings_dict = request.settings.model_dump() if request.settings else {}
+    default_temperature = settings_dict.get('temperature')
+    use_cache = settings_dict.get('cache', False)
+    
+    context_images = list(request.decoded_context_images)
+    context_images.extend(
+        await load_referenced_images(request.context_image_ids, image_store)
+    )
+    
+    # Preprocess the shared context images once for all items
+    prepared_context = None
+    if context_images:
+        try:
+            prepared_context = await gemini_service.prepare_context(context_images)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Failed to preprocess context images: {str(e)}"
+            )
+    
+    semaphore = asyncio.Semaphore(settings.batch_max_concurrency)
+    
+    async def run_item(index: int, item: BatchGenerateItem) -> Dict[str, Any]:
+        temperature = item.temperature if item.temperature is not None else default_temperature
+        async with semaphore:
+            try:
+                result = await generate_with_admission(
+                    gemini_service,
+                    admission,
+                    prompt=item.prompt,
+                    context_images=context_images,
+                    temperature=temperature,
+                    use_cache=use_cache,
+                    prepared_context=prepared_context,
+                    model=settings_dict.get('model')
+                )
+            except AdmissionRejected as e:
+                result = {
+                    "success": False,
+                    "error": e.detail,
+                    "metadata": {"retry_after": e.retry_after}
+                }
+            except Exception as e:
+                logger.error(f"Unexpected error in batch item {index}: {e}")
+                result = {"success": False, "error": f"Image generation failed: {str(e)}"}
+        return {"index": index, **result}
+    
+    def encode(payload: Dict[str, Any], event: str) -> bytes:
+        if request.stream_format == "sse":
+            event_id = str(payload["index"]) if "index" in payload else None
+            return format_sse(payload, event=event, event_id=event_id)
+        return format_ndjson(payload)
+    
+    async def stream_results() -> AsyncIterator[bytes]:
+        start_time = time.perf_counter()
+        tasks = [
+            asyncio.ensure_future(run_item(index, item))
+            for index, item in enumerate(request.items)
+        ]
+        succeeded = 0
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                result = await next_result
+                succeeded += bool(result["success"])
+                yield encode(result, "result")
+            
+            yield encode({
+                "done": True,
+                "total": len(tasks),
+                "succeeded": succeeded,
+                "failed": len(tasks) - succeeded,
+                "total_time": time.perf_counter() - start_time
+            }, "done")
+        finally:
+            # The client went away or the stream failed: stop remaining items
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+    
+    media_type = "text/event-stream" if request.stream_format == "sse" else "application/x-ndjson"
+    return StreamingResponse(stream_results(), media_type=media_type, headers=STREAMING_HEADERS)
+
+
+@router.get("/admission")
+async def admission_status(
+    admission: AdmissionController = Depends(get_admission_controller)
+) -> Dict[str, Any]:
+    """
+    Get the current concurrency limit, queue depth and queue wait times.
+    
+    Returns:
+        Admission controller statistics
+    """
+    return admission.stats()
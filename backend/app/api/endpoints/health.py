@@ -0,0 +1,85 @@
+import logging
+from typing import Dict
+from fastapi import APIRouter, HTTPException, Depends, status
+
+from app.api.routing import TimedRoute
+from app.config import settings
+from app.models.schemas import HealthResponse
+from app.services.health import HealthMonitor, get_health_monitor
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api", tags=["Health"], route_class=TimedRoute)
+
+
+def readiness_response(health_monitor: HealthMonitor, healthy_status: str) -> HealthResponse:
+    """
+    Build a health response from the monitor state, raising 503 if not ready.
+
+    Args:
+        health_monitor: Monitor tracking upstream readiness
+        healthy_status: Status reported when ready
+
+    Returns:
+        Health status information
+    """
+    checks = health_monitor.snapshot()
+    if not checks["warmed_up"]:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Service is warming up"
+        )
+    if not checks["ready"]:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Gemini service is not available"
+        )
+
+    return HealthResponse(
+        status=healthy_status,
+        version=settings.app_version,
+        model=settings.model_name,
+        checks=checks
+    )
+
+
+@router.get("/health/live")
+async def liveness() -> Dict[str, str]:
+    """
+    Check that the process is up and serving requests.
+
+    Never touches the upstream, so it stays cheap for frequent probes.
+
+    Returns:
+        Liveness status
+    """
+    return {"status": "alive"}
+
+
+@router.get("/health/ready", response_model=HealthResponse)
+async def readiness(
+    health_monitor: HealthMonitor = Depends(get_health_monitor)
+) -> HealthResponse:
+    """
+    Check that the Gemini service can take traffic.
+
+    Answered from memory: readiness comes from the background prober and
+    the success rate of recent real traffic.
+
+    Returns:
+        Readiness status information
+    """
+    return readiness_response(health_monitor, "ready")
+
+
+@router.get("/health", response_model=HealthResponse)
+async def health_check(
+    health_monitor: HealthMonitor = Depends(get_health_monitor)
+) -> HealthResponse:
+    """
+    Check the health status of the API and Gemini service.
+
+    Returns:
+        Health status information
+    """
+    return readiness_response(health_monitor, "healthy")
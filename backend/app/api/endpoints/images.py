@@ -0,0 +1,121 @@
+import asyncio
+import logging
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, File, Header, Response, UploadFile, status
+from fastapi.responses import FileResponse
+
+from app.api.routing import TimedRoute
+from app.models.schemas import IMAGE_ID_REGEX, ImageUploadResponse
+from app.services.image_store import get_image_store, ImageStore
+from app.utils.image import sniff_image_mime_type
+from app.utils.uploads import file_extension
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api", tags=["Images"], route_class=TimedRoute)
+
+# Images are addressed by content hash, so a URL never changes content
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Check an If-None-Match header against an ETag (weak comparison)."""
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+@router.post(
+    "/images",
+    response_model=ImageUploadResponse,
+    status_code=status.HTTP_201_CREATED
+)
+async def upload_image(
+    file: UploadFile = File(..., description="Image file to store"),
+    image_store: ImageStore = Depends(get_image_store)
+) -> ImageUploadResponse:
+    """
+    Upload a context image once and get an ID to reference it in later
+    generation requests instead of re-sending it as base64.
+
+    Args:
+        file: Uploaded image file
+
+    Returns:
+        Content hash ID and basic information about the stored image
+    """
+    if file_extension(file.filename) not in settings.allowed_extensions_list:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"File extension not allowed. Allowed: {settings.allowed_extensions}"
+        )
+
+    data = await file.read(settings.max_file_size + 1)
+    if len(data) > settings.max_file_size:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File exceeds maximum size of {settings.max_file_size} bytes"
+        )
+
+    mime_type = sniff_image_mime_type(data)
+    if mime_type is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Unsupported or invalid image"
+        )
+
+    image_id = await asyncio.to_thread(image_store.put, data, mime_type)
+
+    logger.info(f"Stored uploaded image {image_id} ({len(data)} bytes)")
+
+    return ImageUploadResponse(
+        success=True,
+        image_id=image_id,
+        size=len(data),
+        mime_type=mime_type
+    )
+
+
+@router.get(
+    "/images/{image_id}",
+    response_class=FileResponse,
+    responses={
+        200: {"description": "The stored image", "content": {"image/*": {}}},
+        206: {"description": "Requested byte range of the stored image"},
+        304: {"description": "The cached copy is still valid"},
+        404: {"description": "Unknown or expired image"}
+    }
+)
+async def get_image(
+    image_id: str,
+    if_none_match: Optional[str] = Header(None),
+    image_store: ImageStore = Depends(get_image_store)
+) -> Response:
+    """
+    Serve a stored image, uploaded or generated.
+
+    The file is sent as is (zero-copy where the server supports it) with
+    Range support. The ETag is the content hash and the response is cacheable
+    forever, so clients and proxies revalidate or re-download nothing.
+
+    Args:
+        image_id: Content hash of the image
+        if_none_match: ETags of cached copies
+
+    Returns:
+        The image file, or 304 if the client's copy is current
+    """
+    entry = None
+    if IMAGE_ID_REGEX.match(image_id):
+        entry = await asyncio.to_thread(image_store.get_file, image_id)
+    if entry is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Unknown or expired image: {image_id}"
+        )
+
+    headers = {"ETag": f'"{image_id}"', "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    if if_none_match and etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    return FileResponse(entry["path"], media_type=entry["mime_type"], headers=headers)
@@ -0,0 +1,193 @@
+import logging
+import time
+from typing import AsyncIterator
+from fastapi import APIRouter, HTTPException, Depends, Query, Response, status
+from fastapi.responses import StreamingResponse
+
+from app.api.endpoints.generate import generate_with_admission, load_referenced_images
+from app.api.responses import ImageJSONResponse, image_result_content
+from app.api.routing import TimedRoute
+from app.models.schemas import GenerateImageRequest, JobResponse
+from app.services.admission import AdmissionController, get_admission_controller
+from app.services.gemini import get_gemini_service, GeminiService
+from app.services.image_store import get_image_store, ImageStore
+from app.services.jobs import Job, JobCapacityExceeded, JobRegistry, get_job_registry
+from app.utils.sse import STREAMING_HEADERS, format_sse
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api", tags=["Jobs"], route_class=TimedRoute)
+
+# Seconds between keep-alive comments on idle event streams
+KEEPALIVE_INTERVAL = 15.0
+
+
+def get_job_or_404(job_id: str, job_registry: JobRegistry) -> Job:
+    """Look up a job, raising 404 if it is unknown or expired."""
+    job = job_registry.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Unknown or expired job: {job_id}"
+        )
+    return job
+
+
+def job_response(job: Job) -> ImageJSONResponse:
+    """Render a job like JobResponse without validating its result image again."""
+    content = job.to_dict()
+    if content["result"] is not None:
+        content["result"] = image_result_content(content["result"])
+    return ImageJSONResponse(content)
+
+
+@router.post(
+    "/jobs",
+    response_model=JobResponse,
+    status_code=status.HTTP_202_ACCEPTED
+)
+async def submit_job(
+    request: GenerateImageRequest,
+    response: Response,
+    gemini_service: GeminiService = Depends(get_gemini_service),
+    image_store: ImageStore = Depends(get_image_store),
+    admission: AdmissionController = Depends(get_admission_controller),
+    job_registry: JobRegistry = Depends(get_job_registry)
+) -> JobResponse:
+    """
+    Submit a generation to run in the background.
+
+    Returns immediately with a job ID. Poll GET /api/jobs/{job_id} (with
+    ?wait= for long-polling) or subscribe to GET /api/jobs/{job_id}/events
+    for the status and result.
+
+    Args:
+        request: Same body as /api/generate
+
+    Returns:
+        The queued job
+    """
+    settings_dict = request.settings.model_dump() if request.settings else {}
+
+    # Resolve referenced images now so unknown IDs fail the submission
+    context_images = list(request.decoded_context_images)
+    context_images.extend(
+        await load_referenced_images(request.context_image_ids, image_store)
+    )
+
+    try:
+        job = job_registry.submit(lambda started: generate_with_admission(
+            gemini_service,
+            admission,
+            prompt=request.prompt,
+            context_images=context_images,
+            temperature=settings_dict.get('temperature'),
+            use_cache=settings_dict.get('cache', False),
+            model=settings_dict.get('model'),
+            on_admitted=started
+        ))
+    except JobCapacityExceeded as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": "5"}
+        )
+
+    response.headers["Location"] = f"/api/jobs/{job.id}"
+    return JobResponse(**job.to_dict())
+
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, le=60, description="Seconds to wait for the job to finish (long-poll)"),
+    job_registry: JobRegistry = Depends(get_job_registry)
+) -> ImageJSONResponse:
+    """
+    Get the status of a job, and its result once finished.
+
+    Args:
+        job_id: Job ID returned on submission
+        wait: Seconds to wait for the job to finish before answering
+
+    Returns:
+        The job status and result
+    """
+    job = get_job_or_404(job_id, job_registry)
+
+    deadline = time.monotonic() + wait
+    while not job.finished:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        await job.wait_for_change(remaining)
+
+    return job_response(job)
+
+
+@router.get(
+    "/jobs/{job_id}/events",
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "description": "\"status\" events on every change, then a final \"result\" event",
+            "content": {"text/event-stream": {}}
+        }
+    }
+)
+async def job_events(
+    job_id: str,
+    job_registry: JobRegistry = Depends(get_job_registry)
+) -> StreamingResponse:
+    """
+    Subscribe to status changes of a job with Server-Sent Events.
+
+    Args:
+        job_id: Job ID returned on submission
+
+    Returns:
+        Event stream ending with the job result
+    """
+    job = get_job_or_404(job_id, job_registry)
+
+    def status_payload() -> dict:
+        payload = job.to_dict()
+        payload.pop("result")
+        return payload
+
+    async def stream_events() -> AsyncIterator[bytes]:
+        yield format_sse(status_payload(), event="status")
+        while not job.finished:
+            if await job.wait_for_change(KEEPALIVE_INTERVAL):
+                yield format_sse(status_payload(), event="status")
+            else:
+                yield b": keep-alive\n\n"
+        yield format_sse(job.to_dict(), event="result")
+
+    return StreamingResponse(
+        stream_events(),
+        media_type="text/event-stream",
+        headers=STREAMING_HEADERS
+    )
+
+
+@router.delete("/jobs/{job_id}", response_model=JobResponse)
+async def cancel_job(
+    job_id: str,
+    job_registry: JobRegistry = Depends(get_job_registry)
+) -> ImageJSONResponse:
+    """
+    Cancel a queued or running job.
+
+    Args:
+        job_id: Job ID returned on submission
+
+    Returns:
+        The job status after the cancellation request
+    """
+    get_job_or_404(job_id, job_registry)
+    job = job_registry.cancel(job_id)
+    # Give the job a moment to unwind so the answer reflects the cancellation
+    if not job.finished:
+        await job.wait_for_change(1.0)
+    return job_response(job)
@@ -0,0 +1,75 @@
+from typing import Any, Dict
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from app.services.admission import AdmissionController, get_admission_controller
+from app.services.gemini import GeminiService, get_gemini_service
+from app.services.image_store import ImageStore, get_image_store
+from app.services.jobs import JobRegistry, get_job_registry
+from app.utils.metrics import (
+    ADMISSION_LIMIT,
+    ADMISSION_QUEUE_DEPTH,
+    CACHE_BYTES,
+    CACHE_ENTRIES,
+    CACHE_EVICTIONS,
+    CACHE_LOOKUPS,
+    CONTENT_TYPE,
+    GENERATIONS_IN_FLIGHT,
+    IMAGE_STORE_BYTES,
+    IMAGE_STORE_IMAGES,
+    JOBS,
+    REGISTRY,
+    UPSTREAM_HEADROOM,
+    UPSTREAM_ROUTED_IN_FLIGHT
+)
+
+router = APIRouter(tags=["Metrics"])
+
+
+def _set_cache_gauges(cache: str, stats: Dict[str, Any]) -> None:
+    """Export the stats() of an LRUCache or SharedCache."""
+    CACHE_LOOKUPS.set(stats["hits"], cache=cache, result="hit")
+    CACHE_LOOKUPS.set(stats["misses"], cache=cache, result="miss")
+    if "entries" in stats:
+        CACHE_ENTRIES.set(stats["entries"], cache=cache)
+        CACHE_BYTES.set(stats["bytes"], cache=cache)
+        CACHE_EVICTIONS.set(stats["evictions"], cache=cache)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics(
+    admission: AdmissionController = Depends(get_admission_controller),
+    gemini_service: GeminiService = Depends(get_gemini_service),
+    image_store: ImageStore = Depends(get_image_store),
+    job_registry: JobRegistry = Depends(get_job_registry)
+) -> PlainTextResponse:
+    """
+    Expose in-process metrics in the Prometheus text format.
+
+    Returns:
+        Per-stage latency histograms, request and upstream counters,
+        in-flight and queue gauges, per API key load, cache, image store
+        and job gauges and payload sizes
+    """
+    GENERATIONS_IN_FLIGHT.set(admission.in_flight)
+    ADMISSION_QUEUE_DEPTH.set(admission.queue_depth)
+    ADMISSION_LIMIT.set(admission.limit)
+    for route in gemini_service.pool.stats():
+        UPSTREAM_HEADROOM.set(route["headroom"], key=route["key"], model=route["model"])
+        UPSTREAM_ROUTED_IN_FLIGHT.set(route["in_flight"], key=route["key"], model=route["model"])
+
+    _set_cache_gauges("results", gemini_service.result_cache.stats())
+    _set_cache_gauges("preprocessed_images", gemini_service.preprocessor.cache.stats())
+    if gemini_service.shared_results is not None:
+        _set_cache_gauges("shared_results", gemini_service.shared_results.stats())
+    if gemini_service.preprocessor.shared_cache is not None:
+        _set_cache_gauges("shared_preprocessed_images", gemini_service.preprocessor.shared_cache.stats())
+
+    store_stats = image_store.stats()
+    IMAGE_STORE_IMAGES.set(store_stats["images"])
+    IMAGE_STORE_BYTES.set(store_stats["bytes"])
+    for status, count in job_registry.stats().items():
+        JOBS.set(count, status=status)
+
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
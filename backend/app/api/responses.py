@@ -0,0 +1,96 @@
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+from fastapi.responses import JSONResponse
+
+from app.utils.timing import record_stage
+
+# Stands in for the image strings while the rest of the payload is encoded
+_PLACEHOLDER = "\x00image\x00"
+_ENCODED_PLACEHOLDER = json.dumps(_PLACEHOLDER).encode("ascii")
+# Characters JSON strings can hold without escaping (base64 is a subset)
+_JSON_SAFE = bytes(c for c in range(0x20, 0x7f) if c not in b'"\\')
+
+
+def image_result_content(result: Dict[str, Any], default_error: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Shape a generation result like ImageResponse.
+
+    Args:
+        result: Result dictionary of the Gemini service
+        default_error: Error reported for failures without one
+
+    Returns:
+        Dictionary with exactly the ImageResponse fields
+    """
+    success = bool(result.get("success"))
+    return {
+        "success": success,
+        "image": result.get("image") if success else None,
+        "image_id": result.get("image_id") if success else None,
+        "image_url": result.get("image_url") if success else None,
+        "error": None if success else result.get("error") or default_error,
+        "metadata": result.get("metadata")
+    }
+
+
+class ImageJSONResponse(JSONResponse):
+    """
+    JSON response for payloads carrying large base64 images.
+
+    Returned directly by endpoints, so FastAPI does not validate and encode
+    the payload a second time through the response_model (which still
+    documents it). Values of "image" keys are base64, which needs no
+    escaping, so once checked they are copied into the body as they are
+    instead of going through the JSON encoder. Everything else is encoded
+    as usual. The body is rendered when the response is built, inside the
+    endpoint, so the time it takes is recorded as the serialize stage here.
+    """
+
+    def render(self, content: Any) -> bytes:
+        start_time = time.perf_counter()
+        try:
+            return self._render(content)
+        finally:
+            record_stage("serialize", time.perf_counter() - start_time)
+
+    def _render(self, content: Any) -> bytes:
+        images: List[bytes] = []
+        body = json.dumps(
+            self._extract_images(content, images),
+            ensure_ascii=False,
+            allow_nan=False,
+            indent=None,
+            separators=(",", ":")
+        ).encode("utf-8")
+        if not images:
+            return body
+
+        pieces = body.split(_ENCODED_PLACEHOLDER)
+        if len(pieces) != len(images) + 1:
+            # A value collided with the placeholder; encode everything
+            return super().render(content)
+
+        parts = [pieces[0]]
+        for image, piece in zip(images, pieces[1:]):
+            parts.extend((b'"', image, b'"', piece))
+        return b"".join(parts)
+
+    @classmethod
+    def _extract_images(cls, value: Any, images: List[bytes]) -> Any:
+        """Copy value with the image strings replaced by placeholders, in encoding order."""
+        if isinstance(value, dict):
+            copied = {}
+            for key, item in value.items():
+                if key == "image" and isinstance(item, str) and item.isascii():
+                    encoded = item.encode("ascii")
+                    if not encoded.translate(None, _JSON_SAFE):
+                        images.append(encoded)
+                        copied[key] = _PLACEHOLDER
+                        continue
+                copied[key] = cls._extract_images(item, images)
+            return copied
+        if isinstance(value, (list, tuple)):
+            return [cls._extract_images(item, images) for item in value]
+        return value
@@ -0,0 +1,101 @@
+import asyncio
+import functools
+import time
+from typing import Any, Callable, Coroutine
+from fastapi import Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.routing import APIRoute
+from starlette.exceptions import HTTPException as StarletteHTTPException
+
+from app.config import settings
+from app.utils.metrics import (
+    HTTP_IN_FLIGHT,
+    HTTP_REQUESTS,
+    HTTP_REQUEST_SECONDS,
+    PAYLOAD_BYTES
+)
+from app.utils.profiling import PROFILE_HEADER, should_profile, start_profile, stop_profile
+from app.utils.timing import current_timing, record_stage, timing_scope
+
+
+def _timed_endpoint(endpoint: Callable[..., Any]) -> Callable[..., Any]:
+    """Wrap an async endpoint to record parsing time and when it returns."""
+
+    @functools.wraps(endpoint)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        timing = current_timing()
+        if timing is not None:
+            # Stages recorded during validation (e.g. base64_decode) are
+            # reported on their own, so parse only keeps the rest
+            nested = sum(timing.stages.values())
+            record_stage("parse", max(0.0, time.perf_counter() - timing.start - nested))
+        try:
+            return await endpoint(*args, **kwargs)
+        finally:
+            if timing is not None:
+                timing.endpoint_end = time.perf_counter()
+
+    wrapper.is_timed = True
+    return wrapper
+
+
+class TimedRoute(APIRoute):
+    """
+    API route recording request metrics and timings.
+
+    Splits the handling time into body parsing and validation (before the
+    endpoint runs) and response serialization (after it returns, plus what
+    responses rendered inside the endpoint record themselves), reports
+    the stages in a Server-Timing header, counts requests and payload sizes,
+    and profiles sampled requests.
+    """
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any):
+        # include_router() builds the routes again from the wrapped endpoints
+        if asyncio.iscoroutinefunction(endpoint) and not getattr(endpoint, "is_timed", False):
+            endpoint = _timed_endpoint(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+        route = self.path_format
+
+        async def timed_handler(request: Request) -> Response:
+            profile = start_profile() if should_profile(request.headers.get(PROFILE_HEADER)) else None
+            HTTP_IN_FLIGHT.inc()
+            status_code = 500
+            response = None
+            with timing_scope() as timing:
+                try:
+                    response = await handler(request)
+                    status_code = response.status_code
+                    if timing.endpoint_end is not None:
+                        record_stage("serialize", time.perf_counter() - timing.endpoint_end)
+                    body = getattr(response, "body", None)
+                    if body is not None:
+                        PAYLOAD_BYTES.observe(len(body), kind="response")
+                    if settings.server_timing_enabled:
+                        response.headers["Server-Timing"] = timing.server_timing()
+                except StarletteHTTPException as e:
+                    status_code = e.status_code
+                    raise
+                except RequestValidationError:
+                    status_code = 422
+                    raise
+                finally:
+                    HTTP_IN_FLIGHT.dec()
+                    HTTP_REQUESTS.inc(method=request.method, route=route, status=str(status_code))
+                    HTTP_REQUEST_SECONDS.observe(time.perf_counter() - timing.start, route=route)
+
+                    content_length = request.headers.get("content-length")
+                    if content_length and content_length.isdigit():
+                        PAYLOAD_BYTES.observe(int(content_length), kind="request")
+
+                    if profile is not None:
+                        profile_path = await stop_profile(profile, route)
+                        if profile_path and response is not None and settings.debug:
+                            response.headers["X-Profile-File"] = profile_path
+
+            return response
+
+        return timed_handler
@@ -17,11 +17,100 @@ class Settings(BaseSettings):
     # File Upload Configuration
     max_file_size: int = 10485760  # 10MB
     allowed_extensions: str = "jpg,jpeg,png,webp"
+    upload_max_files: int = 8  # Context image files per multipart generation
     
     # API Settings
     api_timeout: int = 60
     model_name: str = "models/gemini-2.5-flash-image-preview"
     
+    # Upstream Routing Pool
+    gemini_api_keys: str = ""  # More comma-separated API keys to spread load over
+    upstream_models: str = ""  # More comma-separated models requests may choose
+    upstream_key_rpm: int = 0  # Requests per minute per API key and model, 0 = unlimited
+    upstream_key_cooldown: float = 30.0  # Seconds a key is skipped for a model after a 429
+    
+    # Upstream Connection Pool
+    upstream_max_connections: int = 100
+    upstream_max_keepalive_connections: int = 20
+    upstream_keepalive_expiry: float = 30.0  # Seconds
+    
+    # Upstream Retries and Hedging
+    upstream_max_retries: int = 2
+    upstream_retry_base_delay: float = 0.5  # Seconds
+    upstream_retry_max_delay: float = 8.0  # Seconds
+    upstream_hedge_enabled: bool = False
+    upstream_hedge_percentile: float = 95.0
+    upstream_hedge_min_samples: int = 20
+    
+    # Request Coalescing and Result Cache
+    coalesce_requests: bool = True
+    result_cache_max_bytes: int = 134217728  # 128MB, 0 disables the cache
+    result_cache_ttl: int = 3600  # Seconds
+    
+    # Shared Cache (across the worker processes of one host)
+    shared_cache_path: str = ""  # SQLite file, empty disables the shared cache
+    shared_cache_image_max_bytes: int = 1073741824  # 1GB of preprocessed context images
+    shared_cache_result_max_bytes: int = 536870912  # 512MB of generation results
+    
+    # Batch Generation
+    batch_max_items: int = 16
+    batch_max_concurrency: int = 4
+    
+    # Background Jobs
+    job_max_jobs: int = 1000
+    job_retention: int = 900  # Seconds a finished job is kept
+    
+    # Admission Control
+    admission_initial_limit: int = 8
+    admission_min_limit: int = 1
+    admission_max_limit: int = 64
+    admission_max_queue_size: int = 100
+    admission_max_queue_wait: float = 30.0  # Seconds
+    admission_latency_target: float = 45.0  # Seconds
+    admission_error_rate_threshold: float = 0.25
+    
+    # Health Probes
+    health_probe_interval: float = 30.0  # Seconds between upstream probes
+    health_probe_timeout: float = 10.0  # Seconds
+    health_probe_failure_threshold: int = 2  # Consecutive failures before not ready
+    health_traffic_window: float = 60.0  # Seconds of real traffic considered
+    health_traffic_min_samples: int = 5
+    health_traffic_error_threshold: float = 0.5
+    
+    # Access Log
+    access_log_enabled: bool = True
+    access_log_sample_rate: float = 1.0  # Fraction of requests logged (server errors always are)
+    
+    # Request Timing and Profiling
+    server_timing_enabled: bool = True
+    profile_sample_rate: float = 0.0  # Fraction of API requests profiled
+    profile_dir: str = ".profiles"
+    
+    # Image Preprocessing
+    preprocess_executor: str = "thread"  # "thread" or "process"
+    preprocess_workers: int = 0  # 0 = one worker per CPU core
+    max_image_dimension: int = 2048
+    resize_quality: str = "balanced"  # "fast", "balanced" or "best"
+    max_image_pixels: int = 50000000  # Decompression bomb guard
+    image_cache_max_bytes: int = 268435456  # 256MB, 0 disables the cache
+    
+    # Upstream Image Encoding
+    upstream_image_format: str = "auto"  # "auto", "png", "jpeg" or "webp"
+    upstream_png_compress_level: int = 6
+    upstream_jpeg_quality: int = 90
+    upstream_webp_quality: int = 90
+    upstream_passthrough: bool = True
+    upstream_passthrough_max_bytes: int = 4194304  # 4MB
+    
+    # Image Store Configuration
+    image_store_dir: str = ".image_store"
+    image_store_max_bytes: int = 1073741824  # 1GB
+    image_store_ttl: int = 86400  # Seconds since last access
+    
+    # Generated Images
+    generated_image_store: bool = True  # Keep outputs in the image store and return their URL
+    generated_image_inline: bool = True  # Also return outputs as base64 in the response
+    
     # Application Settings
     app_title: str = "Nano Banana Image Editor API"
     app_version: str = "0.1.0"
@@ -38,6 +127,18 @@ class Settings(BaseSettings):
     @property
     def allowed_extensions_list(self) -> List[str]:
         return [ext.strip().lower() for ext in self.allowed_extensions.split(",")]
+    
+    @property
+    def api_keys_list(self) -> List[str]:
+        """gemini_api_key followed by the distinct extra keys."""
+        keys = [self.gemini_api_key] + [key.strip() for key in self.gemini_api_keys.split(",")]
+        return list(dict.fromkeys(key for key in keys if key))
+    
+    @property
+    def upstream_models_list(self) -> List[str]:
+        """model_name (the default) followed by the distinct extra models."""
+        models = [self.model_name] + [model.strip() for model in self.upstream_models.split(",")]
+        return list(dict.fromkeys(model for model in models if model))
 
 
 @lru_cache()
@@ -8,16 +8,25 @@ from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
 from app.config import settings
-from app.api.endpoints import generate
-
-# Configure logging
-logging.basicConfig(
+from app.api.access_log import AccessLogMiddleware
+from app.api.endpoints import generate, health, images, jobs, metrics
+from app.services.gemini import close_gemini_service
+from app.services.health import get_health_monitor, shutdown_health_monitor
+from app.services.jobs import shutdown_job_registry
+from app.services.preprocessing import shutdown_image_preprocessor
+from app.utils.log_queue import setup_queue_logging
+
+# Configure logging; records are written by a background thread
+setup_queue_logging(
     level=logging.INFO if settings.debug else logging.WARNING,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
         logging.StreamHandler(sys.stdout)
     ]
 )
+# The (sampled) access log is kept outside debug mode too
+if settings.access_log_enabled:
+    logging.getLogger("app.access").setLevel(logging.INFO)
 
 logger = logging.getLogger(__name__)
 
@@ -26,12 +35,23 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
     # Startup
     logger.info(f"Starting {settings.app_title} v{settings.app_version}")
-    logger.info(f"Using model: {settings.model_name}")
+    logger.info(
+        f"Using models: {', '.join(settings.upstream_models_list)} "
+        f"with {len(settings.api_keys_list)} API key(s)"
+    )
+    # Warm up the service (SDK client, PIL codecs) and then probe the
+    # upstream, which opens the connection pool, in the background; the
+    # server accepts connections meanwhile but is not ready until both are done
+    get_health_monitor().start()
     
     yield
     
     # Shutdown
     logger.info("Shutting down application...")
+    await shutdown_health_monitor()
+    await shutdown_job_registry()
+    await close_gemini_service()
+    shutdown_image_preprocessor()
 
 
 # Create FastAPI app
@@ -73,7 +93,8 @@ async def http_exception_handler(request: Request, exc: StarletteHTTPException):
         content={
             "success": False,
             "error": exc.detail
-        }
+        },
+        headers=getattr(exc, "headers", None)
     )
 
 
@@ -90,24 +111,9 @@ async def general_exception_handler(request: Request, exc: Exception):
     )
 
 
-# Middleware for request logging - must be before CORS
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    """Log all incoming requests."""
-    # Don't log OPTIONS requests as errors
-    if request.method == "OPTIONS":
-        logger.debug(f"CORS Preflight: {request.method} {request.url.path}")
-    else:
-        logger.info(f"Request: {request.method} {request.url.path}")
-    
-    response = await call_next(request)
-    
-    if request.method == "OPTIONS":
-        logger.debug(f"CORS Preflight Response: {response.status_code}")
-    else:
-        logger.info(f"Response: {response.status_code}")
-    
-    return response
+# Request logging - must be before CORS
+if settings.access_log_enabled:
+    app.add_middleware(AccessLogMiddleware)
 
 
 # Configure CORS - MUST be added LAST (executes FIRST in middleware stack)
@@ -137,6 +143,10 @@ else:
 
 # Include routers
 app.include_router(generate.router)
+app.include_router(images.router)
+app.include_router(jobs.router)
+app.include_router(health.router)
+app.include_router(metrics.router)
 
 
 # Root endpoint
@@ -150,7 +160,16 @@ async def root():
         "documentation": "/docs",
         "endpoints": {
             "generate": "/api/generate",
-            "health": "/api/health"
+            "generate_batch": "/api/generate/batch",
+            "generate_stream": "/api/generate/stream",
+            "generate_upload": "/api/generate/upload",
+            "images": "/api/images",
+            "jobs": "/api/jobs",
+            "admission": "/api/admission",
+            "health": "/api/health",
+            "liveness": "/api/health/live",
+            "readiness": "/api/health/ready",
+            "metrics": "/metrics"
         }
     }
 
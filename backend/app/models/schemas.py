@@ -1,45 +1,95 @@
-from typing import Optional, List, Dict, Any
-from pydantic import BaseModel, Field, field_validator
-import base64
+from typing import Optional, List, Dict, Any, Literal
+from pydantic import BaseModel, Field, PrivateAttr, field_validator, model_validator
+import re
+import time
+
+from app.config import settings
+from app.utils.image import decode_base64_image
+from app.utils.timing import record_stage
+
+IMAGE_ID_REGEX = re.compile(r"^[0-9a-f]{64}$")
 
 
 class GenerationSettings(BaseModel):
-    model: str = "models/gemini-2.5-flash-image-preview"
+    model: Optional[str] = Field(
+        None,
+        description="Model to generate with, one of the models the server routes to (defaults to its default model)"
+    )
     temperature: Optional[float] = Field(None, ge=0.0, le=2.0)
+    cache: bool = Field(
+        False,
+        description="Allow a cached result of an identical earlier request (always allowed at temperature 0)"
+    )
+    
+    @field_validator('model')
+    @classmethod
+    def validate_model(cls, v: Optional[str]) -> Optional[str]:
+        if v is not None and v not in settings.upstream_models_list:
+            raise ValueError(
+                f"Unsupported model: {v}. Available: {', '.join(settings.upstream_models_list)}"
+            )
+        return v
     
     class Config:
         json_schema_extra = {
             "example": {
                 "model": "models/gemini-2.5-flash-image-preview",
-                "temperature": 0.8
+                "temperature": 0.8,
+                "cache": False
             }
         }
 
 
-class GenerateImageRequest(BaseModel):
-    prompt: str = Field(..., min_length=1, max_length=5000, description="The text prompt for image generation")
+class ContextImagesRequest(BaseModel):
+    """Context image fields shared by the generation requests."""
+    
     context_images: Optional[List[str]] = Field(None, description="Base64 encoded context images")
-    settings: Optional[GenerationSettings] = None
+    context_image_ids: Optional[List[str]] = Field(
+        None,
+        description="IDs of context images previously uploaded to /api/images"
+    )
+    
+    # Raw bytes of context_images, decoded once during validation
+    _decoded_context_images: List[bytes] = PrivateAttr(default_factory=list)
+    
+    @model_validator(mode='after')
+    def decode_context_images(self) -> 'ContextImagesRequest':
+        if not self.context_images:
+            return self
+        
+        start_time = time.perf_counter()
+        decoded_images = []
+        for index, img_str in enumerate(self.context_images):
+            try:
+                decoded_images.append(decode_base64_image(img_str))
+            except ValueError as e:
+                raise ValueError(f"context_images[{index}]: {str(e)}")
+        record_stage("base64_decode", time.perf_counter() - start_time)
+        
+        self._decoded_context_images = decoded_images
+        return self
+    
+    @property
+    def decoded_context_images(self) -> List[bytes]:
+        """Raw bytes of the inline context images, in request order."""
+        return self._decoded_context_images
     
-    @field_validator('context_images')
+    @field_validator('context_image_ids')
     @classmethod
-    def validate_base64_images(cls, v: Optional[List[str]]) -> Optional[List[str]]:
+    def validate_image_ids(cls, v: Optional[List[str]]) -> Optional[List[str]]:
         if v is None:
             return v
         
-        validated_images = []
-        for img_str in v:
-            try:
-                # Remove data URL prefix if present
-                if ',' in img_str:
-                    img_str = img_str.split(',')[1]
-                # Validate base64 encoding
-                base64.b64decode(img_str)
-                validated_images.append(img_str)
-            except Exception:
-                raise ValueError(f"Invalid base64 image data")
+        for image_id in v:
+            if not IMAGE_ID_REGEX.match(image_id):
+                raise ValueError(f"Invalid image id: {image_id}")
         
-        return validated_images
+        return v
+
+
+class GenerateImageRequest(ContextImagesRequest):
+    prompt: str = Field(..., min_length=1, max_length=5000, description="The text prompt for image generation")
+    settings: Optional[GenerationSettings] = None
     
     class Config:
         json_schema_extra = {
@@ -54,9 +104,52 @@ class GenerateImageRequest(BaseModel):
 
 
 
+class BatchGenerateItem(BaseModel):
+    prompt: str = Field(..., min_length=1, max_length=5000, description="The text prompt for this variant")
+    temperature: Optional[float] = Field(
+        None,
+        ge=0.0,
+        le=2.0,
+        description="Overrides settings.temperature for this variant"
+    )
+
+
+class BatchGenerateRequest(ContextImagesRequest):
+    items: List[BatchGenerateItem] = Field(
+        ...,
+        min_length=1,
+        description="Variants to generate with the shared context images"
+    )
+    settings: Optional[GenerationSettings] = None
+    stream_format: Literal["ndjson", "sse"] = Field(
+        "ndjson",
+        description="Stream results as newline-delimited JSON or Server-Sent Events"
+    )
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "items": [
+                    {"prompt": "Make it look like a watercolor painting"},
+                    {"prompt": "Make it look like a pencil sketch", "temperature": 0.4}
+                ],
+                "context_image_ids": [],
+                "settings": {
+                    "temperature": 0.8
+                },
+                "stream_format": "ndjson"
+            }
+        }
+
+
 class ImageResponse(BaseModel):
     success: bool
     image: Optional[str] = Field(None, description="Base64 encoded generated image")
+    image_id: Optional[str] = Field(
+        None,
+        description="Content hash of the stored generated image, usable in context_image_ids"
+    )
+    image_url: Optional[str] = Field(None, description="URL serving the stored generated image")
     error: Optional[str] = None
     metadata: Optional[Dict[str, Any]] = None
     
@@ -65,6 +158,8 @@ class ImageResponse(BaseModel):
             "example": {
                 "success": True,
                 "image": "base64_encoded_image_data",
+                "image_id": "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08",
+                "image_url": "/api/images/9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08",
                 "metadata": {
                     "generation_time": 2.5,
                     "model_used": "models/gemini-2.5-flash-image-preview",
@@ -75,10 +170,51 @@ class ImageResponse(BaseModel):
         }
 
 
+class ImageUploadResponse(BaseModel):
+    success: bool
+    image_id: str = Field(..., description="Content hash to reference the image in context_image_ids")
+    size: int
+    mime_type: str
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "success": True,
+                "image_id": "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08",
+                "size": 482113,
+                "mime_type": "image/png"
+            }
+        }
+
+
+class JobResponse(BaseModel):
+    job_id: str
+    status: Literal["queued", "running", "succeeded", "failed", "cancelled"]
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[ImageResponse] = Field(None, description="Generation result once the job has finished")
+    error: Optional[str] = None
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "job_id": "3f1c9d0a6b8e4f0f9a2b7c5d1e4f6a8b",
+                "status": "running",
+                "created_at": 1760000000.0,
+                "started_at": 1760000000.1,
+                "finished_at": None,
+                "result": None,
+                "error": None
+            }
+        }
+
+
 class HealthResponse(BaseModel):
     status: str
     version: str
     model: str
+    checks: Optional[Dict[str, Any]] = Field(None, description="Signals the status is based on")
     
     class Config:
         json_schema_extra = {
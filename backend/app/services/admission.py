@@ -0,0 +1,303 @@
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Optional, AsyncIterator, Deque, Dict, Any
+
+from app.config import settings
+from app.utils.context import reset_context_var
+
+logger = logging.getLogger(__name__)
+
+# Multiplicative decrease applied to the concurrency limit on congestion
+DECREASE_FACTOR = 0.7
+# Minimum seconds between two decreases, so one burst only counts once
+DECREASE_COOLDOWN = 1.0
+# Number of recent outcomes used to compute the error rate
+OUTCOME_WINDOW = 50
+# Smoothing factor for the latency moving average
+LATENCY_EWMA_ALPHA = 0.2
+
+
+# Upstream outcome of the generation holding the current admission slot
+_upstream_outcome: ContextVar[Optional[Dict[str, Any]]] = ContextVar("upstream_outcome", default=None)
+
+
+def record_upstream_outcome(latency: float, success: bool) -> None:
+    """
+    Report the upstream call of the generation holding the current slot.
+
+    The last report within an admit() block is the one fed into the
+    concurrency limit; outside of one this does nothing.
+
+    Args:
+        latency: Seconds the upstream call took
+        success: False if the upstream was unavailable (see
+            is_availability_error()), True otherwise
+    """
+    outcome = _upstream_outcome.get()
+    if outcome is not None:
+        outcome["latency"] = latency
+        outcome["success"] = success
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted for generation."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Bounds concurrent generations with an adaptive concurrency limit.
+
+    Requests over the limit wait in a bounded FIFO queue. The limit grows
+    additively while upstream calls succeed within the latency target and
+    shrinks multiplicatively when they get slow or start failing (AIMD).
+    """
+
+    def __init__(
+        self,
+        initial_limit: Optional[int] = None,
+        min_limit: Optional[int] = None,
+        max_limit: Optional[int] = None,
+        max_queue_size: Optional[int] = None,
+        max_queue_wait: Optional[float] = None,
+        latency_target: Optional[float] = None,
+        error_rate_threshold: Optional[float] = None
+    ):
+        """
+        Initialize the controller; every argument defaults to settings.
+
+        Args:
+            initial_limit: Starting concurrency limit
+            min_limit: Lowest the limit can shrink to
+            max_limit: Highest the limit can grow to
+            max_queue_size: Maximum number of waiting requests
+            max_queue_wait: Seconds a request may wait for a slot
+            latency_target: Upstream latency in seconds treated as congestion
+            error_rate_threshold: Recent error rate treated as congestion
+        """
+        self.min_limit = min_limit or settings.admission_min_limit
+        self.max_limit = max_limit or settings.admission_max_limit
+        self.limit = float(initial_limit or settings.admission_initial_limit)
+        self.max_queue_size = (
+            settings.admission_max_queue_size if max_queue_size is None else max_queue_size
+        )
+        self.max_queue_wait = max_queue_wait or settings.admission_max_queue_wait
+        self.latency_target = latency_target or settings.admission_latency_target
+        self.error_rate_threshold = (
+            settings.admission_error_rate_threshold
+            if error_rate_threshold is None else error_rate_threshold
+        )
+
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._outcomes: Deque[bool] = deque(maxlen=OUTCOME_WINDOW)
+        self._last_decrease = 0.0
+        self.latency_ewma: Optional[float] = None
+
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.total_queue_wait = 0.0
+        self.max_queue_wait_seen = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def _has_capacity(self) -> bool:
+        return self.in_flight < max(self.min_limit, int(self.limit))
+
+    def _retry_after(self) -> int:
+        """Estimate how many seconds until a queued request would be served."""
+        latency = self.latency_ewma or self.latency_target
+        batches = (self.queue_depth + 1) / max(1, int(self.limit))
+        return max(1, min(60, math.ceil(latency * batches)))
+
+    def check_queue_capacity(self) -> None:
+        """
+        Reject right away if a request would have to queue and the queue is full.
+
+        Raises:
+            AdmissionRejected: 429 if the queue is full
+        """
+        if self._has_capacity() and not self._waiters:
+            return
+        if self.queue_depth >= self.max_queue_size:
+            self.rejected += 1
+            raise AdmissionRejected(
+                status_code=429,
+                detail="Too many generation requests, please retry later",
+                retry_after=self._retry_after()
+            )
+
+    async def acquire(self) -> float:
+        """
+        Wait for a generation slot.
+
+        Returns:
+            Seconds spent waiting in the queue
+
+        Raises:
+            AdmissionRejected: 429 if the queue is full, 503 if the wait
+                exceeded the maximum queue time
+        """
+        if self._has_capacity() and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return 0.0
+
+        self.check_queue_capacity()
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        start_time = time.perf_counter()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.max_queue_wait)
+        except asyncio.TimeoutError:
+            if not waiter.done():
+                waiter.cancel()
+                self._discard_waiter(waiter)
+                self.timed_out += 1
+                raise AdmissionRejected(
+                    status_code=503,
+                    detail="Timed out waiting for a generation slot",
+                    retry_after=self._retry_after()
+                )
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # A slot was handed over just as the client went away
+                self.release()
+            else:
+                waiter.cancel()
+                self._discard_waiter(waiter)
+            raise
+
+        queue_wait = time.perf_counter() - start_time
+        self.admitted += 1
+        self.total_queue_wait += queue_wait
+        self.max_queue_wait_seen = max(self.max_queue_wait_seen, queue_wait)
+        return queue_wait
+
+    def _discard_waiter(self, waiter: asyncio.Future) -> None:
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def release(
+        self,
+        latency: Optional[float] = None,
+        success: Optional[bool] = None
+    ) -> None:
+        """
+        Free a slot and feed the observed outcome into the limit.
+
+        Args:
+            latency: Upstream latency of the finished request in seconds
+            success: Whether the request succeeded (None if not observed)
+        """
+        self.in_flight -= 1
+        if latency is not None and success is not None:
+            self._observe(latency, success)
+        self._wake_waiters()
+
+    def _observe(self, latency: float, success: bool) -> None:
+        """Adjust the concurrency limit from one finished request (AIMD)."""
+        self._outcomes.append(success)
+        if success:
+            self.latency_ewma = latency if self.latency_ewma is None else (
+                LATENCY_EWMA_ALPHA * latency + (1 - LATENCY_EWMA_ALPHA) * self.latency_ewma
+            )
+
+        error_rate = self._outcomes.count(False) / len(self._outcomes)
+        congested = latency > self.latency_target or (
+            not success and error_rate > self.error_rate_threshold
+        )
+
+        now = time.monotonic()
+        if congested:
+            if now - self._last_decrease >= DECREASE_COOLDOWN:
+                previous = self.limit
+                self.limit = max(float(self.min_limit), self.limit * DECREASE_FACTOR)
+                self._last_decrease = now
+                logger.warning(
+                    f"Upstream congestion (latency {latency:.2f}s, error rate "
+                    f"{error_rate:.0%}), concurrency limit {previous:.1f} -> {self.limit:.1f}"
+                )
+        elif success:
+            self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+
+    def _wake_waiters(self) -> None:
+        """Hand free slots to queued requests in arrival order."""
+        while self._waiters and self._has_capacity():
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            waiter.set_result(None)
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Hold a generation slot for the duration of the block.
+
+        The yielded dictionary carries the queue wait. Only the upstream
+        call made within the block (see record_upstream_outcome()) feeds
+        the limit; blocks answered without one, e.g. from the cache or
+        rejected before calling out, leave it unchanged.
+
+        Raises:
+            AdmissionRejected: If the request cannot be admitted
+        """
+        queue_wait = await self.acquire()
+        outcome: Dict[str, Any] = {"queue_wait": queue_wait, "latency": None, "success": None}
+        token = _upstream_outcome.set(outcome)
+        try:
+            yield outcome
+        finally:
+            # The streaming endpoint holds its slot inside the stream generator
+            reset_context_var(_upstream_outcome, token)
+            self.release(outcome["latency"], outcome["success"])
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the current admission state and counters.
+
+        Returns:
+            Dictionary with limit, in-flight, queue and wait statistics
+        """
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "max_queue_size": self.max_queue_size,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "average_queue_wait": self.total_queue_wait / self.admitted if self.admitted else 0.0,
+            "max_queue_wait": self.max_queue_wait_seen,
+            "latency_ewma": self.latency_ewma
+        }
+
+
+# Singleton instance
+_admission_controller: Optional[AdmissionController] = None
+
+
+def get_admission_controller() -> AdmissionController:
+    """Get or create the admission controller singleton."""
+    global _admission_controller
+    if _admission_controller is None:
+        _admission_controller = AdmissionController()
+    return _admission_controller
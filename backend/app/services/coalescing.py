@@ -0,0 +1,101 @@
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Optional, Awaitable, Callable, Dict, Any, List, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def generation_request_key(
+    prompt: str,
+    context_images: Optional[List[bytes]],
+    temperature: Optional[float],
+    model: str
+) -> str:
+    """
+    Build a canonical hash identifying a generation request.
+
+    Args:
+        prompt: Text prompt
+        context_images: Raw context image bytes, in request order
+        temperature: Generation temperature
+        model: Model name
+
+    Returns:
+        Hex digest of the canonical request
+    """
+    canonical = json.dumps(
+        {
+            "prompt": prompt,
+            "images": [
+                hashlib.blake2b(image, digest_size=16).hexdigest()
+                for image in context_images or []
+            ],
+            "temperature": temperature,
+            "model": model
+        },
+        sort_keys=True,
+        separators=(",", ":")
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """Shares one in-flight computation between identical concurrent calls."""
+
+    def __init__(self):
+        # key -> {"task": running computation, "waiters": number of callers}
+        self._calls: Dict[str, Dict[str, Any]] = {}
+        self.coalesced = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def run(
+        self,
+        key: str,
+        func: Callable[[], Awaitable[T]]
+    ) -> Tuple[T, bool]:
+        """
+        Run func, or join the identical call already in flight.
+
+        The computation is only cancelled when every caller waiting on it
+        has been cancelled.
+
+        Args:
+            key: Identity of the computation
+            func: Function starting the computation
+
+        Returns:
+            Tuple of (result, whether it was shared with an earlier caller)
+        """
+        call = self._calls.get(key)
+        shared = call is not None
+
+        if call is None:
+            task = asyncio.ensure_future(func())
+            call = {"task": task, "waiters": 0}
+            self._calls[key] = call
+
+            def _forget(_: asyncio.Future, key: str = key, call: Dict[str, Any] = call) -> None:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+
+            task.add_done_callback(_forget)
+        else:
+            self.coalesced += 1
+            logger.info(f"Coalesced identical request {key[:12]} with one in flight")
+
+        call["waiters"] += 1
+        try:
+            return await asyncio.shield(call["task"]), shared
+        except asyncio.CancelledError:
+            if call["waiters"] == 1 and not call["task"].done():
+                call["task"].cancel()
+            raise
+        finally:
+            call["waiters"] -= 1
@@ -1,18 +1,30 @@
 import asyncio
+import json
 import logging
+import sqlite3
+import threading
 import time
-from typing import Optional, List, Dict, Any
-from io import BytesIO
-from PIL import Image
-from google import genai
-from google.genai import types
+from typing import TYPE_CHECKING, Optional, AsyncIterator, List, Dict, Any, Tuple
+import httpx
 
 from app.config import settings
-from app.utils.image import (
-    base64_to_pil,
-    bytes_to_base64,
-    resize_image_if_needed
-)
+from app.services.admission import record_upstream_outcome
+from app.services.coalescing import SingleFlight, generation_request_key
+from app.services.image_store import ImageStore, get_image_store, image_url
+from app.services.preprocessing import ImagePreprocessor, get_image_preprocessor
+from app.services.resilience import DeadlineExceeded, UpstreamCaller, is_availability_error
+from app.services.routing import RoutingPool
+from app.utils.cache import LRUCache
+from app.utils.image import bytes_to_base64, sniff_image_mime_type, warm_up_codecs
+from app.utils.metrics import GENERATIONS, PAYLOAD_BYTES
+from app.utils.shared_cache import SharedCache
+from app.utils.timing import record_stage
+
+if TYPE_CHECKING:
+    # The SDK takes a large share of the startup time; it is imported when
+    # the first client is created (see GeminiService.warm_up)
+    from google import genai
+    from google.genai import types
 
 logger = logging.getLogger(__name__)
 
@@ -20,77 +32,364 @@ logger = logging.getLogger(__name__)
 class GeminiService:
     """Service for interacting with Google Gemini API."""
     
-    def __init__(self):
-        """Initialize the Gemini service with API credentials."""
+    def __init__(
+        self,
+        preprocessor: Optional[ImagePreprocessor] = None,
+        pool: Optional[RoutingPool] = None,
+        upstream: Optional[UpstreamCaller] = None,
+        image_store: Optional[ImageStore] = None,
+        shared_results: Optional[SharedCache] = None
+    ):
+        """
+        Initialize the Gemini service with API credentials.
+        
+        Args:
+            preprocessor: Context image preprocessor (defaults to the singleton)
+            pool: API keys and models to route generations over; by default
+                the ones in the settings, with clients created on first use
+                that share one pooled async HTTP transport
+            upstream: Deadline, retry and hedging policy for upstream calls
+            image_store: Store keeping generated images (defaults to the
+                singleton when GENERATED_IMAGE_STORE is enabled)
+            shared_results: Result cache shared with the other workers
+                (defaults to one at SHARED_CACHE_PATH, if set)
+        """
+        self._transport: Optional[httpx.AsyncHTTPTransport] = None
+        self._transport_lock = threading.Lock()
         try:
-            self.client = genai.Client(api_key=settings.gemini_api_key)
-            self.model_name = settings.model_name
-            logger.info(f"Gemini service initialized with model: {self.model_name}")
+            self.pool = pool or RoutingPool.from_settings(self._create_client)
+            self.model_name = self.pool.default_model
+            self.preprocessor = preprocessor or get_image_preprocessor()
+            self.upstream = upstream or UpstreamCaller()
+            self.image_store = image_store or (
+                get_image_store() if settings.generated_image_store else None
+            )
+            self.single_flight = SingleFlight()
+            self.result_cache = LRUCache(
+                settings.result_cache_max_bytes,
+                ttl=settings.result_cache_ttl
+            )
+            self.shared_results = shared_results
+            if shared_results is None and settings.shared_cache_path:
+                self.shared_results = SharedCache(
+                    settings.shared_cache_path,
+                    namespace="results",
+                    max_bytes=settings.shared_cache_result_max_bytes,
+                    ttl=settings.result_cache_ttl
+                )
+            logger.info(
+                f"Gemini service initialized with models: {', '.join(self.pool.models)} "
+                f"on {len(self.pool.backends)} API key(s)"
+            )
         except Exception as e:
             logger.error(f"Failed to initialize Gemini client: {e}")
             raise RuntimeError(f"Failed to initialize Gemini service: {str(e)}")
     
+    def _create_client(self, api_key: str) -> "genai.Client":
+        """Create a Gemini client for an API key; all keys share one connection pool."""
+        from google import genai
+        from google.genai import types
+        
+        with self._transport_lock:
+            if self._transport is None:
+                self._transport = httpx.AsyncHTTPTransport(
+                    limits=httpx.Limits(
+                        max_connections=settings.upstream_max_connections,
+                        max_keepalive_connections=settings.upstream_max_keepalive_connections,
+                        keepalive_expiry=settings.upstream_keepalive_expiry
+                    )
+                )
+        # Passing a transport also makes the SDK use httpx instead of aiohttp
+        return genai.Client(
+            api_key=api_key,
+            http_options=types.HttpOptions(
+                async_client_args={"transport": self._transport}
+            )
+        )
+    
+    async def warm_up(self) -> None:
+        """
+        Do the one-time setup the first request would otherwise pay for.
+        
+        Imports the SDK and creates the clients, and loads the PIL codecs,
+        in a worker thread so the event loop keeps serving meanwhile. The
+        connection pool is opened by the first health probe that follows.
+        """
+        start_time = time.perf_counter()
+        await asyncio.to_thread(self.pool.create_clients)
+        await asyncio.to_thread(warm_up_codecs)
+        logger.info(f"Gemini service warmed up in {time.perf_counter() - start_time:.2f} seconds")
+    
+    async def aclose(self) -> None:
+        """Close the pooled upstream connections and the shared result cache."""
+        if self.shared_results is not None:
+            self.shared_results.close()
+        if self._transport is not None:
+            await self._transport.aclose()
+            self._transport = None
+            logger.info("Closed Gemini connection pool")
+    
     async def generate_image(
         self,
         prompt: str,
-        context_images: Optional[List[str]] = None,
-        temperature: Optional[float] = None
+        context_images: Optional[List[bytes]] = None,
+        temperature: Optional[float] = None,
+        use_cache: bool = False,
+        prepared_context: Optional[Tuple[List["types.Part"], Dict[str, Any]]] = None,
+        model: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Generate an image, sharing work between identical requests.
+        
+        Identical requests in flight at the same time are coalesced into a
+        single upstream generation. Successful results are cached, in memory
+        and in the shared cache if configured, when the request is
+        deterministic (temperature 0) or asks for caching.
+        
+        Args:
+            prompt: Text prompt for image generation
+            context_images: Optional list of raw context image bytes
+            temperature: Generation temperature (0.0 to 2.0)
+            use_cache: Allow serving and storing a cached result
+            prepared_context: Context images already run through the
+                preprocessor, as returned by prepare_context()
+            model: Model to generate with (defaults to the pool's default)
+            
+        Returns:
+            Dictionary containing the generated image and metadata
+        """
+        model = model or self.model_name
+        key = generation_request_key(prompt, context_images, temperature, model)
+        cacheable = (
+            (self.result_cache.max_bytes > 0 or self.shared_results is not None)
+            and (use_cache or temperature == 0)
+        )
+        
+        result, cache_status = await self._cached_result(key) if cacheable else (None, None)
+        if result is None and settings.coalesce_requests:
+            result, shared = await self.single_flight.run(
+                key,
+                lambda: self._generate_image(
+                    prompt, context_images, temperature, prepared_context, model
+                )
+            )
+            cache_status = "coalesced" if shared else "miss"
+        elif result is None:
+            result = await self._generate_image(
+                prompt, context_images, temperature, prepared_context, model
+            )
+            cache_status = "miss"
+        
+        GENERATIONS.inc(status="succeeded" if result["success"] else "failed")
+        if cacheable and cache_status in ("miss", "coalesced") and result["success"]:
+            self.result_cache.put(key, result, self._result_size(result))
+            if self.shared_results is not None:
+                await asyncio.to_thread(self._shared_result_put, key, result)
+        
+        # Results can be shared between callers, so never mutate them
+        cache_stats = self.result_cache.stats()
+        return {
+            **result,
+            "metadata": {
+                **(result.get("metadata") or {}),
+                "cache": {
+                    "status": cache_status,
+                    "cacheable": cacheable,
+                    "hit_rate": cache_stats["hit_rate"],
+                    "coalesced_total": self.single_flight.coalesced
+                }
+            }
+        }
+    
+    async def _cached_result(self, key: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        Look up a result in the in-memory cache, then in the shared cache.
+        
+        Args:
+            key: Generation request key
+        
+        Returns:
+            Tuple of (cached result or None, "hit" or "shared_hit" or None)
+        """
+        result = self.result_cache.get(key)
+        cache_status = "hit"
+        if result is None and self.shared_results is not None:
+            result = await asyncio.to_thread(self._shared_result_get, key)
+            cache_status = "shared_hit"
+            if result is not None:
+                self.result_cache.put(key, result, self._result_size(result))
+        
+        if result is None or not self._image_available(result):
+            return None, None
+        return result, cache_status
+    
+    def _shared_result_get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Read a result from the shared cache (blocking)."""
+        try:
+            value = self.shared_results.get(key)
+            return json.loads(value) if value is not None else None
+        except (sqlite3.Error, ValueError) as e:
+            logger.warning(f"Shared result cache lookup failed: {e}")
+            return None
+    
+    def _shared_result_put(self, key: str, result: Dict[str, Any]) -> None:
+        """Write a result to the shared cache (blocking)."""
+        try:
+            self.shared_results.put(key, json.dumps(result).encode("utf-8"))
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.warning(f"Shared result cache update failed: {e}")
+    
+    @staticmethod
+    def _result_size(result: Dict[str, Any]) -> int:
+        """Approximate in-memory cache size of a result."""
+        return len(result.get("image") or result["image_id"])
+    
+    def _image_available(self, result: Dict[str, Any]) -> bool:
+        """Check that a cached result's image was not evicted from the store since."""
+        if "image" in result or self.image_store is None:
+            return True
+        return self.image_store.get_file(result["image_id"]) is not None
+    
+    async def _deliver_image(self, image_data: bytes) -> Dict[str, Any]:
+        """
+        Build the response fields of a generated image.
+        
+        The image is kept in the image store and referenced by URL, and also
+        returned as base64 when inline images are enabled or it could not be
+        stored.
+        
+        Args:
+            image_data: Generated image bytes
+            
+        Returns:
+            Dictionary with "image_id" and "image_url" and/or "image"
+        """
+        fields: Dict[str, Any] = {}
+        if self.image_store is not None:
+            mime_type = sniff_image_mime_type(image_data)
+            try:
+                if mime_type is None:
+                    raise ValueError("Unrecognized image format")
+                start_time = time.perf_counter()
+                image_id = await asyncio.to_thread(self.image_store.put, image_data, mime_type)
+                record_stage("store", time.perf_counter() - start_time)
+                fields["image_id"] = image_id
+                fields["image_url"] = image_url(image_id)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not store generated image: {e}")
+        
+        if settings.generated_image_inline or "image_id" not in fields:
+            fields["image"] = bytes_to_base64(image_data)
+        return fields
+    
+    async def prepare_context(
+        self,
+        context_images: List[bytes]
+    ) -> Tuple[List["types.Part"], Dict[str, Any]]:
+        """
+        Preprocess context images once so several generations can share them.
+        
+        Args:
+            context_images: Raw context image bytes
+            
+        Returns:
+            Tuple of (Gemini content parts, preprocessing stats)
+        """
+        return await self.preprocessor.prepare_images(context_images)
+    
+    async def _build_contents(
+        self,
+        prompt: str,
+        context_images: Optional[List[bytes]],
+        prepared_context: Optional[Tuple[List["types.Part"], Dict[str, Any]]]
+    ) -> Tuple[List[Any], Optional[Dict[str, Any]]]:
+        """
+        Assemble the model contents: context images first, then the prompt.
+        
+        Args:
+            prompt: Text prompt for image generation
+            context_images: Optional list of raw context image bytes
+            prepared_context: Already preprocessed context images
+        
+        Returns:
+            Tuple of (contents, preprocessing stats or None)
+        """
+        contents: List[Any] = []
+        preprocessing_stats = None
+        
+        # Add context images if provided, preprocessed in the worker pool
+        if prepared_context is not None:
+            image_parts, preprocessing_stats = prepared_context
+            contents.extend(image_parts)
+        elif context_images:
+            image_parts, preprocessing_stats = await self.prepare_context(context_images)
+            contents.extend(image_parts)
+        
+        if preprocessing_stats:
+            logger.info(
+                f"Added {len(contents)} context images to prompt "
+                f"(preprocessed in {preprocessing_stats['wall_time']:.3f}s)"
+            )
+        
+        # Add the text prompt
+        contents.append(prompt)
+        return contents, preprocessing_stats
+    
+    @staticmethod
+    def _build_config(temperature: Optional[float]) -> Optional["types.GenerateContentConfig"]:
+        """Build the generation config, or None to use the model defaults."""
+        generation_config = {}
+        if temperature is not None:
+            generation_config['temperature'] = temperature
+        if not generation_config:
+            return None
+        from google.genai import types
+        return types.GenerateContentConfig(**generation_config)
+    
+    async def _generate_image(
+        self,
+        prompt: str,
+        context_images: Optional[List[bytes]] = None,
+        temperature: Optional[float] = None,
+        prepared_context: Optional[Tuple[List["types.Part"], Dict[str, Any]]] = None,
+        model: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Generate an image using Gemini API.
         
         Args:
             prompt: Text prompt for image generation
-            context_images: Optional list of base64 encoded context images
+            context_images: Optional list of raw context image bytes
             temperature: Generation temperature (0.0 to 2.0)
+            prepared_context: Already preprocessed context images
+            model: Model to generate with (defaults to the pool's default)
             
         Returns:
             Dictionary containing the generated image and metadata
         """
         start_time = time.time()
+        # The whole request, preprocessing included, shares one deadline
+        deadline = time.monotonic() + self.upstream.timeout
+        model = model or self.model_name
         
         try:
-            # Prepare the content for the model
-            contents = []
-            
-            # Add context images if provided
-            if context_images:
-                for img_base64 in context_images:
-                    # Convert base64 to PIL and resize if needed
-                    pil_image = base64_to_pil(img_base64)
-                    pil_image = resize_image_if_needed(pil_image)
-                    
-                    # Convert back to bytes for Gemini
-                    buffer = BytesIO()
-                    pil_image.save(buffer, format='PNG')
-                    buffer.seek(0)
-                    
-                    # Add image as inline data using the correct API
-                    contents.append(types.Part.from_bytes(
-                        data=buffer.getvalue(),
-                        mime_type="image/png"
-                    ))
-                    
-                logger.info(f"Added {len(context_images)} context images to prompt")
-            
-            # Add the text prompt
-            contents.append(prompt)
-            
-            # Configure generation settings
-            generation_config = {}
-            if temperature is not None:
-                generation_config['temperature'] = temperature
+            model = self.pool.resolve_model(model)
+            contents, preprocessing_stats = await self._build_contents(
+                prompt, context_images, prepared_context
+            )
+            config = self._build_config(temperature)
             
             # Generate content asynchronously
             logger.info(f"Generating image with prompt: {prompt[:100]}...")
             
-            response = await asyncio.to_thread(
-                self.client.models.generate_content,
-                model=self.model_name,
-                contents=contents,
-                config=types.GenerateContentConfig(
-                    **generation_config
-                ) if generation_config else None
+            # Every attempt is routed to the least-loaded API key separately
+            response, upstream_stats = await self.upstream.call(
+                lambda: self.pool.call(model, lambda client: client.aio.models.generate_content(
+                    model=model,
+                    contents=contents,
+                    config=config
+                )),
+                deadline=deadline
             )
             
             # Extract the generated image from response
@@ -107,25 +406,28 @@ class GeminiService:
             if not generated_image_data:
                 raise ValueError("No image was generated in the response")
             
-            # Convert to base64
-            image_base64 = bytes_to_base64(generated_image_data)
+            PAYLOAD_BYTES.observe(len(generated_image_data), kind="generated_image")
+            image_fields = await self._deliver_image(generated_image_data)
             
             generation_time = time.time() - start_time
             
             # Prepare metadata
             metadata = {
                 "generation_time": generation_time,
-                "model_used": self.model_name,
+                "model_used": model,
                 "prompt_length": len(prompt),
                 "context_images_count": len(context_images) if context_images else 0,
                 "temperature": temperature
             }
+            if preprocessing_stats:
+                metadata["preprocessing"] = preprocessing_stats
+            metadata["upstream"] = upstream_stats
             
             logger.info(f"Successfully generated image in {generation_time:.2f} seconds")
             
             return {
                 "success": True,
-                "image": image_base64,
+                **image_fields,
                 "metadata": metadata
             }
             
@@ -136,33 +438,145 @@ class GeminiService:
                 "error": str(e),
                 "metadata": {
                     "generation_time": time.time() - start_time,
-                    "model_used": self.model_name
+                    "model_used": model
                 }
             }
     
+    async def generate_image_stream(
+        self,
+        prompt: str,
+        context_images: Optional[List[bytes]] = None,
+        temperature: Optional[float] = None,
+        model: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Generate an image, yielding the response parts as the model produces them.
+        
+        Opening the stream is retried like a regular call; once parts have
+        been forwarded nothing is retried. Closing the generator (e.g. when
+        the client disconnects) closes the upstream stream as well.
+        
+        Args:
+            prompt: Text prompt for image generation
+            context_images: Optional list of raw context image bytes
+            temperature: Generation temperature (0.0 to 2.0)
+            model: Model to generate with (defaults to the pool's default)
+        
+        Yields:
+            Events as {"event": name, "data": payload}: "text" and "image"
+            for each response part, then a final "done" with the success flag
+            and metadata, preceded by "error" if the generation failed
+        """
+        start_time = time.time()
+        deadline = time.monotonic() + self.upstream.timeout
+        model = model or self.model_name
+        metadata: Dict[str, Any] = {
+            "model_used": model,
+            "prompt_length": len(prompt),
+            "context_images_count": len(context_images) if context_images else 0,
+            "temperature": temperature
+        }
+        stream = None
+        images_count = 0
+        
+        try:
+            model = self.pool.resolve_model(model)
+            contents, preprocessing_stats = await self._build_contents(prompt, context_images, None)
+            if preprocessing_stats:
+                metadata["preprocessing"] = preprocessing_stats
+            
+            logger.info(f"Streaming image generation with prompt: {prompt[:100]}...")
+            
+            upstream_start = time.perf_counter()
+            stream, metadata["upstream"] = await self.upstream.call(
+                lambda: self.pool.open_stream(model, lambda client: client.aio.models.generate_content_stream(
+                    model=model,
+                    contents=contents,
+                    config=self._build_config(temperature)
+                )),
+                deadline=deadline,
+                hedge=False
+            )
+            
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise DeadlineExceeded("Upstream stream did not finish before the request deadline")
+                try:
+                    chunk = await asyncio.wait_for(stream.__anext__(), timeout=remaining)
+                except StopAsyncIteration:
+                    break
+                except Exception as e:
+                    # The upstream call lasts until the stream ends, not
+                    # just until it opened
+                    record_upstream_outcome(time.perf_counter() - upstream_start, not is_availability_error(e))
+                    if isinstance(e, asyncio.TimeoutError):
+                        raise DeadlineExceeded("Upstream stream did not finish before the request deadline")
+                    raise
+                
+                if "time_to_first_part" not in metadata:
+                    metadata["time_to_first_part"] = time.time() - start_time
+                
+                if not chunk.candidates or not chunk.candidates[0].content:
+                    continue
+                for part in chunk.candidates[0].content.parts or []:
+                    if part.text:
+                        yield {"event": "text", "data": {"text": part.text}}
+                    elif part.inline_data and part.inline_data.data:
+                        images_count += 1
+                        PAYLOAD_BYTES.observe(len(part.inline_data.data), kind="generated_image")
+                        yield {
+                            "event": "image",
+                            "data": {
+                                **await self._deliver_image(part.inline_data.data),
+                                "mime_type": part.inline_data.mime_type
+                            }
+                        }
+            
+            record_upstream_outcome(time.perf_counter() - upstream_start, True)
+            
+            if not images_count:
+                raise ValueError("No image was generated in the response")
+            success = True
+        except Exception as e:
+            logger.error(f"Error streaming image generation: {e}")
+            yield {"event": "error", "data": {"error": str(e)}}
+            success = False
+        finally:
+            # Also runs on cancellation, releasing the upstream connection
+            if stream is not None:
+                await stream.aclose()
+        
+        metadata["generation_time"] = time.time() - start_time
+        metadata["images_count"] = images_count
+        GENERATIONS.inc(status="succeeded" if success else "failed")
+        if success:
+            logger.info(f"Successfully streamed image in {metadata['generation_time']:.2f} seconds")
+        yield {"event": "done", "data": {"success": success, "metadata": metadata}}
+    
     async def health_check(self) -> bool:
         """
         Check if the Gemini service is healthy and accessible.
         
+        Every API key is checked; keys failing the check are routed around
+        until they pass again.
+        
         Returns:
-            True if service is healthy, False otherwise
+            True if the service is healthy with at least one key, False otherwise
         """
+        return await self.pool.probe(self._check_client)
+    
+    async def _check_client(self, client: "genai.Client") -> bool:
+        """Check one API key's client."""
         try:
-            # Try a simple API call to verify connectivity
-            # Using a minimal prompt to check service availability
-            test_prompt = "test"
-            
-            response = await asyncio.to_thread(
-                self.client.models.generate_content,
-                model=self.model_name,
-                contents=test_prompt,
-                config=types.GenerateContentConfig(
-                    max_output_tokens=1,
-                    temperature=0.1
-                )
+            # Fetching the model metadata verifies the API key, connectivity
+            # and model availability without a billable generation
+            model = await asyncio.wait_for(
+                client.aio.models.get(model=self.model_name),
+                timeout=settings.health_probe_timeout
             )
             
-            return response is not None
+            return model is not None
         except Exception as e:
             logger.error(f"Health check failed: {e}")
             return False
@@ -177,4 +591,12 @@ def get_gemini_service() -> GeminiService:
     global _gemini_service
     if _gemini_service is None:
         _gemini_service = GeminiService()
-    return _gemini_service
\ No newline at end of file
+    return _gemini_service
+
+
+async def close_gemini_service() -> None:
+    """Close the Gemini service singleton if it was created."""
+    global _gemini_service
+    if _gemini_service is not None:
+        await _gemini_service.aclose()
+        _gemini_service = None
\ No newline at end of file
@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import time
+from typing import Optional, Awaitable, Callable, Dict, Any
+
+from app.config import settings
+from app.services.gemini import get_gemini_service
+from app.services.resilience import UpstreamCaller
+
+logger = logging.getLogger(__name__)
+
+
+class HealthMonitor:
+    """
+    Tracks upstream readiness in the background so probes are answered
+    from memory.
+
+    A prober checks the upstream at a fixed interval, skipping the check
+    when real traffic succeeded recently. It first runs the optional warm-up,
+    so the service is never reported ready before the warm-up finished. The
+    service is ready once a check succeeded, until checks fail repeatedly or
+    recent real traffic mostly fails.
+    """
+
+    def __init__(
+        self,
+        probe: Callable[[], Awaitable[bool]],
+        upstream: UpstreamCaller,
+        interval: Optional[float] = None,
+        failure_threshold: Optional[int] = None,
+        traffic_window: Optional[float] = None,
+        traffic_min_samples: Optional[int] = None,
+        traffic_error_threshold: Optional[float] = None,
+        warm_up: Optional[Callable[[], Awaitable[None]]] = None
+    ):
+        """
+        Initialize the monitor; optional arguments default to settings.
+
+        Args:
+            probe: Non-billable upstream check returning True when healthy
+            upstream: Caller whose recent outcomes reflect real traffic
+            interval: Seconds between probes
+            failure_threshold: Consecutive probe failures before not ready
+            traffic_window: Seconds of real traffic considered
+            traffic_min_samples: Calls needed in the window to judge traffic
+            traffic_error_threshold: Traffic error rate that makes us not ready
+            warm_up: One-time setup run in the background before the first probe
+        """
+        self.probe = probe
+        self.upstream = upstream
+        self.interval = interval or settings.health_probe_interval
+        self.failure_threshold = failure_threshold or settings.health_probe_failure_threshold
+        self.traffic_window = traffic_window or settings.health_traffic_window
+        self.traffic_min_samples = (
+            settings.health_traffic_min_samples
+            if traffic_min_samples is None else traffic_min_samples
+        )
+        self.traffic_error_threshold = (
+            settings.health_traffic_error_threshold
+            if traffic_error_threshold is None else traffic_error_threshold
+        )
+
+        self.warm_up = warm_up
+        self.warmed_up = warm_up is None
+        self.warm_up_time: Optional[float] = None
+        self.probe_ok: Optional[bool] = None
+        self.consecutive_failures = 0
+        self.last_probe: Optional[float] = None
+        self.probes = 0
+        self.probes_skipped = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def check_once(self) -> None:
+        """Run one probe, unless real traffic succeeded within the interval."""
+        last_success = self.upstream.last_success
+        if last_success is not None and time.monotonic() - last_success < self.interval:
+            self.probes_skipped += 1
+            healthy = True
+        else:
+            self.probes += 1
+            try:
+                healthy = await self.probe()
+            except Exception as e:
+                logger.error(f"Health probe failed: {e}")
+                healthy = False
+
+        self.last_probe = time.time()
+        if healthy:
+            if self.probe_ok is False:
+                logger.info("Upstream health probe recovered")
+            self.consecutive_failures = 0
+            self.probe_ok = True
+        else:
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.failure_threshold or self.probe_ok is None:
+                if self.probe_ok is not False:
+                    logger.warning(
+                        f"Upstream health probe failed {self.consecutive_failures} times, "
+                        f"marking not ready"
+                    )
+                self.probe_ok = False
+
+    async def _warm_up(self) -> None:
+        """Run the warm-up; a failure is left for the probes to report."""
+        start_time = time.perf_counter()
+        try:
+            await self.warm_up()
+        except Exception as e:
+            logger.error(f"Warm-up failed: {e}")
+        self.warm_up_time = time.perf_counter() - start_time
+        self.warmed_up = True
+
+    async def _run(self) -> None:
+        if not self.warmed_up:
+            await self._warm_up()
+        while True:
+            await self.check_once()
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        """Start probing in the background."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Started health prober (every {self.interval:.0f}s)")
+
+    async def stop(self) -> None:
+        """Stop the background prober."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _traffic_error_rate(self) -> Optional[float]:
+        """Error rate of real traffic in the window, None with too few calls."""
+        successes, failures = self.upstream.recent_outcomes(self.traffic_window)
+        total = successes + failures
+        if total < max(1, self.traffic_min_samples):
+            return None
+        return failures / total
+
+    @property
+    def ready(self) -> bool:
+        error_rate = self._traffic_error_rate()
+        traffic_ok = error_rate is None or error_rate <= self.traffic_error_threshold
+        return self.warmed_up and bool(self.probe_ok) and traffic_ok
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Get the current readiness and the signals it is based on.
+
+        Returns:
+            Dictionary with the ready flag, warm-up and probe state and
+            traffic error rate
+        """
+        error_rate = self._traffic_error_rate()
+        return {
+            "ready": self.ready,
+            "warmed_up": self.warmed_up,
+            "warm_up_time": self.warm_up_time,
+            "probe_ok": self.probe_ok,
+            "consecutive_failures": self.consecutive_failures,
+            "last_probe": self.last_probe,
+            "probes": self.probes,
+            "probes_skipped": self.probes_skipped,
+            "traffic_error_rate": error_rate
+        }
+
+
+# Singleton instance
+_health_monitor: Optional[HealthMonitor] = None
+
+
+def get_health_monitor() -> HealthMonitor:
+    """Get or create the health monitor singleton."""
+    global _health_monitor
+    if _health_monitor is None:
+        gemini_service = get_gemini_service()
+        _health_monitor = HealthMonitor(
+            gemini_service.health_check,
+            gemini_service.upstream,
+            warm_up=gemini_service.warm_up
+        )
+    return _health_monitor
+
+
+async def shutdown_health_monitor() -> None:
+    """Stop the health monitor singleton if it was created."""
+    global _health_monitor
+    if _health_monitor is not None:
+        await _health_monitor.stop()
+        _health_monitor = None
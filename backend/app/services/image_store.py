@@ -0,0 +1,305 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, List, Dict, Any
+
+from app.config import settings
+from app.models.schemas import IMAGE_ID_REGEX
+
+logger = logging.getLogger(__name__)
+
+_EXTENSIONS = {
+    "image/png": "png",
+    "image/jpeg": "jpg",
+    "image/webp": "webp",
+    "image/gif": "gif",
+}
+_MIME_TYPES = {ext: mime for mime, ext in _EXTENSIONS.items()}
+
+
+def image_url(image_id: str) -> str:
+    """URL path serving a stored image."""
+    return f"/api/images/{image_id}"
+
+
+class ImageStore:
+    """Content-addressed image store on local disk with an in-memory index."""
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        max_bytes: Optional[int] = None,
+        ttl: Optional[int] = None
+    ):
+        """
+        Initialize the store and rebuild the index from disk.
+
+        Args:
+            directory: Storage directory (defaults to settings)
+            max_bytes: Maximum total size of stored images (defaults to settings)
+            ttl: Seconds an image is kept after its last access (defaults to settings)
+        """
+        self.directory = Path(directory or settings.image_store_dir)
+        self.max_bytes = max_bytes if max_bytes is not None else settings.image_store_max_bytes
+        self.ttl = ttl if ttl is not None else settings.image_store_ttl
+        self.current_bytes = 0
+        # image_id -> entry, ordered from least to most recently used
+        self._index: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self) -> None:
+        """Rebuild the in-memory index from the files on disk."""
+        entries = []
+        for path in self.directory.iterdir():
+            image_id, _, ext = path.name.partition(".")
+            if not IMAGE_ID_REGEX.match(image_id) or ext not in _MIME_TYPES:
+                continue
+            stat = path.stat()
+            entries.append((stat.st_mtime, image_id, {
+                "path": path,
+                "size": stat.st_size,
+                "mime_type": _MIME_TYPES[ext],
+                "last_access": stat.st_mtime
+            }))
+
+        for _, image_id, entry in sorted(entries, key=lambda item: item[0]):
+            self._index[image_id] = entry
+            self.current_bytes += entry["size"]
+
+        logger.info(
+            f"Image store loaded {len(self._index)} images "
+            f"({self.current_bytes} bytes) from {self.directory}"
+        )
+        self.evict()
+
+    def put(self, data: bytes, mime_type: str) -> str:
+        """
+        Store an image and return its content hash.
+
+        Storing the same bytes again only refreshes the entry.
+
+        Args:
+            data: Raw image bytes
+            mime_type: Image mime type
+
+        Returns:
+            Image ID (hex SHA-256 of the image bytes)
+        """
+        if mime_type not in _EXTENSIONS:
+            raise ValueError(f"Unsupported image type: {mime_type}")
+
+        image_id = hashlib.sha256(data).hexdigest()
+
+        with self._lock:
+            entry = self._index.get(image_id)
+            if entry is not None and entry["path"].exists():
+                entry["last_access"] = time.time()
+                self._index.move_to_end(image_id)
+                return image_id
+
+        path = self.directory / f"{image_id}.{_EXTENSIONS[mime_type]}"
+
+        # Write to a temporary file first so readers never see partial images
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                tmp_file.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        with self._lock:
+            previous = self._index.pop(image_id, None)
+            if previous is not None:
+                self.current_bytes -= previous["size"]
+            self._index[image_id] = {
+                "path": path,
+                "size": len(data),
+                "mime_type": mime_type,
+                "last_access": time.time()
+            }
+            self.current_bytes += len(data)
+
+        self.evict()
+        return image_id
+
+    def get(self, image_id: str) -> Optional[bytes]:
+        """
+        Read a stored image.
+
+        Args:
+            image_id: Image ID returned by put()
+
+        Returns:
+            Raw image bytes, or None if the image is unknown or expired
+        """
+        entry = self._touch(image_id)
+        if entry is None:
+            return None
+
+        try:
+            return entry["path"].read_bytes()
+        except FileNotFoundError:
+            self._remove(image_id)
+            return None
+
+    def get_file(self, image_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Locate a stored image without reading it, e.g. to serve it as a file.
+
+        Args:
+            image_id: Image ID returned by put()
+
+        Returns:
+            Dictionary with the path, size and mime type, or None if the
+            image is unknown or expired
+        """
+        entry = self._touch(image_id)
+        if entry is None:
+            return None
+
+        if not entry["path"].exists():
+            self._remove(image_id)
+            return None
+        return {
+            "path": entry["path"],
+            "size": entry["size"],
+            "mime_type": entry["mime_type"]
+        }
+
+    def get_many(self, image_ids: List[str]) -> List[Optional[bytes]]:
+        """
+        Read several stored images.
+
+        Args:
+            image_ids: Image IDs returned by put()
+
+        Returns:
+            Raw image bytes for each ID, None for unknown or expired images
+        """
+        return [self.get(image_id) for image_id in image_ids]
+
+    def _adopt(self, image_id: str) -> Optional[Dict[str, Any]]:
+        """Index an image another worker process stored in the same directory."""
+        if not IMAGE_ID_REGEX.match(image_id):
+            return None
+
+        for ext, mime_type in _MIME_TYPES.items():
+            path = self.directory / f"{image_id}.{ext}"
+            try:
+                size = path.stat().st_size
+            except FileNotFoundError:
+                continue
+
+            with self._lock:
+                entry = self._index.get(image_id)
+                if entry is None:
+                    entry = {
+                        "path": path,
+                        "size": size,
+                        "mime_type": mime_type,
+                        "last_access": time.time()
+                    }
+                    self._index[image_id] = entry
+                    self.current_bytes += size
+            return entry
+        return None
+
+    def _touch(self, image_id: str) -> Optional[Dict[str, Any]]:
+        """Mark an entry as used, dropping it instead if it has expired."""
+        now = time.time()
+        expired = False
+        with self._lock:
+            entry = self._index.get(image_id)
+            if entry is not None:
+                if self.ttl and now - entry["last_access"] > self.ttl:
+                    expired = True
+                else:
+                    entry["last_access"] = now
+                    self._index.move_to_end(image_id)
+
+        if entry is None:
+            # Not stored by this process, possibly by another worker
+            return self._adopt(image_id)
+        if expired:
+            self._remove(image_id)
+            return None
+        return entry
+
+    def _remove(self, image_id: str) -> None:
+        """Drop an entry from the index and delete its file."""
+        with self._lock:
+            entry = self._index.pop(image_id, None)
+            if entry is None:
+                return
+            self.current_bytes -= entry["size"]
+
+        try:
+            entry["path"].unlink()
+        except FileNotFoundError:
+            pass
+
+    def evict(self) -> int:
+        """
+        Remove expired images, then least recently used ones until the
+        store fits within its size limit.
+
+        Returns:
+            Number of images removed
+        """
+        now = time.time()
+        with self._lock:
+            victims = [
+                image_id for image_id, entry in self._index.items()
+                if self.ttl and now - entry["last_access"] > self.ttl
+            ]
+            expired = set(victims)
+            remaining = self.current_bytes - sum(self._index[i]["size"] for i in victims)
+            for image_id, entry in self._index.items():
+                if remaining <= self.max_bytes:
+                    break
+                if image_id not in expired:
+                    victims.append(image_id)
+                    remaining -= entry["size"]
+
+        for image_id in victims:
+            self._remove(image_id)
+
+        if victims:
+            logger.info(f"Evicted {len(victims)} images from image store")
+        return len(victims)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get store usage.
+
+        Returns:
+            Dictionary with image count and size information
+        """
+        return {
+            "images": len(self._index),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes
+        }
+
+
+# Singleton instance
+_image_store: Optional[ImageStore] = None
+
+
+def get_image_store() -> ImageStore:
+    """Get or create the image store singleton."""
+    global _image_store
+    if _image_store is None:
+        _image_store = ImageStore()
+    return _image_store
@@ -0,0 +1,246 @@
+import asyncio
+import contextvars
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional, Awaitable, Callable, Dict, Any
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = {"succeeded", "failed", "cancelled"}
+JOB_STATUSES = ("queued", "running", "succeeded", "failed", "cancelled")
+
+
+class JobCapacityExceeded(Exception):
+    """Raised when the registry already holds the maximum number of jobs."""
+
+
+class Job:
+    """A generation running in the background, tracked by ID."""
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def set_status(self, status: str) -> None:
+        """Update the status and wake everyone waiting for a change."""
+        self.status = status
+        now = time.time()
+        if status == "running":
+            self.started_at = now
+        elif status in FINISHED_STATUSES:
+            self.finished_at = now
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait_for_change(self, timeout: float) -> bool:
+        """
+        Wait until the job status changes.
+
+        Args:
+            timeout: Maximum seconds to wait
+
+        Returns:
+            True if the status changed, False on timeout
+        """
+        changed = self._changed
+        try:
+            await asyncio.wait_for(changed.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Get a JSON-serializable view of the job.
+
+        Returns:
+            Dictionary with status, timestamps and the result once finished
+        """
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error
+        }
+
+
+class JobRegistry:
+    """In-process registry of background generation jobs with bounded retention."""
+
+    def __init__(self, max_jobs: Optional[int] = None, retention: Optional[int] = None):
+        """
+        Initialize an empty registry.
+
+        Args:
+            max_jobs: Maximum number of jobs kept, running or finished
+                (defaults to settings)
+            retention: Seconds a finished job is kept (defaults to settings)
+        """
+        self.max_jobs = max_jobs or settings.job_max_jobs
+        self.retention = settings.job_retention if retention is None else retention
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+
+    def _prune(self) -> None:
+        """Forget expired finished jobs, then the oldest finished ones if full."""
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished and now - job.finished_at > self.retention:
+                del self._jobs[job_id]
+
+        if len(self._jobs) >= self.max_jobs:
+            for job_id, job in list(self._jobs.items()):
+                if len(self._jobs) < self.max_jobs:
+                    break
+                if job.finished:
+                    del self._jobs[job_id]
+
+    def submit(self, func: Callable[[Callable[[], None]], Awaitable[Dict[str, Any]]]) -> Job:
+        """
+        Start a generation in the background.
+
+        The job stays queued until func calls the callback it is given,
+        which it should do once the generation actually starts (e.g. when
+        it got an admission slot).
+
+        Args:
+            func: Function running the generation and returning its result
+                dictionary (with a "success" key)
+
+        Returns:
+            The new job
+
+        Raises:
+            JobCapacityExceeded: If max_jobs jobs are still running
+        """
+        self._prune()
+        if len(self._jobs) >= self.max_jobs:
+            raise JobCapacityExceeded(f"Too many active jobs (limit {self.max_jobs})")
+
+        job = Job()
+        self._jobs[job.id] = job
+        # Run in a fresh context so the job is not tied to the submitting
+        # request (e.g. its timing)
+        job.task = asyncio.create_task(self._run(job, func), context=contextvars.Context())
+        job.task.add_done_callback(lambda _: self._mark_cancelled(job))
+        logger.info(f"Submitted job {job.id}")
+        return job
+
+    @staticmethod
+    def _mark_cancelled(job: Job) -> None:
+        """Record a job whose task was cancelled before it got to run."""
+        if not job.finished:
+            job.error = "Job was cancelled"
+            job.set_status("cancelled")
+
+    async def _run(
+        self,
+        job: Job,
+        func: Callable[[Callable[[], None]], Awaitable[Dict[str, Any]]]
+    ) -> None:
+        try:
+            result = await func(lambda: job.set_status("running"))
+        except asyncio.CancelledError:
+            job.error = "Job was cancelled"
+            job.set_status("cancelled")
+            raise
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {e}")
+            job.error = str(e)
+            job.set_status("failed")
+            return
+
+        job.result = result
+        if not result.get("success"):
+            job.error = result.get("error", "Image generation failed")
+        job.set_status("succeeded" if result.get("success") else "failed")
+        logger.info(f"Job {job.id} finished with status {job.status}")
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """
+        Look up a job.
+
+        Args:
+            job_id: Job ID returned by submit()
+
+        Returns:
+            The job, or None if it is unknown or expired
+        """
+        job = self._jobs.get(job_id)
+        if job is not None and job.finished and time.time() - job.finished_at > self.retention:
+            del self._jobs[job_id]
+            return None
+        return job
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Cancel a queued or running job.
+
+        Args:
+            job_id: Job ID returned by submit()
+
+        Returns:
+            The job, or None if it is unknown or expired
+        """
+        job = self.get(job_id)
+        if job is not None and job.task is not None and not job.task.done():
+            job.task.cancel()
+        return job
+
+    async def shutdown(self) -> None:
+        """Cancel all unfinished jobs and wait for them to stop."""
+        tasks = [job.task for job in self._jobs.values() if job.task and not job.task.done()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+            logger.info(f"Cancelled {len(tasks)} unfinished jobs")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Count jobs by status.
+
+        Returns:
+            Dictionary mapping each status to its number of jobs
+        """
+        counts: Dict[str, Any] = dict.fromkeys(JOB_STATUSES, 0)
+        for job in self._jobs.values():
+            counts[job.status] += 1
+        return counts
+
+
+# Singleton instance
+_job_registry: Optional[JobRegistry] = None
+
+
+def get_job_registry() -> JobRegistry:
+    """Get or create the job registry singleton."""
+    global _job_registry
+    if _job_registry is None:
+        _job_registry = JobRegistry()
+    return _job_registry
+
+
+async def shutdown_job_registry() -> None:
+    """Cancel the jobs of the registry singleton if it was created."""
+    global _job_registry
+    if _job_registry is not None:
+        await _job_registry.shutdown()
+        _job_registry = None
@@ -0,0 +1,228 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Optional, List, Dict, Any, Tuple
+
+from app.config import settings
+from app.utils.cache import LRUCache
+from app.utils.image import EncodingPolicy, image_cache_key, prepare_context_image
+from app.utils.log_queue import setup_worker_logging, worker_logging_initargs
+from app.utils.metrics import PAYLOAD_BYTES
+from app.utils.shared_cache import SharedCache
+from app.utils.timing import record_stage
+
+if TYPE_CHECKING:
+    from google.genai import types
+
+logger = logging.getLogger(__name__)
+
+
+class ImagePreprocessor:
+    """Runs CPU-bound context image preprocessing off the event loop."""
+
+    def __init__(
+        self,
+        executor_type: Optional[str] = None,
+        max_workers: Optional[int] = None,
+        max_size: Optional[int] = None,
+        cache_max_bytes: Optional[int] = None,
+        policy: Optional[EncodingPolicy] = None,
+        resize_quality: Optional[str] = None,
+        shared_cache: Optional[SharedCache] = None
+    ):
+        """
+        Initialize the worker pool used for image preprocessing.
+
+        Args:
+            executor_type: "thread" or "process" (defaults to settings)
+            max_workers: Pool size (defaults to settings, then CPU count)
+            max_size: Maximum image dimension (defaults to settings)
+            cache_max_bytes: Size of the preprocessed image cache (defaults to settings)
+            policy: Upstream image encoding policy (defaults to settings)
+            resize_quality: Resize quality tier (defaults to settings)
+            shared_cache: Cache shared with the other workers, consulted on
+                misses of the in-memory cache (defaults to one at
+                SHARED_CACHE_PATH, if set)
+        """
+        self.executor_type = (executor_type or settings.preprocess_executor).lower()
+        self.max_workers = max_workers or settings.preprocess_workers or os.cpu_count() or 1
+        self.max_size = max_size or settings.max_image_dimension
+        self.resize_quality = (resize_quality or settings.resize_quality).lower()
+        self.max_pixels = settings.max_image_pixels
+        self.policy = policy or EncodingPolicy(
+            output_format=settings.upstream_image_format.lower(),
+            png_compress_level=settings.upstream_png_compress_level,
+            jpeg_quality=settings.upstream_jpeg_quality,
+            webp_quality=settings.upstream_webp_quality,
+            passthrough=settings.upstream_passthrough,
+            passthrough_max_bytes=settings.upstream_passthrough_max_bytes
+        )
+        self.cache = LRUCache(
+            settings.image_cache_max_bytes if cache_max_bytes is None else cache_max_bytes
+        )
+        self.shared_cache = shared_cache
+        if shared_cache is None and settings.shared_cache_path:
+            self.shared_cache = SharedCache(
+                settings.shared_cache_path,
+                namespace="preprocessed_images",
+                max_bytes=settings.shared_cache_image_max_bytes
+            )
+
+        if self.executor_type == "process":
+            self._executor: Executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=setup_worker_logging,
+                initargs=worker_logging_initargs()
+            )
+        elif self.executor_type == "thread":
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="image-preprocess"
+            )
+        else:
+            raise ValueError(f"Unknown preprocess executor: {self.executor_type}")
+
+        logger.info(
+            f"Image preprocessor initialized with {self.max_workers} "
+            f"{self.executor_type} workers"
+        )
+
+    async def prepare_images(
+        self,
+        images: List[bytes]
+    ) -> Tuple[List["types.Part"], Dict[str, Any]]:
+        """
+        Preprocess all context images of a request in parallel.
+
+        Images already in the preprocessed image cache, or else in the
+        shared cache, are served from there, and duplicates within the
+        request are only processed once.
+
+        Args:
+            images: List of raw context image bytes
+
+        Returns:
+            Tuple of (Gemini content parts in input order, preprocessing stats)
+        """
+        start_time = time.perf_counter()
+        loop = asyncio.get_running_loop()
+
+        keys = [
+            image_cache_key(image, self.max_size, self.policy, self.resize_quality)
+            for image in images
+        ]
+        prepared: Dict[str, Tuple[bytes, str]] = {}
+        pending: Dict[str, bytes] = {}
+        for key, image in zip(keys, images):
+            if key in prepared or key in pending:
+                continue
+            cached = self.cache.get(key)
+            if cached is not None:
+                prepared[key] = cached
+            else:
+                pending[key] = image
+
+        cache_hits = len(prepared)
+        shared_hits = 0
+        if pending and self.shared_cache is not None:
+            found = await asyncio.to_thread(self._shared_get_many, list(pending))
+            for key, value in found.items():
+                prepared[key] = value
+                self.cache.put(key, value, len(value[0]))
+                del pending[key]
+            shared_hits = len(found)
+        
+        results = await asyncio.gather(*(
+            loop.run_in_executor(
+                self._executor,
+                prepare_context_image,
+                image,
+                self.max_size,
+                self.policy,
+                self.resize_quality,
+                self.max_pixels
+            )
+            for image in pending.values()
+        ))
+
+        image_stats = []
+        for key, (data, mime_type, result_stats) in zip(pending, results):
+            prepared[key] = (data, mime_type)
+            self.cache.put(key, (data, mime_type), len(data))
+            image_stats.append(result_stats)
+            for stage in ("decode", "resize", "encode"):
+                if stage in result_stats:
+                    record_stage(stage, result_stats[stage])
+            PAYLOAD_BYTES.observe(result_stats["bytes_in"], kind="context_image")
+            PAYLOAD_BYTES.observe(result_stats["bytes_out"], kind="upstream_image")
+        if pending and self.shared_cache is not None:
+            await asyncio.to_thread(
+                self._shared_put_many,
+                {key: prepared[key] for key in pending}
+            )
+
+        from google.genai import types
+        parts = [
+            types.Part.from_bytes(data=prepared[key][0], mime_type=prepared[key][1])
+            for key in keys
+        ]
+        stats = {
+            "wall_time": time.perf_counter() - start_time,
+            "cache_hits": cache_hits,
+            "shared_cache_hits": shared_hits,
+            "cache_misses": len(pending),
+            "bytes_saved": sum(item["bytes_saved"] for item in image_stats),
+            "images": image_stats
+        }
+
+        return parts, stats
+
+    def _shared_get_many(self, keys: List[str]) -> Dict[str, Tuple[bytes, str]]:
+        """Look up preprocessed images in the shared cache (blocking)."""
+        found = {}
+        try:
+            for key in keys:
+                value = self.shared_cache.get(key)
+                if value is not None:
+                    mime_type, _, data = value.partition(b"\n")
+                    found[key] = (data, mime_type.decode("ascii"))
+        except sqlite3.Error as e:
+            logger.warning(f"Shared image cache lookup failed: {e}")
+        return found
+
+    def _shared_put_many(self, items: Dict[str, Tuple[bytes, str]]) -> None:
+        """Store preprocessed images in the shared cache (blocking)."""
+        try:
+            for key, (data, mime_type) in items.items():
+                self.shared_cache.put(key, mime_type.encode("ascii") + b"\n" + data)
+        except sqlite3.Error as e:
+            logger.warning(f"Shared image cache update failed: {e}")
+
+    def shutdown(self) -> None:
+        """Stop the worker pool without waiting for queued work."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self.shared_cache is not None:
+            self.shared_cache.close()
+
+
+# Singleton instance
+_image_preprocessor: Optional[ImagePreprocessor] = None
+
+
+def get_image_preprocessor() -> ImagePreprocessor:
+    """Get or create the image preprocessor singleton."""
+    global _image_preprocessor
+    if _image_preprocessor is None:
+        _image_preprocessor = ImagePreprocessor()
+    return _image_preprocessor
+
+
+def shutdown_image_preprocessor() -> None:
+    """Shut down the image preprocessor singleton if it was created."""
+    global _image_preprocessor
+    if _image_preprocessor is not None:
+        _image_preprocessor.shutdown()
+        _image_preprocessor = None
@@ -0,0 +1,314 @@
+import asyncio
+import logging
+import random
+import sys
+import time
+from collections import deque
+from typing import Optional, Awaitable, Callable, Deque, Dict, Any, Tuple, TypeVar
+import httpx
+
+from app.config import settings
+from app.services.admission import record_upstream_outcome
+from app.utils.metrics import UPSTREAM_CALLS
+from app.utils.timing import record_stage
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Upstream HTTP status codes worth retrying
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+# Number of finished calls remembered for health reporting
+OUTCOME_HISTORY = 1000
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the request deadline runs out before the upstream answers."""
+
+
+def _genai_errors() -> Optional[Any]:
+    """
+    The SDK's errors module, or None when the SDK has not been imported.
+
+    An error cannot come from the SDK before the SDK is loaded, so this
+    avoids importing it (slow) just to classify other errors.
+    """
+    return sys.modules.get("google.genai.errors")
+
+
+def error_status_code(error: BaseException) -> Optional[int]:
+    """
+    Get the HTTP status code of an upstream error.
+
+    Args:
+        error: Exception raised by an upstream call
+
+    Returns:
+        The status code, or None if the error carries none
+    """
+    genai_errors = _genai_errors()
+    if genai_errors is not None and isinstance(error, genai_errors.APIError):
+        return error.code
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code
+    return None
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """
+    Check whether an upstream error is worth retrying.
+
+    Args:
+        error: Exception raised by an upstream call
+
+    Returns:
+        True for rate limits, server errors, timeouts and connection errors
+    """
+    genai_errors = _genai_errors()
+    if genai_errors is not None and isinstance(error, genai_errors.APIError):
+        return error.code in TRANSIENT_STATUS_CODES
+    return isinstance(error, (httpx.TimeoutException, httpx.TransportError, asyncio.TimeoutError))
+
+
+def is_availability_error(error: BaseException) -> bool:
+    """
+    Check whether an upstream error says the upstream is unavailable to us,
+    as opposed to rejecting one particular request.
+
+    Args:
+        error: Exception raised by an upstream call
+
+    Returns:
+        False for client errors caused by the request itself, True otherwise
+    """
+    genai_errors = _genai_errors()
+    if genai_errors is not None and isinstance(error, genai_errors.ClientError):
+        return error.code in {401, 403, 408, 429}
+    return True
+
+
+class LatencyTracker:
+    """Rolling window of recent upstream latencies."""
+
+    def __init__(self, window: int = 200):
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, latency: float) -> None:
+        self._samples.append(latency)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """
+        Get a latency percentile over the window.
+
+        Args:
+            percentile: Percentile between 0 and 100
+
+        Returns:
+            Latency in seconds, or None if there are no samples
+        """
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(len(ordered) * percentile / 100))
+        return ordered[index]
+
+
+class UpstreamCaller:
+    """
+    Runs upstream calls within a deadline, with jittered retries of
+    transient failures and optional hedged duplicate requests.
+    """
+
+    def __init__(
+        self,
+        timeout: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        base_delay: Optional[float] = None,
+        max_delay: Optional[float] = None,
+        hedge_enabled: Optional[bool] = None,
+        hedge_percentile: Optional[float] = None,
+        hedge_min_samples: Optional[int] = None,
+        latency_tracker: Optional[LatencyTracker] = None
+    ):
+        """
+        Initialize the caller; every argument defaults to settings.
+
+        Args:
+            timeout: Default deadline budget in seconds
+            max_retries: Retries after the first attempt
+            base_delay: Base of the exponential backoff in seconds
+            max_delay: Cap of the exponential backoff in seconds
+            hedge_enabled: Whether to send hedged duplicate requests
+            hedge_percentile: Latency percentile after which to hedge
+            hedge_min_samples: Latency samples needed before hedging
+            latency_tracker: Shared latency window (a new one by default)
+        """
+        self.timeout = timeout or settings.api_timeout
+        self.max_retries = settings.upstream_max_retries if max_retries is None else max_retries
+        self.base_delay = settings.upstream_retry_base_delay if base_delay is None else base_delay
+        self.max_delay = settings.upstream_retry_max_delay if max_delay is None else max_delay
+        self.hedge_enabled = settings.upstream_hedge_enabled if hedge_enabled is None else hedge_enabled
+        self.hedge_percentile = hedge_percentile or settings.upstream_hedge_percentile
+        self.hedge_min_samples = (
+            settings.upstream_hedge_min_samples if hedge_min_samples is None else hedge_min_samples
+        )
+        self.latency_tracker = latency_tracker or LatencyTracker()
+        # (time.monotonic(), success) of recent finished calls
+        self._outcomes: Deque[Tuple[float, bool]] = deque(maxlen=OUTCOME_HISTORY)
+        self.last_success: Optional[float] = None
+
+    def _record_outcome(self, latency: float, success: bool) -> None:
+        record_upstream_outcome(latency, success)
+        now = time.monotonic()
+        self._outcomes.append((now, success))
+        if success:
+            self.last_success = now
+
+    def recent_outcomes(self, window: float) -> Tuple[int, int]:
+        """
+        Count the calls that finished within the last seconds.
+
+        Args:
+            window: Seconds to look back
+
+        Returns:
+            Tuple of (successes, availability failures)
+        """
+        since = time.monotonic() - window
+        successes = failures = 0
+        for finished_at, success in reversed(self._outcomes):
+            if finished_at < since:
+                break
+            if success:
+                successes += 1
+            else:
+                failures += 1
+        return successes, failures
+
+    def _hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before sending a hedged request, None to not hedge."""
+        if not self.hedge_enabled or len(self.latency_tracker) < self.hedge_min_samples:
+            return None
+        return self.latency_tracker.percentile(self.hedge_percentile)
+
+    async def _timed(self, attempt: Callable[[], Awaitable[T]]) -> T:
+        """Run one attempt and record its latency if it succeeds."""
+        start_time = time.perf_counter()
+        result = await attempt()
+        self.latency_tracker.record(time.perf_counter() - start_time)
+        return result
+
+    async def _run_hedged(
+        self,
+        attempt: Callable[[], Awaitable[T]],
+        stats: Dict[str, Any]
+    ) -> T:
+        """Run an attempt, racing a duplicate if it is slower than usual."""
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is None:
+            return await self._timed(attempt)
+
+        tasks = {asyncio.ensure_future(self._timed(attempt))}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+            if not done:
+                logger.info(f"Upstream call slower than {hedge_delay:.2f}s, sending hedged request")
+                stats["hedged"] = True
+                tasks.add(asyncio.ensure_future(self._timed(attempt)))
+
+            error: Optional[BaseException] = None
+            pending = tasks
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Cancel the loser (or everything if we were cancelled ourselves)
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def call(
+        self,
+        attempt: Callable[[], Awaitable[T]],
+        deadline: Optional[float] = None,
+        hedge: bool = True
+    ) -> Tuple[T, Dict[str, Any]]:
+        """
+        Call the upstream until it succeeds, fails permanently or the
+        deadline is reached.
+
+        Args:
+            attempt: Function starting one upstream call
+            deadline: Absolute time.monotonic() deadline (defaults to now
+                plus the configured timeout)
+            hedge: Whether the call may be hedged and its latency recorded;
+                disable for calls that only open a stream
+
+        Returns:
+            Tuple of (upstream result, call stats)
+
+        Raises:
+            DeadlineExceeded: If the deadline is reached
+            Exception: The last upstream error if it is not transient or
+                the retries are exhausted
+        """
+        start_time = time.perf_counter()
+        try:
+            result = await self._call(attempt, deadline, hedge)
+        except Exception as e:
+            latency = time.perf_counter() - start_time
+            record_stage("upstream", latency)
+            UPSTREAM_CALLS.inc(outcome="deadline" if isinstance(e, DeadlineExceeded) else "error")
+            self._record_outcome(latency, not is_availability_error(e))
+            raise
+        latency = time.perf_counter() - start_time
+        record_stage("upstream", latency)
+        UPSTREAM_CALLS.inc(outcome="success")
+        self._record_outcome(latency, True)
+        return result
+
+    async def _call(
+        self,
+        attempt: Callable[[], Awaitable[T]],
+        deadline: Optional[float],
+        hedge: bool
+    ) -> Tuple[T, Dict[str, Any]]:
+        """Run the retry loop of call()."""
+        if deadline is None:
+            deadline = time.monotonic() + self.timeout
+        stats: Dict[str, Any] = {"attempts": 0, "hedged": False}
+
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded("Request deadline exceeded before the upstream answered")
+
+            stats["attempts"] += 1
+            try:
+                pending = self._run_hedged(attempt, stats) if hedge else attempt()
+                result = await asyncio.wait_for(pending, timeout=remaining)
+                return result, stats
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError) and time.monotonic() >= deadline:
+                    raise DeadlineExceeded("Upstream did not answer before the request deadline")
+                if not is_transient_error(e) or stats["attempts"] > self.max_retries:
+                    raise
+
+                # Full jitter exponential backoff, only if it fits the deadline
+                backoff = min(self.max_delay, self.base_delay * 2 ** (stats["attempts"] - 1))
+                delay = random.uniform(0, backoff)
+                if time.monotonic() + delay >= deadline:
+                    raise
+                logger.warning(
+                    f"Transient upstream error on attempt {stats['attempts']}: {e}. "
+                    f"Retrying in {delay:.2f}s"
+                )
+                await asyncio.sleep(delay)
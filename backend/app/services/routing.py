@@ -0,0 +1,458 @@
+import asyncio
+import functools
+import logging
+import math
+import threading
+import time
+from collections import deque
+from typing import Optional, Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Tuple, TypeVar
+
+from app.config import settings
+from app.services.resilience import error_status_code
+from app.utils.metrics import UPSTREAM_ROUTED_CALLS
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Seconds over which the per-minute rate limits are counted
+RATE_WINDOW = 60.0
+# Smoothing factor for the per-route latency moving average
+LATENCY_EWMA_ALPHA = 0.2
+# Latency assumed for routes without samples when no route has any
+DEFAULT_LATENCY = 1.0  # Seconds
+# Status codes that take a key out of rotation for a model for a while
+COOLDOWN_STATUS_CODES = {401, 403, 429}
+
+
+class RouteState:
+    """Load, rate-limit headroom and latency of one API key for one model."""
+
+    def __init__(self, rate_limit: int = 0, rate_window: float = RATE_WINDOW):
+        """
+        Initialize the route.
+
+        Args:
+            rate_limit: Requests allowed per rate window, 0 for no limit
+            rate_window: Seconds over which rate_limit is counted
+        """
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self.latency_ewma: Optional[float] = None
+        self.calls = 0
+        self.failures = 0
+        self.rate_limited = 0
+        # time.monotonic() of the requests sent within the rate window
+        self._starts: Deque[float] = deque()
+
+    def _expire(self, now: float) -> None:
+        while self._starts and self._starts[0] <= now - self.rate_window:
+            self._starts.popleft()
+
+    def headroom(self, now: float) -> float:
+        """Fraction of the rate limit left in the window, 0 while cooling down."""
+        if now < self.cooldown_until:
+            return 0.0
+        if not self.rate_limit:
+            return 1.0
+        self._expire(now)
+        return max(0.0, 1.0 - len(self._starts) / self.rate_limit)
+
+    def available_at(self, now: float) -> float:
+        """time.monotonic() at which the route can take a request again."""
+        available_at = max(now, self.cooldown_until)
+        if self.rate_limit:
+            self._expire(now)
+            excess = len(self._starts) - self.rate_limit
+            if excess >= 0:
+                available_at = max(available_at, self._starts[excess] + self.rate_window)
+        return available_at
+
+    def start(self, now: float) -> None:
+        self.in_flight += 1
+        self.calls += 1
+        if self.rate_limit:
+            self._starts.append(now)
+
+    def finish(self, latency: Optional[float]) -> None:
+        """Release the request; latency is None when it failed."""
+        self.in_flight -= 1
+        if latency is None:
+            return
+        self.latency_ewma = latency if self.latency_ewma is None else (
+            LATENCY_EWMA_ALPHA * latency + (1 - LATENCY_EWMA_ALPHA) * self.latency_ewma
+        )
+
+
+class UpstreamBackend:
+    """One API key: its client and the route state of each model."""
+
+    def __init__(
+        self,
+        name: str,
+        client_factory: Callable[[], Any],
+        rate_limit: int = 0,
+        rate_window: float = RATE_WINDOW
+    ):
+        """
+        Initialize the backend.
+
+        Args:
+            name: Name used in logs and metrics (never the key itself)
+            client_factory: Creates the Gemini client, called on first use
+            rate_limit: Requests allowed per rate window and model, 0 for
+                no limit
+            rate_window: Seconds over which rate_limit is counted
+        """
+        self.name = name
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        # A key failing a health probe is routed around until then
+        self.unhealthy_until = 0.0
+        self.routes: Dict[str, RouteState] = {}
+        self._client_factory = client_factory
+        self._client: Optional[Any] = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self) -> Any:
+        """Gemini client of this key, created on first access."""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    try:
+                        self._client = self._client_factory()
+                    except Exception as e:
+                        logger.error(f"Failed to initialize Gemini client for {self.name}: {e}")
+                        raise RuntimeError(f"Failed to initialize Gemini service: {str(e)}")
+        return self._client
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.unhealthy_until
+
+    def route(self, model: str) -> RouteState:
+        """Get the route state of a model, creating it on first use."""
+        route = self.routes.get(model)
+        if route is None:
+            route = self.routes[model] = RouteState(self.rate_limit, self.rate_window)
+        return route
+
+
+class RoutedStream:
+    """
+    Upstream stream holding its route until it ends, fails or is closed.
+
+    Released on the first of these, so the route's in-flight count covers
+    the whole stream and its latency is the time until the last chunk.
+    """
+
+    def __init__(
+        self,
+        pool: "RoutingPool",
+        backend: UpstreamBackend,
+        model: str,
+        stream: AsyncIterator[Any],
+        start_time: float
+    ):
+        self._pool = pool
+        self._backend = backend
+        self._model = model
+        self._stream = stream
+        self._start_time = start_time
+        self._released = False
+
+    def _release(self, error: Optional[Exception] = None, completed: bool = False) -> None:
+        if self._released:
+            return
+        self._released = True
+        route = self._backend.route(self._model)
+        if completed:
+            route.finish(time.perf_counter() - self._start_time)
+            UPSTREAM_ROUTED_CALLS.inc(key=self._backend.name, model=self._model, outcome="success")
+            return
+        route.finish(None)
+        if error is not None:
+            self._pool._record_failure(self._backend, self._model, error)
+
+    def __aiter__(self) -> "RoutedStream":
+        return self
+
+    async def __anext__(self) -> Any:
+        try:
+            return await self._stream.__anext__()
+        except StopAsyncIteration:
+            self._release(completed=True)
+            raise
+        except Exception as e:
+            self._release(e)
+            raise
+
+    async def aclose(self) -> None:
+        """Close the upstream stream, releasing the route if it is still held."""
+        self._release()
+        aclose = getattr(self._stream, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+class RoutingPool:
+    """
+    Spreads upstream calls over several API keys, for several models.
+
+    Every call goes to the least-loaded key for its model: the one with the
+    lowest (in-flight calls + 1) * recent latency / rate-limit headroom,
+    ties going to the key used least. Keys without headroom, e.g. after
+    a 429, are skipped. When no key has any, the call waits until one
+    frees up instead of sending a request that would be rejected. Keys that
+    failed a health probe are only used when no key passed it, until the
+    cooldown runs out or a later probe passes; probes are skipped while
+    traffic succeeds, so the flag has to expire on its own.
+    """
+
+    def __init__(
+        self,
+        backends: List[UpstreamBackend],
+        models: List[str],
+        cooldown: Optional[float] = None
+    ):
+        """
+        Initialize the pool.
+
+        Args:
+            backends: One backend per API key
+            models: Models requests may choose; the first is the default
+            cooldown: Seconds a key is skipped for a model after it was
+                rate limited or rejected (defaults to settings)
+        """
+        if not backends or not models:
+            raise ValueError("The routing pool needs at least one API key and one model")
+        self.backends = backends
+        self.models = models
+        self.default_model = models[0]
+        self.cooldown = settings.upstream_key_cooldown if cooldown is None else cooldown
+
+    @classmethod
+    def from_settings(cls, client_factory: Callable[[str], Any]) -> "RoutingPool":
+        """
+        Build a pool of the API keys and models in the settings.
+
+        Args:
+            client_factory: Creates a Gemini client for an API key
+
+        Returns:
+            Routing pool
+        """
+        backends = [
+            UpstreamBackend(
+                f"key{index}",
+                functools.partial(client_factory, api_key),
+                rate_limit=settings.upstream_key_rpm
+            )
+            for index, api_key in enumerate(settings.api_keys_list)
+        ]
+        return cls(backends, settings.upstream_models_list)
+
+    def resolve_model(self, model: Optional[str]) -> str:
+        """
+        Get the model a request is served by.
+
+        Args:
+            model: Requested model, None for the default
+
+        Returns:
+            Model name
+
+        Raises:
+            ValueError: If the model is not served
+        """
+        if model is None:
+            return self.default_model
+        if model not in self.models:
+            raise ValueError(f"Unsupported model: {model}. Available: {', '.join(self.models)}")
+        return model
+
+    def create_clients(self) -> None:
+        """Create the client of every key (blocking)."""
+        for backend in self.backends:
+            backend.client
+
+    def _choose(self, model: str, now: float) -> Tuple[Optional[UpstreamBackend], float]:
+        """
+        Pick the least-loaded backend with headroom for a model.
+
+        Returns:
+            Tuple of (backend or None if none has headroom, earliest
+            time.monotonic() at which a skipped backend frees up)
+        """
+        candidates = [backend for backend in self.backends if backend.healthy] or self.backends
+        latencies = [
+            backend.route(model).latency_ewma
+            for backend in candidates
+            if backend.route(model).latency_ewma is not None
+        ]
+        default_latency = sum(latencies) / len(latencies) if latencies else DEFAULT_LATENCY
+
+        best: Optional[UpstreamBackend] = None
+        best_score: Tuple[float, int] = (math.inf, 0)
+        next_available = math.inf
+        for backend in candidates:
+            route = backend.route(model)
+            headroom = route.headroom(now)
+            if headroom <= 0:
+                next_available = min(next_available, route.available_at(now))
+                continue
+            latency = route.latency_ewma if route.latency_ewma is not None else default_latency
+            score = ((route.in_flight + 1) * latency / headroom, route.calls)
+            if best is None or score < best_score:
+                best, best_score = backend, score
+        return best, next_available
+
+    async def acquire(self, model: str) -> UpstreamBackend:
+        """
+        Reserve a request on the best backend for a model, waiting while
+        every backend is out of headroom.
+
+        The caller must release it with the route's finish().
+
+        Args:
+            model: Model name
+
+        Returns:
+            Backend to send the request to
+        """
+        while True:
+            now = time.monotonic()
+            backend, next_available = self._choose(model, now)
+            if backend is not None:
+                backend.route(model).start(now)
+                return backend
+            wait = next_available - now
+            logger.info(f"All API keys are at their rate limit for {model}, waiting {wait:.2f}s")
+            await asyncio.sleep(wait)
+
+    async def call(self, model: str, request: Callable[[Any], Awaitable[T]]) -> T:
+        """
+        Run one upstream request on the best backend for a model.
+
+        Args:
+            model: Model name
+            request: Function starting the request with a Gemini client
+
+        Returns:
+            The request's result
+        """
+        backend = await self.acquire(model)
+        route = backend.route(model)
+        start_time = time.perf_counter()
+        try:
+            result = await request(backend.client)
+        except Exception as e:
+            route.finish(None)
+            self._record_failure(backend, model, e)
+            raise
+        except BaseException:
+            # Cancelled, e.g. the losing side of a hedged request
+            route.finish(None)
+            raise
+        route.finish(time.perf_counter() - start_time)
+        UPSTREAM_ROUTED_CALLS.inc(key=backend.name, model=model, outcome="success")
+        return result
+
+    async def open_stream(
+        self,
+        model: str,
+        request: Callable[[Any], Awaitable[AsyncIterator[Any]]]
+    ) -> RoutedStream:
+        """
+        Open an upstream stream on the best backend for a model.
+
+        Unlike call(), the route stays reserved until the stream ends or is
+        closed; the caller must close it.
+
+        Args:
+            model: Model name
+            request: Function opening the stream with a Gemini client
+
+        Returns:
+            The stream
+        """
+        backend = await self.acquire(model)
+        route = backend.route(model)
+        start_time = time.perf_counter()
+        try:
+            stream = await request(backend.client)
+        except Exception as e:
+            route.finish(None)
+            self._record_failure(backend, model, e)
+            raise
+        except BaseException:
+            route.finish(None)
+            raise
+        return RoutedStream(self, backend, model, stream, start_time)
+
+    def _record_failure(self, backend: UpstreamBackend, model: str, error: Exception) -> None:
+        route = backend.route(model)
+        route.failures += 1
+        status_code = error_status_code(error)
+        if status_code in COOLDOWN_STATUS_CODES:
+            if status_code == 429:
+                route.rate_limited += 1
+            route.cooldown_until = time.monotonic() + self.cooldown
+            logger.warning(
+                f"{backend.name} got {status_code} for {model}, "
+                f"skipping it for {self.cooldown:g}s"
+            )
+        outcome = "rate_limited" if status_code == 429 else "error"
+        UPSTREAM_ROUTED_CALLS.inc(key=backend.name, model=model, outcome=outcome)
+
+    async def probe(self, check: Callable[[Any], Awaitable[bool]]) -> bool:
+        """
+        Health check every key, routing around the ones that fail.
+
+        Args:
+            check: Function checking one Gemini client, returning True when
+                it is healthy; it must not raise
+
+        Returns:
+            True if at least one key is healthy
+        """
+        results = await asyncio.gather(*(check(backend.client) for backend in self.backends))
+        now = time.monotonic()
+        for backend, healthy in zip(self.backends, results):
+            if healthy:
+                backend.unhealthy_until = 0.0
+                continue
+            if backend.healthy:
+                logger.warning(
+                    f"{backend.name} failed its health check, "
+                    f"routing around it for {self.cooldown:g}s"
+                )
+            backend.unhealthy_until = now + self.cooldown
+        return any(results)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """
+        Get the state of every key and model that was used.
+
+        Returns:
+            One dictionary per key and model
+        """
+        now = time.monotonic()
+        return [
+            {
+                "key": backend.name,
+                "model": model,
+                "healthy": backend.healthy,
+                "in_flight": route.in_flight,
+                "headroom": route.headroom(now),
+                "latency_ewma": route.latency_ewma,
+                "calls": route.calls,
+                "failures": route.failures,
+                "rate_limited": route.rate_limited
+            }
+            for backend in self.backends
+            for model, route in backend.routes.items()
+        ]
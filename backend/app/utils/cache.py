@@ -0,0 +1,103 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class LRUCache:
+    """In-memory LRU cache bounded by the total byte size of its values."""
+
+    def __init__(self, max_bytes: int, ttl: Optional[float] = None):
+        """
+        Initialize an empty cache.
+
+        Args:
+            max_bytes: Maximum total size of cached values (0 disables caching)
+            ttl: Seconds after which an entry expires (None keeps entries
+                until they are evicted)
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # key -> (value, size, expiry time or None)
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Look up a value and mark it as most recently used.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            The cached value, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is not None and entry[2] <= time.monotonic():
+                del self._entries[key]
+                self.current_bytes -= entry[1]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any, size: int) -> None:
+        """
+        Store a value, evicting least recently used entries to make room.
+
+        Args:
+            key: Cache key
+            value: Value to store
+            size: Size of the value in bytes, counted against max_bytes
+        """
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= previous[1]
+
+            expires_at = time.monotonic() + self.ttl if self.ttl else None
+            self._entries[key] = (value, size, expires_at)
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Remove all entries without resetting the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache counters.
+
+        Returns:
+            Dictionary with entry count, size and hit/miss/eviction counters
+        """
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
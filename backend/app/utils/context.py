@@ -0,0 +1,21 @@
+from contextvars import ContextVar, Token
+
+
+def reset_context_var(var: ContextVar, token: Token) -> None:
+    """
+    Restore a context variable when the scope that set it exits.
+
+    A scope held open by an async generator (e.g. a streaming response) can
+    be exited from another context than the one it was entered in, such as
+    the event loop's finalizer of an abandoned generator. The value was set
+    in a context that is gone by then, so there is nothing to restore, and
+    reset() would raise.
+
+    Args:
+        var: Context variable the scope set
+        token: Token returned by var.set()
+    """
+    try:
+        var.reset(token)
+    except ValueError:
+        pass
@@ -1,13 +1,102 @@
 import base64
+import binascii
+import hashlib
+import time
+from dataclasses import dataclass
 from io import BytesIO
-from typing import Optional
-from PIL import Image
+from typing import TYPE_CHECKING, Optional, Any, Dict, Tuple
 import logging
 
+if TYPE_CHECKING:
+    from PIL import Image
+
 logger = logging.getLogger(__name__)
 
+# A data URL prefix ("data:image/png;base64,") always fits in this many characters
+DATA_URL_PREFIX_MAX_LENGTH = 256
+# Base64 characters decoded per step after a data URL prefix, a multiple of 4
+# so every step ends on a whole group of encoded bytes
+BASE64_DECODE_CHUNK_LENGTH = 1048576
+
 
-def base64_to_pil(base64_string: str) -> Image.Image:
+def sniff_image_mime_type(image_bytes: bytes) -> Optional[str]:
+    """
+    Identify an image format from its magic bytes without decoding it.
+    
+    Args:
+        image_bytes: Raw image bytes
+        
+    Returns:
+        Image mime type, or None if the format is not recognized
+    """
+    header = bytes(image_bytes[:12])
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if header.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    if header[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    return None
+
+
+def _decode_base64_from(data: str, start: int) -> bytes:
+    """
+    Decode the base64 payload of a string starting at an offset.
+    
+    Slicing the payload off would copy all of it first, so it is decoded a
+    chunk at a time instead and only one chunk is ever copied. Payloads with
+    line breaks shift the chunks off the 4 character groups and fail to
+    decode that way; those are decoded in one piece.
+    
+    Args:
+        data: String holding the base64 payload
+        start: Offset of the payload in data
+        
+    Returns:
+        Decoded bytes
+    """
+    if start == 0:
+        return binascii.a2b_base64(data)
+    try:
+        return b"".join(
+            binascii.a2b_base64(data[offset:offset + BASE64_DECODE_CHUNK_LENGTH])
+            for offset in range(start, len(data), BASE64_DECODE_CHUNK_LENGTH)
+        )
+    except binascii.Error:
+        return binascii.a2b_base64(data[start:])
+
+
+def decode_base64_image(base64_string: str) -> bytes:
+    """
+    Decode a base64 image string (optionally a data URL) in a single pass.
+    
+    Only the start of the string is scanned for a data URL prefix, and the
+    payload is decoded straight from the string without copying it out
+    first, whether or not there is a prefix. The decoded bytes are checked for a known image
+    header so invalid payloads are rejected before any image decoding.
+    
+    Args:
+        base64_string: Base64 encoded image string
+        
+    Returns:
+        Raw image bytes
+    """
+    payload_start = base64_string.find(',', 0, DATA_URL_PREFIX_MAX_LENGTH) + 1
+    
+    try:
+        image_bytes = _decode_base64_from(base64_string, payload_start)
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"Invalid base64 image data: {str(e)}")
+    
+    if sniff_image_mime_type(image_bytes) is None:
+        raise ValueError("Invalid base64 image data: unrecognized image format")
+    
+    return image_bytes
+
+
+def base64_to_pil(base64_string: str) -> "Image.Image":
     """
     Convert a base64 string to a PIL Image object.
     
@@ -18,14 +107,11 @@ def base64_to_pil(base64_string: str) -> Image.Image:
         PIL Image object
     """
     try:
-        # Remove data URL prefix if present
-        if ',' in base64_string:
-            base64_string = base64_string.split(',')[1]
-        
         # Decode base64 to bytes
-        image_bytes = base64.b64decode(base64_string)
+        image_bytes = decode_base64_image(base64_string)
         
         # Convert bytes to PIL Image
+        from PIL import Image
         image = Image.open(BytesIO(image_bytes))
         
         return image
@@ -52,33 +138,338 @@ def bytes_to_base64(image_bytes: bytes) -> str:
         raise ValueError(f"Failed to encode bytes: {str(e)}")
 
 
-def resize_image_if_needed(image: Image.Image, max_size: int = 2048) -> Image.Image:
+# Final resampling filter (a PIL Image.Resampling name, so PIL is only
+# imported when an image is actually processed) and reducing gap for each
+# resize quality tier. The reducing gap is about how much larger than the
+# target the image is kept after the cheap integer reduce() and JPEG draft
+# steps (None disables them).
+RESIZE_QUALITY_TIERS = {
+    "fast": ("BILINEAR", 1.0),
+    "balanced": ("LANCZOS", 1.5),
+    "best": ("LANCZOS", None),
+}
+
+
+def _target_size(width: int, height: int, max_size: int) -> Tuple[int, int]:
+    """Calculate dimensions that fit within max_size keeping the aspect ratio."""
+    if width > height:
+        return max_size, max(1, int(height * (max_size / width)))
+    return max(1, int(width * (max_size / height))), max_size
+
+
+def _reduce_factor(
+    width: int,
+    height: int,
+    new_width: int,
+    new_height: int,
+    reducing_gap: float
+) -> int:
+    """
+    Whole factor to shrink an image by before the final resampling filter.
+    
+    The factor is rounded to the nearest one that keeps the image about
+    reducing_gap times the target size: rounding down would skip the step
+    for every downscale by less than twice the gap (e.g. 6000x4000 to 2048
+    with a gap of 1.5). It never shrinks the image below the target.
+    """
+    ratio = min(width / new_width, height / new_height)
+    return max(1, min(int(ratio), round(ratio / reducing_gap)))
+
+
+def draft_for_downscale(
+    image: "Image.Image",
+    max_size: int = 2048,
+    quality: str = "balanced"
+) -> None:
+    """
+    Let the JPEG decoder scale the image down while decoding.
+    
+    Must be called before the pixels are loaded; it is a no-op for other
+    formats, already loaded images and images that need no resize.
+    
+    Args:
+        image: PIL Image object, opened but not loaded
+        max_size: Maximum dimension (width or height)
+        quality: Resize quality tier ("fast", "balanced" or "best")
+    """
+    _, reducing_gap = RESIZE_QUALITY_TIERS[quality]
+    width, height = image.size
+    if (
+        reducing_gap is None
+        or image.format != "JPEG"
+        or not image.tile
+        or (width <= max_size and height <= max_size)
+    ):
+        return
+    
+    new_width, new_height = _target_size(width, height, max_size)
+    factor = _reduce_factor(width, height, new_width, new_height, reducing_gap)
+    if factor >= 2:
+        # The decoder scales by the largest power of 2 within the factor
+        image.draft(image.mode, (-(-width // factor), -(-height // factor)))
+
+
+def resize_image_if_needed(
+    image: "Image.Image",
+    max_size: int = 2048,
+    quality: str = "balanced"
+) -> "Image.Image":
     """
     Resize image if it exceeds the maximum dimension.
     
+    Except for the "best" tier, large images are first shrunk cheaply (JPEG
+    draft decoding when the image is not loaded yet, then an integer
+    reduce()) and only the last step uses the tier's resampling filter.
+    
     Args:
         image: PIL Image object
         max_size: Maximum dimension (width or height)
+        quality: Resize quality tier ("fast", "balanced" or "best")
         
     Returns:
         Resized PIL Image object
     """
+    if quality not in RESIZE_QUALITY_TIERS:
+        raise ValueError(f"Unknown resize quality: {quality}")
+    
     width, height = image.size
     
     if width <= max_size and height <= max_size:
         return image
     
     # Calculate new dimensions maintaining aspect ratio
-    if width > height:
-        new_width = max_size
-        new_height = int(height * (max_size / width))
-    else:
-        new_height = max_size
-        new_width = int(width * (max_size / height))
+    new_width, new_height = _target_size(width, height, max_size)
+    resample, reducing_gap = RESIZE_QUALITY_TIERS[quality]
+    
+    if reducing_gap is not None:
+        draft_for_downscale(image, max_size, quality)
+        factor = _reduce_factor(image.width, image.height, new_width, new_height, reducing_gap)
+        if factor >= 2:
+            image = image.reduce(factor)
     
     # Resize the image
-    resized_image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
+    from PIL import Image
+    resized_image = image.resize((new_width, new_height), Image.Resampling[resample])
     
-    logger.info(f"Resized image from {width}x{height} to {new_width}x{new_height}")
+    logger.info(
+        f"Resized image from {width}x{height} to {new_width}x{new_height} "
+        f"({quality})"
+    )
     
     return resized_image
+
+
+@dataclass(frozen=True)
+class EncodingPolicy:
+    """How context images are encoded before they are sent upstream."""
+    
+    # "auto" keeps the source format when possible, or "png", "jpeg", "webp"
+    output_format: str = "auto"
+    png_compress_level: int = 6
+    jpeg_quality: int = 90
+    webp_quality: int = 90
+    # Send the original bytes when no resize or format change is needed
+    passthrough: bool = True
+    passthrough_max_bytes: int = 4194304
+    
+    @property
+    def cache_tag(self) -> str:
+        """Short string identifying the policy in cache keys."""
+        return (
+            f"{self.output_format}-{self.png_compress_level}-{self.jpeg_quality}-"
+            f"{self.webp_quality}-{int(self.passthrough)}-{self.passthrough_max_bytes}"
+        )
+
+
+# Formats the Gemini API accepts as inline image data
+UPSTREAM_FORMATS = {"PNG": "image/png", "JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+
+def choose_output_format(image: "Image.Image", policy: EncodingPolicy) -> str:
+    """
+    Pick the PIL format a context image is re-encoded to.
+    
+    Args:
+        image: PIL Image object (as opened, before any conversion)
+        policy: Encoding policy
+        
+    Returns:
+        PIL format name ("PNG", "JPEG" or "WEBP")
+    """
+    if policy.output_format == "auto":
+        output_format = image.format if image.format in UPSTREAM_FORMATS else "PNG"
+    else:
+        output_format = policy.output_format.upper()
+        if output_format not in UPSTREAM_FORMATS:
+            raise ValueError(f"Unsupported upstream image format: {policy.output_format}")
+    
+    # JPEG cannot carry transparency
+    has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+    if output_format == "JPEG" and has_alpha:
+        output_format = "PNG"
+    
+    return output_format
+
+
+def encode_image(
+    image: "Image.Image",
+    output_format: str,
+    policy: EncodingPolicy
+) -> bytes:
+    """
+    Encode a PIL image with the quality settings of an encoding policy.
+    
+    Args:
+        image: PIL Image object
+        output_format: PIL format name ("PNG", "JPEG" or "WEBP")
+        policy: Encoding policy
+        
+    Returns:
+        Encoded image bytes
+    """
+    buffer = BytesIO()
+    
+    if output_format == "JPEG":
+        if image.mode not in ("RGB", "L", "CMYK"):
+            image = image.convert("RGB")
+        image.save(buffer, format="JPEG", quality=policy.jpeg_quality)
+    elif output_format == "WEBP":
+        image.save(buffer, format="WEBP", quality=policy.webp_quality)
+    else:
+        image.save(buffer, format="PNG", compress_level=policy.png_compress_level)
+    
+    return buffer.getvalue()
+
+
+def image_cache_key(
+    image_bytes: bytes,
+    max_size: int = 2048,
+    policy: Optional[EncodingPolicy] = None,
+    resize_quality: str = "balanced"
+) -> str:
+    """
+    Build a content-addressed cache key for a context image.
+    
+    The key covers the raw image bytes and the parameters that affect the
+    preprocessed output.
+    
+    Args:
+        image_bytes: Raw image bytes
+        max_size: Maximum dimension (width or height)
+        policy: Encoding policy applied to the image
+        resize_quality: Resize quality tier applied to the image
+        
+    Returns:
+        Cache key string
+    """
+    policy = policy or EncodingPolicy()
+    digest = hashlib.blake2b(image_bytes, digest_size=16).hexdigest()
+    return f"{digest}:{max_size}:{resize_quality}:{policy.cache_tag}"
+
+
+def prepare_context_image(
+    image_bytes: bytes,
+    max_size: int = 2048,
+    policy: Optional[EncodingPolicy] = None,
+    resize_quality: str = "balanced",
+    max_pixels: Optional[int] = None
+) -> Tuple[bytes, str, Dict[str, Any]]:
+    """
+    Prepare a context image for the Gemini API.
+    
+    Images that are already in an accepted format, within the size limit and
+    small enough are passed through untouched, without decoding the pixels.
+    Everything else is decoded, resized if needed and re-encoded according
+    to the encoding policy.
+    
+    This is a plain module-level function so it can be dispatched to either
+    a thread pool or a process pool.
+    
+    Args:
+        image_bytes: Raw image bytes
+        max_size: Maximum dimension (width or height)
+        policy: Encoding policy (defaults to EncodingPolicy())
+        resize_quality: Resize quality tier ("fast", "balanced" or "best")
+        max_pixels: Reject images with more pixels than this before decoding
+        
+    Returns:
+        Tuple of (encoded image bytes, mime type, stats with per-stage
+        timings in seconds and byte counts)
+    """
+    policy = policy or EncodingPolicy()
+    stats: Dict[str, Any] = {"bytes_in": len(image_bytes)}
+    
+    from PIL import Image
+    
+    stage_start = time.perf_counter()
+    try:
+        # Only reads the header; pixels are decoded on load()
+        pil_image = Image.open(BytesIO(image_bytes))
+    except Exception as e:
+        logger.error(f"Error opening context image: {e}")
+        raise ValueError(f"Failed to decode image: {str(e)}")
+    
+    width, height = pil_image.size
+    if max_pixels and width * height > max_pixels:
+        raise ValueError(
+            f"Image of {width}x{height} pixels exceeds the limit of {max_pixels} pixels"
+        )
+    
+    source_mime_type = UPSTREAM_FORMATS.get(pil_image.format)
+    if (
+        policy.passthrough
+        and source_mime_type is not None
+        and width <= max_size
+        and height <= max_size
+        and len(image_bytes) <= policy.passthrough_max_bytes
+    ):
+        stats.update({
+            "decode": time.perf_counter() - stage_start,
+            "passthrough": True,
+            "format": pil_image.format,
+            "bytes_out": len(image_bytes),
+            "bytes_saved": 0
+        })
+        return bytes(image_bytes), source_mime_type, stats
+    
+    output_format = choose_output_format(pil_image, policy)
+    # Decode at reduced scale when possible, and force the pixel decode here
+    # so it is attributed to this stage
+    draft_for_downscale(pil_image, max_size, resize_quality)
+    pil_image.load()
+    stats["decode"] = time.perf_counter() - stage_start
+    
+    stage_start = time.perf_counter()
+    pil_image = resize_image_if_needed(pil_image, max_size, resize_quality)
+    stats["resize"] = time.perf_counter() - stage_start
+    
+    stage_start = time.perf_counter()
+    encoded_bytes = encode_image(pil_image, output_format, policy)
+    stats["encode"] = time.perf_counter() - stage_start
+    
+    stats.update({
+        "passthrough": False,
+        "format": output_format,
+        "bytes_out": len(encoded_bytes),
+        "bytes_saved": len(image_bytes) - len(encoded_bytes)
+    })
+    return encoded_bytes, UPSTREAM_FORMATS[output_format], stats
+
+
+def warm_up_codecs() -> None:
+    """
+    Load PIL and its codec plugins ahead of the first request.
+    
+    Importing PIL, registering the format plugins and the first encode and
+    decode of each upstream format cost several milliseconds that would
+    otherwise be added to whichever request comes first.
+    """
+    from PIL import Image
+    
+    Image.init()
+    sample = Image.new("RGB", (8, 8))
+    for output_format in UPSTREAM_FORMATS:
+        buffer = BytesIO()
+        sample.save(buffer, format=output_format)
+        buffer.seek(0)
+        Image.open(buffer).load()
@@ -0,0 +1,89 @@
+import atexit
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import List, Optional, Tuple
+
+_listener: Optional[QueueListener] = None
+# Level and format of the last setup, passed on to worker processes
+_worker_config: Tuple[int, str] = (logging.WARNING, logging.BASIC_FORMAT)
+
+
+def setup_queue_logging(level: int, format: str, handlers: List[logging.Handler]) -> None:
+    """
+    Configure the root logger to write through a queue.
+
+    Log calls only format the record and put it on an in-memory queue; a
+    background thread writes it to the actual handlers, so slow output
+    (e.g. a blocked stdout pipe) never stalls the event loop.
+
+    Args:
+        level: Root log level
+        format: Log record format
+        handlers: Handlers the records are finally written to
+    """
+    global _listener, _worker_config
+    shutdown_queue_logging()
+    _worker_config = (level, format)
+
+    formatter = logging.Formatter(format)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(level)
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_queue_logging() -> None:
+    """Write out the queued records and stop the logging thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def worker_logging_initargs() -> Tuple[int, str]:
+    """
+    Get the arguments of setup_worker_logging() matching this process.
+
+    Returns:
+        Tuple of (level, format)
+    """
+    return _worker_config
+
+
+def setup_worker_logging(level: int, format: str) -> None:
+    """
+    Configure logging in a process pool worker (its initializer).
+
+    A forked worker inherits the queue handler but not the thread writing
+    the queue out, so its records would never appear; it writes them to
+    stdout directly instead.
+
+    Args:
+        level: Root log level
+        format: Log record format
+    """
+    global _listener
+    # The listener thread only runs in the parent
+    _listener = None
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter(format))
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+
+# Do not lose the last records when the process exits without a shutdown
+atexit.register(shutdown_queue_logging)
@@ -0,0 +1,306 @@
+import bisect
+import math
+import threading
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+# Latency buckets in seconds, from sub-millisecond parsing to long generations
+DEFAULT_LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0
+)
+# Payload size buckets in bytes, 1KB to 64MB
+DEFAULT_BYTES_BUCKETS = tuple(float(1024 * 4 ** i) for i in range(9))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape_label(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Metric:
+    """Base class of a named metric with optional labels."""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: Dict[str, str]) -> LabelValues:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        """Yield (sample name, formatted labels, value) triples."""
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        """
+        Render the metric in the Prometheus text exposition format.
+
+        Returns:
+            Lines of the HELP and TYPE headers and every sample
+        """
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}"
+        ]
+        for sample_name, labels, value in self.samples():
+            lines.append(f"{sample_name}{labels} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    """Monotonically increasing count."""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Gauge(Metric):
+    """Value that goes up and down."""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Histogram(Metric):
+    """Distribution of observations in cumulative buckets."""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last is +Inf), sum]
+        self._values: Dict[LabelValues, List] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._label_values(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        bucket_names = self.labelnames + ("le",)
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield (
+                    f"{self.name}_bucket",
+                    _format_labels(bucket_names, key + (_format_value(bound),)),
+                    cumulative
+                )
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def _register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """
+        Render every metric in the Prometheus text exposition format.
+
+        Returns:
+            Exposition text
+        """
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# Application metrics
+STAGE_SECONDS = REGISTRY.histogram(
+    "nanobanana_stage_duration_seconds",
+    "Time spent in each stage of handling a request",
+    labelnames=("stage",)
+)
+HTTP_REQUESTS = REGISTRY.counter(
+    "nanobanana_http_requests_total",
+    "HTTP requests handled by API routes",
+    labelnames=("method", "route", "status")
+)
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "nanobanana_http_request_duration_seconds",
+    "Time to produce the response of API routes",
+    labelnames=("route",)
+)
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    "nanobanana_http_requests_in_flight",
+    "API requests currently being handled"
+)
+PAYLOAD_BYTES = REGISTRY.histogram(
+    "nanobanana_payload_bytes",
+    "Size of request bodies, responses and images",
+    labelnames=("kind",),
+    buckets=DEFAULT_BYTES_BUCKETS
+)
+UPSTREAM_CALLS = REGISTRY.counter(
+    "nanobanana_upstream_calls_total",
+    "Finished upstream calls, retries included",
+    labelnames=("outcome",)
+)
+UPSTREAM_ROUTED_CALLS = REGISTRY.counter(
+    "nanobanana_upstream_routed_calls_total",
+    "Upstream requests per API key and model, retries and hedges included",
+    labelnames=("key", "model", "outcome")
+)
+UPSTREAM_HEADROOM = REGISTRY.gauge(
+    "nanobanana_upstream_headroom",
+    "Fraction of the rate limit left per API key and model",
+    labelnames=("key", "model")
+)
+UPSTREAM_ROUTED_IN_FLIGHT = REGISTRY.gauge(
+    "nanobanana_upstream_routed_in_flight",
+    "Upstream requests in flight per API key and model",
+    labelnames=("key", "model")
+)
+GENERATIONS = REGISTRY.counter(
+    "nanobanana_generations_total",
+    "Finished generations",
+    labelnames=("status",)
+)
+GENERATIONS_IN_FLIGHT = REGISTRY.gauge(
+    "nanobanana_generations_in_flight",
+    "Generations holding an admission slot"
+)
+ADMISSION_QUEUE_DEPTH = REGISTRY.gauge(
+    "nanobanana_admission_queue_depth",
+    "Requests waiting for an admission slot"
+)
+ADMISSION_LIMIT = REGISTRY.gauge(
+    "nanobanana_admission_limit",
+    "Current adaptive concurrency limit"
+)
+CACHE_ENTRIES = REGISTRY.gauge(
+    "nanobanana_cache_entries",
+    "Entries held per in-memory cache",
+    labelnames=("cache",)
+)
+CACHE_BYTES = REGISTRY.gauge(
+    "nanobanana_cache_bytes",
+    "Bytes held per in-memory cache",
+    labelnames=("cache",)
+)
+CACHE_LOOKUPS = REGISTRY.gauge(
+    "nanobanana_cache_lookups",
+    "Lookups per cache since start",
+    labelnames=("cache", "result")
+)
+CACHE_EVICTIONS = REGISTRY.gauge(
+    "nanobanana_cache_evictions",
+    "Entries evicted per in-memory cache since start",
+    labelnames=("cache",)
+)
+IMAGE_STORE_IMAGES = REGISTRY.gauge(
+    "nanobanana_image_store_images",
+    "Images kept in the image store"
+)
+IMAGE_STORE_BYTES = REGISTRY.gauge(
+    "nanobanana_image_store_bytes",
+    "Bytes kept in the image store"
+)
+JOBS = REGISTRY.gauge(
+    "nanobanana_jobs",
+    "Generation jobs kept in the job registry by status",
+    labelnames=("status",)
+)
@@ -0,0 +1,89 @@
+import asyncio
+import cProfile
+import logging
+import os
+import random
+import re
+import time
+import uuid
+from typing import Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Request header asking for a profile, honored only in debug mode
+PROFILE_HEADER = "x-profile"
+
+# cProfile hooks the whole thread, so only one request is profiled at a time
+_active_profile: Optional[cProfile.Profile] = None
+
+
+def should_profile(header_value: Optional[str]) -> bool:
+    """
+    Decide whether to profile a request.
+
+    Args:
+        header_value: Value of the X-Profile request header, if any
+
+    Returns:
+        True if the request is sampled or asked for a profile in debug mode
+    """
+    if settings.debug and header_value == "1":
+        return True
+    return settings.profile_sample_rate > 0 and random.random() < settings.profile_sample_rate
+
+
+def start_profile() -> Optional[cProfile.Profile]:
+    """
+    Start profiling unless another request is being profiled.
+
+    The profile covers everything running on the event loop thread until it
+    is stopped, including other requests interleaved with this one; work
+    handed to the preprocessing pool is not captured.
+
+    Returns:
+        The running profiler, or None if one is already active
+    """
+    global _active_profile
+    if _active_profile is not None:
+        return None
+    _active_profile = cProfile.Profile()
+    _active_profile.enable()
+    return _active_profile
+
+
+async def stop_profile(profile: cProfile.Profile, route: str) -> Optional[str]:
+    """
+    Stop a profiler and write its stats to the profile directory.
+
+    Args:
+        profile: Profiler returned by start_profile()
+        route: Route path, used in the file name
+
+    Returns:
+        Path of the written .prof file (readable with pstats or snakeviz),
+        or None if it could not be written
+    """
+    global _active_profile
+    profile.disable()
+    _active_profile = None
+
+    route_name = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+    path = os.path.join(
+        settings.profile_dir,
+        f"{time.strftime('%Y%m%d-%H%M%S')}-{route_name}-{uuid.uuid4().hex[:8]}.prof"
+    )
+
+    def dump() -> None:
+        os.makedirs(settings.profile_dir, exist_ok=True)
+        profile.dump_stats(path)
+
+    try:
+        await asyncio.to_thread(dump)
+    except OSError as e:
+        logger.error(f"Failed to write profile {path}: {e}")
+        return None
+
+    logger.info(f"Wrote request profile to {path}")
+    return path
@@ -0,0 +1,197 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Last-access times are only refreshed this often, so hits rarely write
+ACCESS_RESOLUTION = 60.0  # Seconds
+# Seconds a connection waits for another process holding the write lock
+BUSY_TIMEOUT = 5.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL,
+    last_access REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS cache_entries_lru ON cache_entries (namespace, last_access);
+"""
+
+
+class SharedCache:
+    """
+    Byte-bounded cache shared by all worker processes on a host.
+
+    Entries live in an SQLite database on local disk in WAL mode, so any
+    number of processes can read concurrently while one writes, and every
+    write is an atomic transaction. Several caches can share one database
+    file, each under its own namespace and size limit; the least recently
+    used entries of a namespace are evicted when it outgrows its limit.
+
+    Methods block on disk I/O, so call them from a worker thread.
+    """
+
+    def __init__(self, path: str, namespace: str, max_bytes: int, ttl: Optional[float] = None):
+        """
+        Open (or create) the cache database.
+
+        Args:
+            path: SQLite database file
+            namespace: Name separating this cache from others in the file
+            max_bytes: Maximum total size of the namespace's values
+            ttl: Seconds after which an entry expires (None keeps entries
+                until they are evicted)
+        """
+        self.path = path
+        self.namespace = namespace
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        connection = self._connection()
+        connection.executescript(_SCHEMA)
+        logger.info(f"Shared cache '{namespace}' opened at {path}")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get this thread's connection, opening it on first use."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.path,
+                timeout=BUSY_TIMEOUT,
+                isolation_level=None,
+                check_same_thread=False
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            # Durable enough for a cache and avoids an fsync per write
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Look up a value.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            The cached bytes, or None on a miss
+        """
+        connection = self._connection()
+        now = time.time()
+        row = connection.execute(
+            "SELECT value, expires_at, last_access FROM cache_entries WHERE namespace = ? AND key = ?",
+            (self.namespace, key)
+        ).fetchone()
+
+        if row is not None and row[1] is not None and row[1] <= now:
+            connection.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND key = ? AND expires_at <= ?",
+                (self.namespace, key, now)
+            )
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+
+        if now - row[2] > ACCESS_RESOLUTION:
+            connection.execute(
+                "UPDATE cache_entries SET last_access = ? WHERE namespace = ? AND key = ?",
+                (now, self.namespace, key)
+            )
+        self.hits += 1
+        return row[0]
+
+    def put(self, key: str, value: bytes) -> None:
+        """
+        Store a value, evicting least recently used entries to make room.
+
+        Args:
+            key: Cache key
+            value: Bytes to store
+        """
+        size = len(value)
+        if size > self.max_bytes:
+            return
+
+        now = time.time()
+        expires_at = now + self.ttl if self.ttl else None
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "INSERT OR REPLACE INTO cache_entries "
+                "(namespace, key, value, size, expires_at, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (self.namespace, key, value, size, expires_at, now)
+            )
+            self._evict(connection, now)
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def _evict(self, connection: sqlite3.Connection, now: float) -> None:
+        """Drop expired entries, then the least recently used until within max_bytes."""
+        connection.execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND expires_at <= ?",
+            (self.namespace, now)
+        )
+        total = connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM cache_entries WHERE namespace = ?",
+            (self.namespace,)
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        victims = []
+        for key, size in connection.execute(
+            "SELECT key, size FROM cache_entries WHERE namespace = ? ORDER BY last_access",
+            (self.namespace,)
+        ):
+            if total <= self.max_bytes:
+                break
+            victims.append((self.namespace, key))
+            total -= size
+        connection.executemany(
+            "DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+            victims
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache counters of this process.
+
+        Returns:
+            Dictionary with hit/miss counters
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+    def close(self) -> None:
+        """Close the connections of all threads."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+        self._local = threading.local()
@@ -0,0 +1,42 @@
+import json
+from typing import Optional, Any
+
+# Headers for streamed responses; disables proxy buffering (e.g. nginx)
+STREAMING_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+
+def format_sse(data: Any, event: Optional[str] = None, event_id: Optional[str] = None) -> bytes:
+    """
+    Format one Server-Sent Events message.
+
+    Args:
+        data: JSON-serializable payload
+        event: Optional event name
+        event_id: Optional event ID
+
+    Returns:
+        Encoded SSE message
+    """
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event is not None:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+
+def format_ndjson(data: Any) -> bytes:
+    """
+    Format one newline-delimited JSON record.
+
+    Args:
+        data: JSON-serializable payload
+
+    Returns:
+        Encoded JSON line
+    """
+    return (json.dumps(data) + "\n").encode("utf-8")
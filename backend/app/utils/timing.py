@@ -0,0 +1,93 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+from app.utils.context import reset_context_var
+from app.utils.metrics import STAGE_SECONDS
+
+
+class RequestTiming:
+    """
+    Stage durations of one request, or of one generation within a request.
+
+    Durations of a stage recorded several times (e.g. one resize per
+    context image) are summed. Stages recorded on a nested timing are also
+    added to its parent.
+    """
+
+    def __init__(self, parent: Optional["RequestTiming"] = None):
+        self.parent = parent
+        self.start = time.perf_counter()
+        # Set by API routes when the endpoint function returns
+        self.endpoint_end: Optional[float] = None
+        # Stages already known to the parent (e.g. parsing) apply here too
+        self.stages: Dict[str, float] = dict(parent.stages) if parent else {}
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        if self.parent is not None:
+            self.parent.add(stage, seconds)
+
+    def snapshot(self) -> Dict[str, float]:
+        """
+        Get the stage durations recorded so far.
+
+        Returns:
+            Dictionary mapping stage names to seconds
+        """
+        return {stage: round(seconds, 6) for stage, seconds in self.stages.items()}
+
+    def server_timing(self) -> str:
+        """
+        Format the stage durations as a Server-Timing header value.
+
+        Returns:
+            Comma-separated metrics with durations in milliseconds
+        """
+        total = time.perf_counter() - self.start
+        entries = [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in self.stages.items()]
+        entries.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(entries)
+
+
+_current_timing: ContextVar[Optional[RequestTiming]] = ContextVar("request_timing", default=None)
+
+
+def current_timing() -> Optional[RequestTiming]:
+    """Get the timing of the request being handled, if any."""
+    return _current_timing.get()
+
+
+@contextmanager
+def timing_scope(parent: Optional[RequestTiming] = None) -> Iterator[RequestTiming]:
+    """
+    Record stages into a new nested timing.
+
+    Args:
+        parent: Timing to nest in (defaults to the current one)
+
+    Yields:
+        The new timing
+    """
+    timing = RequestTiming(parent=parent or _current_timing.get())
+    token = _current_timing.set(timing)
+    try:
+        yield timing
+    finally:
+        # Streams time their generation in a scope held by the generator
+        reset_context_var(_current_timing, token)
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    """
+    Record the duration of a stage in the metrics and the current timing.
+
+    Args:
+        stage: Stage name (e.g. "decode", "upstream")
+        seconds: Time spent in the stage
+    """
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timing = _current_timing.get()
+    if timing is not None:
+        timing.add(stage, seconds)
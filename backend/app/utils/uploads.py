@@ -0,0 +1,291 @@
+from tempfile import SpooledTemporaryFile
+from typing import AsyncIterator, List, Optional, Tuple, Union
+from fastapi import Request, status
+from starlette.datastructures import FormData, Headers, UploadFile
+
+try:
+    import python_multipart as multipart
+    from python_multipart.multipart import parse_options_header
+except ModuleNotFoundError:  # python-multipart < 0.0.13
+    import multipart
+    from multipart.multipart import parse_options_header
+
+# Allowance for the form fields and part headers on top of the files
+FORM_OVERHEAD_BYTES = 1048576  # 1MB
+MAX_FIELD_SIZE = 65536  # Bytes per non-file field
+MAX_FIELDS = 32
+# File parts are kept in memory up to this size, then on disk
+SPOOL_MAX_SIZE = 1048576  # 1MB
+
+
+class UploadRejected(Exception):
+    """Raised when a multipart upload is invalid or exceeds the limits."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def file_extension(filename: Optional[str]) -> str:
+    """Lowercase extension of a file name, empty if it has none."""
+    if not filename or "." not in filename:
+        return ""
+    return filename.rsplit(".", 1)[-1].lower()
+
+
+def _decode(value: bytes, charset: str) -> str:
+    try:
+        return value.decode(charset)
+    except (UnicodeDecodeError, LookupError):
+        return value.decode("latin-1")
+
+
+async def limit_body_size(stream: AsyncIterator[bytes], max_body_size: int) -> AsyncIterator[bytes]:
+    """
+    Pass a request body through, rejecting it once it exceeds a size.
+
+    Covers bodies sent without a Content-Length, e.g. chunked ones.
+
+    Args:
+        stream: Request body chunks
+        max_body_size: Maximum body size in bytes
+
+    Raises:
+        UploadRejected: 413 as soon as the body exceeds max_body_size
+    """
+    received = 0
+    async for chunk in stream:
+        received += len(chunk)
+        if received > max_body_size:
+            raise UploadRejected(
+                status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                f"Request body exceeds maximum size of {max_body_size} bytes"
+            )
+        yield chunk
+
+
+class UploadFormParser:
+    """
+    Multipart parser enforcing upload limits while the body streams in.
+
+    File parts are spooled to temporary files (in memory up to 1MB, then on
+    disk). A file with a disallowed extension is rejected as soon as its part
+    headers arrive and an oversized part as soon as it crosses the limit, so
+    the rest of the body is never read.
+    """
+
+    def __init__(
+        self,
+        headers: Headers,
+        stream: AsyncIterator[bytes],
+        max_file_size: int,
+        allowed_extensions: List[str],
+        max_files: int
+    ):
+        """
+        Initialize the parser.
+
+        Args:
+            headers: Request headers
+            stream: Request body chunks
+            max_file_size: Maximum bytes per file
+            allowed_extensions: Allowed lowercase file extensions
+            max_files: Maximum number of files
+        """
+        self.headers = headers
+        self.stream = stream
+        self.max_file_size = max_file_size
+        self.allowed_extensions = allowed_extensions
+        self.max_files = max_files
+        self.items: List[Tuple[str, Union[str, UploadFile]]] = []
+        self._charset = "utf-8"
+        self._files: List[UploadFile] = []
+        self._fields = 0
+        # State of the part being parsed
+        self._header_name = b""
+        self._header_value = b""
+        self._part_headers: List[Tuple[bytes, bytes]] = []
+        self._part_name = ""
+        self._part_file: Optional[UploadFile] = None
+        self._part_data = bytearray()
+        self._part_size = 0
+        # File data received by the callbacks, written out between chunks
+        self._pending_writes: List[Tuple[UploadFile, bytes]] = []
+
+    def on_part_begin(self) -> None:
+        self._part_headers = []
+        self._part_name = ""
+        self._part_file = None
+        self._part_data = bytearray()
+        self._part_size = 0
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        self._part_headers.append((self._header_name.lower(), self._header_value))
+        self._header_name = b""
+        self._header_value = b""
+
+    def on_headers_finished(self) -> None:
+        disposition = dict(self._part_headers).get(b"content-disposition", b"")
+        _, options = parse_options_header(disposition)
+        if b"name" not in options:
+            raise UploadRejected(
+                status.HTTP_400_BAD_REQUEST,
+                'The Content-Disposition header field "name" must be provided'
+            )
+        self._part_name = _decode(options[b"name"], self._charset)
+
+        if b"filename" not in options:
+            self._fields += 1
+            if self._fields > MAX_FIELDS:
+                raise UploadRejected(
+                    status.HTTP_400_BAD_REQUEST,
+                    f"Too many fields. Maximum number of fields is {MAX_FIELDS}"
+                )
+            return
+
+        if len(self._files) >= self.max_files:
+            raise UploadRejected(
+                status.HTTP_400_BAD_REQUEST,
+                f"Too many files. Maximum number of files is {self.max_files}"
+            )
+        filename = _decode(options[b"filename"], self._charset)
+        if file_extension(filename) not in self.allowed_extensions:
+            raise UploadRejected(
+                status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                f"File extension not allowed: {filename}. Allowed: {', '.join(self.allowed_extensions)}"
+            )
+        self._part_file = UploadFile(
+            file=SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE),
+            size=0,
+            filename=filename,
+            headers=Headers(raw=self._part_headers)
+        )
+        self._files.append(self._part_file)
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        self._part_size += end - start
+        if self._part_file is None:
+            if self._part_size > MAX_FIELD_SIZE:
+                raise UploadRejected(
+                    status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    f"Field {self._part_name} exceeds maximum size of {MAX_FIELD_SIZE} bytes"
+                )
+            self._part_data.extend(data[start:end])
+            return
+
+        if self._part_size > self.max_file_size:
+            raise UploadRejected(
+                status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                f"File {self._part_file.filename} exceeds maximum size of {self.max_file_size} bytes"
+            )
+        self._pending_writes.append((self._part_file, data[start:end]))
+
+    def on_part_end(self) -> None:
+        if self._part_file is None:
+            self.items.append((self._part_name, _decode(bytes(self._part_data), self._charset)))
+        else:
+            self.items.append((self._part_name, self._part_file))
+
+    async def parse(self) -> FormData:
+        """
+        Read and parse the whole body.
+
+        Returns:
+            Parsed form; the caller must close it to release the files
+
+        Raises:
+            UploadRejected: If the body is not a valid multipart form or
+                exceeds the limits
+        """
+        _, params = parse_options_header(self.headers.get("content-type", ""))
+        charset = params.get(b"charset", b"utf-8")
+        self._charset = charset.decode("latin-1") if isinstance(charset, bytes) else charset
+        if b"boundary" not in params:
+            raise UploadRejected(status.HTTP_400_BAD_REQUEST, "Missing boundary in multipart body")
+
+        parser = multipart.MultipartParser(params[b"boundary"], {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished
+        })
+        try:
+            async for chunk in self.stream:
+                parser.write(chunk)
+                # UploadFile.write() runs in a thread, so it is awaited here
+                # rather than called from the callbacks
+                for file, data in self._pending_writes:
+                    await file.write(data)
+                self._pending_writes.clear()
+            parser.finalize()
+            for file in self._files:
+                await file.seek(0)
+        except BaseException as e:
+            for file in self._files:
+                await file.close()
+            if isinstance(e, ValueError):
+                # Malformed body reported by python-multipart itself
+                raise UploadRejected(status.HTTP_400_BAD_REQUEST, f"Invalid multipart body: {str(e)}")
+            raise
+        return FormData(self.items)
+
+
+async def parse_upload_form(
+    request: Request,
+    max_file_size: int,
+    allowed_extensions: List[str],
+    max_files: int
+) -> FormData:
+    """
+    Parse a multipart/form-data request body within the upload limits.
+
+    A Content-Length beyond what max_files files of max_file_size could need
+    is rejected before reading anything, and a body without one as soon as
+    it grows past that size.
+
+    Args:
+        request: Incoming request
+        max_file_size: Maximum bytes per file
+        allowed_extensions: Allowed lowercase file extensions
+        max_files: Maximum number of files
+
+    Returns:
+        Parsed form; the caller must close it to release the files
+
+    Raises:
+        UploadRejected: If the body is not a valid multipart form or
+            exceeds the limits
+    """
+    content_type = request.headers.get("content-type", "")
+    if not content_type.startswith("multipart/form-data"):
+        raise UploadRejected(
+            status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            "Expected a multipart/form-data body"
+        )
+
+    max_body_size = max_files * max_file_size + FORM_OVERHEAD_BYTES
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_body_size:
+        raise UploadRejected(
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            f"Request body exceeds maximum size of {max_body_size} bytes"
+        )
+
+    parser = UploadFormParser(
+        request.headers,
+        limit_body_size(request.stream(), max_body_size),
+        max_file_size=max_file_size,
+        allowed_extensions=allowed_extensions,
+        max_files=max_files
+    )
+    return await parser.parse()
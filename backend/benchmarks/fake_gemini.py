@@ -0,0 +1,148 @@
+"""
+Stand-in for the Gemini client, for benchmarks and local testing.
+
+Implements the parts of ``genai.Client`` the backend uses (``aio.models``
+generate_content, generate_content_stream and get) without any network
+access, with configurable latency, error rate, rate limit and output image
+size. One fake stands for one API key.
+"""
+import asyncio
+import math
+import os
+import random
+import time
+from collections import deque
+from io import BytesIO
+from typing import Any, AsyncIterator, Optional
+
+from google.genai import errors, types
+from PIL import Image
+
+
+def noise_image_bytes(width: int, height: int, image_format: str = "PNG", mode: str = "RGB") -> bytes:
+    """
+    Encode an image of random noise, which compresses about as badly as photos.
+
+    Args:
+        width: Image width
+        height: Image height
+        image_format: PIL format name
+        mode: PIL image mode
+
+    Returns:
+        Encoded image bytes
+    """
+    channels = len(mode)
+    image = Image.frombytes(mode, (width, height), os.urandom(width * height * channels))
+    buffer = BytesIO()
+    image.save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+class FakeModels:
+    """Fake of ``client.aio.models``."""
+
+    def __init__(
+        self,
+        latency: float = 1.0,
+        latency_jitter: float = 0.0,
+        error_rate: float = 0.0,
+        output_size: int = 1048576,
+        seed: Optional[int] = None,
+        rate_limit: int = 0,
+        rate_window: float = 60.0
+    ):
+        """
+        Initialize the fake.
+
+        Args:
+            latency: Mean seconds per generation
+            latency_jitter: Maximum seconds added to or removed from latency
+            error_rate: Fraction of generations failing with a 503
+            output_size: Approximate size of the generated PNG in bytes
+            seed: Random seed for reproducible latencies and errors
+            rate_limit: Generations accepted per rate window, beyond which
+                they fail with a 429 (0 for no limit)
+            rate_window: Seconds over which rate_limit is counted
+        """
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        side = max(1, int(math.sqrt(output_size / 3)))
+        self.output_image = noise_image_bytes(side, side)
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self._starts: deque = deque()
+        self.calls = 0
+        self.errors = 0
+        self.rate_limited = 0
+
+    def _check_rate_limit(self) -> None:
+        if not self.rate_limit:
+            return
+        now = time.monotonic()
+        while self._starts and self._starts[0] <= now - self.rate_window:
+            self._starts.popleft()
+        if len(self._starts) >= self.rate_limit:
+            self.rate_limited += 1
+            raise errors.ClientError(429, {"error": {"code": 429, "message": "Fake quota exceeded", "status": "RESOURCE_EXHAUSTED"}})
+        self._starts.append(now)
+
+    async def _wait(self) -> None:
+        jitter = self._random.uniform(-self.latency_jitter, self.latency_jitter)
+        await asyncio.sleep(max(0.0, self.latency + jitter))
+        if self._random.random() < self.error_rate:
+            self.errors += 1
+            raise errors.ServerError(503, {"error": {"code": 503, "message": "Fake overload", "status": "UNAVAILABLE"}})
+
+    def _response(self, parts: list) -> types.GenerateContentResponse:
+        return types.GenerateContentResponse(
+            candidates=[types.Candidate(content=types.Content(role="model", parts=parts))]
+        )
+
+    async def generate_content(self, model: str, contents: Any, config: Any = None) -> types.GenerateContentResponse:
+        self.calls += 1
+        self._check_rate_limit()
+        await self._wait()
+        return self._response([
+            types.Part(text="Here is your image."),
+            types.Part.from_bytes(data=self.output_image, mime_type="image/png")
+        ])
+
+    async def generate_content_stream(
+        self,
+        model: str,
+        contents: Any,
+        config: Any = None
+    ) -> AsyncIterator[types.GenerateContentResponse]:
+        self.calls += 1
+        self._check_rate_limit()
+
+        async def chunks() -> AsyncIterator[types.GenerateContentResponse]:
+            await self._wait()
+            yield self._response([types.Part(text="Here is your image.")])
+            yield self._response([types.Part.from_bytes(data=self.output_image, mime_type="image/png")])
+
+        return chunks()
+
+    async def get(self, model: str) -> types.Model:
+        return types.Model(name=model)
+
+
+class FakeAio:
+    def __init__(self, models: FakeModels):
+        self.models = models
+
+
+class FakeGeminiClient:
+    """Fake of ``genai.Client`` exposing ``aio.models``."""
+
+    def __init__(self, **kwargs: Any):
+        """
+        Initialize the fake.
+
+        Args:
+            **kwargs: Passed to FakeModels
+        """
+        self.aio = FakeAio(FakeModels(**kwargs))
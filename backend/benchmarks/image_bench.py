@@ -0,0 +1,357 @@
+"""
+Micro-benchmarks of the image utilities on the request hot path.
+
+Times base64 decoding and encoding, PIL decoding, resizing, re-encoding and
+the whole context image preparation over a fixed corpus of generated images
+(thumbnail to 8K, with and without alpha, PNG, JPEG and WEBP), and records
+the median time and peak memory of each case.
+
+Results are compared with the stored baseline (image_baseline.json) and the
+run fails when a case regresses past the tolerances. Baseline times are
+scaled by a calibration workload, so a baseline recorded on another machine
+stays usable.
+
+Usage (from backend/):
+    python -m benchmarks.image_bench                    # compare with the baseline
+    python -m benchmarks.image_bench --quick            # skip the 8K images
+    python -m benchmarks.image_bench --filter resize    # only matching cases
+    python -m benchmarks.image_bench --update-baseline  # record a new baseline
+"""
+import argparse
+import ctypes
+import gc
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+from PIL import Image
+
+from app.utils.image import (
+    EncodingPolicy,
+    base64_to_pil,
+    bytes_to_base64,
+    choose_output_format,
+    decode_base64_image,
+    encode_image,
+    prepare_context_image,
+    resize_image_if_needed
+)
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "image_baseline.json")
+
+SIZES = {
+    "thumb": (256, 256),
+    "hd": (1920, 1080),
+    "4k": (3840, 2160),
+    "8k": (7680, 4320),
+}
+VARIANTS = {
+    "png_rgb": ("PNG", "RGB"),
+    "png_rgba": ("PNG", "RGBA"),
+    "jpeg_rgb": ("JPEG", "RGB"),
+    "webp_rgba": ("WEBP", "RGBA"),
+}
+
+MAX_SIZE = 2048
+RESIZE_QUALITY = "balanced"
+POLICY = EncodingPolicy()
+
+# Allowed slowdown and memory growth before a case counts as a regression
+DEFAULT_TIME_TOLERANCE = 0.30
+DEFAULT_MEMORY_TOLERANCE = 0.20
+# Absolute slack so noise on tiny cases is not reported
+TIME_SLACK = 0.0005  # Seconds
+MEMORY_SLACK = 1048576  # Bytes
+
+# mallopt() parameter number of the mmap threshold in glibc
+M_MMAP_THRESHOLD = -3
+_LIBC: List[Any] = []
+
+Case = Tuple[str, Callable[[], Any]]
+
+
+def generate_image(width: int, height: int, mode: str, seed: int = 0) -> Image.Image:
+    """
+    Generate a deterministic test image with gradients and texture.
+
+    Smooth areas and noise make it compress roughly like a photo, and it is
+    much faster to build than full-resolution noise.
+    """
+    rng = random.Random(seed)
+    small = (max(1, width // 4), max(1, height // 4))
+    texture = Image.frombytes("L", small, rng.randbytes(small[0] * small[1])).resize(
+        (width, height), Image.Resampling.BILINEAR
+    )
+    bands = [
+        Image.linear_gradient("L").resize((width, height)),
+        Image.radial_gradient("L").resize((width, height)),
+        texture,
+    ]
+    if mode == "RGBA":
+        bands.append(Image.linear_gradient("L").rotate(90).resize((width, height)))
+    return Image.merge(mode, bands)
+
+
+def build_corpus(sizes: List[str]) -> Dict[str, bytes]:
+    """Encode every size and variant of the corpus."""
+    corpus = {}
+    for size_name in sizes:
+        width, height = SIZES[size_name]
+        for variant_name, (image_format, mode) in VARIANTS.items():
+            buffer = BytesIO()
+            generate_image(width, height, mode).save(buffer, format=image_format)
+            corpus[f"{size_name}_{variant_name}"] = buffer.getvalue()
+    return corpus
+
+
+def build_cases(corpus: Dict[str, bytes]) -> List[Case]:
+    """Build the benchmark cases for every corpus image."""
+    cases: List[Case] = []
+    for key, data in corpus.items():
+        encoded = bytes_to_base64(data)
+        decoded = Image.open(BytesIO(data))
+        decoded.load()
+        # The format is chosen from the image as opened, like the real path
+        output_format = choose_output_format(decoded, POLICY)
+        resized = resize_image_if_needed(decoded.copy(), MAX_SIZE, RESIZE_QUALITY)
+
+        cases.extend([
+            (f"decode_base64_image[{key}]", lambda encoded=encoded: decode_base64_image(encoded)),
+            (f"bytes_to_base64[{key}]", lambda data=data: bytes_to_base64(data)),
+            (f"base64_to_pil[{key}]", lambda encoded=encoded: base64_to_pil(encoded).load()),
+            (
+                f"resize_image_if_needed[{key}]",
+                lambda decoded=decoded: resize_image_if_needed(decoded, MAX_SIZE, RESIZE_QUALITY)
+            ),
+            (
+                f"encode_image[{key}]",
+                lambda resized=resized, output_format=output_format: encode_image(
+                    resized, output_format, POLICY
+                )
+            ),
+            (
+                f"prepare_context_image[{key}]",
+                lambda data=data: prepare_context_image(data, MAX_SIZE, POLICY, RESIZE_QUALITY)
+            ),
+        ])
+    return cases
+
+
+def _read_status_kb(field: str) -> Optional[int]:
+    try:
+        with open("/proc/self/status") as f:
+            match = re.search(rf"^{field}:\s+(\d+) kB", f.read(), re.MULTILINE)
+    except OSError:
+        return None
+    return int(match.group(1)) if match else None
+
+
+def _configure_allocator() -> None:
+    """
+    Make glibc return freed pixel buffers to the system right away.
+
+    Otherwise the dynamic mmap threshold keeps freed buffers in the heap and
+    later allocations reuse them without raising the RSS.
+    """
+    try:
+        libc = ctypes.CDLL("libc.so.6")
+        libc.mallopt(M_MMAP_THRESHOLD, 131072)
+        _LIBC.append(libc)
+    except (OSError, AttributeError):
+        pass
+
+
+def _reset_peak_rss() -> bool:
+    """Reset the peak RSS of this process (Linux only)."""
+    for libc in _LIBC:
+        libc.malloc_trim(0)
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def measure_memory(func: Callable[[], Any]) -> Tuple[int, str]:
+    """
+    Measure the peak memory a call allocates on top of the current usage.
+
+    Uses the peak RSS on Linux, which includes Pillow's pixel buffers;
+    elsewhere falls back to tracemalloc, which only sees Python objects.
+
+    Returns:
+        Tuple of (bytes, method used)
+    """
+    gc.collect()
+    if _reset_peak_rss():
+        before = _read_status_kb("VmRSS")
+        result = func()
+        peak = _read_status_kb("VmHWM")
+        del result
+        if before is not None and peak is not None:
+            return max(0, peak - before) * 1024, "rss"
+
+    tracemalloc.start()
+    result = func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return peak, "tracemalloc"
+
+
+def measure_time(func: Callable[[], Any], repeat: int, min_time: float) -> float:
+    """
+    Median wall time of one call.
+
+    Fast calls are looped so every sample lasts at least min_time seconds.
+    """
+    start = time.perf_counter()
+    func()
+    single = time.perf_counter() - start
+    loops = max(1, int(min_time / single)) if single > 0 else 1000
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        samples.append((time.perf_counter() - start) / loops)
+    return statistics.median(samples)
+
+
+def calibrate() -> float:
+    """Time a fixed Pillow workload used to scale baselines between machines."""
+    image = generate_image(1024, 1024, "RGB", seed=1)
+
+    def workload() -> None:
+        image.resize((512, 512), Image.Resampling.LANCZOS).tobytes()
+        bytes_to_base64(image.tobytes())
+
+    return measure_time(workload, repeat=5, min_time=0.05)
+
+
+def compare(
+    results: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Any],
+    calibration: float
+) -> List[str]:
+    """
+    Find the cases regressing past the baseline tolerances.
+
+    Returns:
+        One message per regression
+    """
+    scale = calibration / baseline["calibration"] if baseline.get("calibration") else 1.0
+    time_tolerance = baseline.get("time_tolerance", DEFAULT_TIME_TOLERANCE)
+    memory_tolerance = baseline.get("memory_tolerance", DEFAULT_MEMORY_TOLERANCE)
+
+    regressions = []
+    for name, result in results.items():
+        expected = baseline["cases"].get(name)
+        if expected is None:
+            continue
+
+        time_limit = expected["time"] * scale * (1 + time_tolerance) + TIME_SLACK
+        if result["time"] > time_limit:
+            regressions.append(
+                f"{name}: {result['time'] * 1000:.2f}ms > limit {time_limit * 1000:.2f}ms "
+                f"(baseline {expected['time'] * 1000:.2f}ms, machine scale {scale:.2f})"
+            )
+
+        if expected.get("memory_method") == result["memory_method"]:
+            memory_limit = expected["memory"] * (1 + memory_tolerance) + MEMORY_SLACK
+            if result["memory"] > memory_limit:
+                regressions.append(
+                    f"{name}: {result['memory'] / 1048576:.1f}MB > limit "
+                    f"{memory_limit / 1048576:.1f}MB (baseline {expected['memory'] / 1048576:.1f}MB)"
+                )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="Skip the 8K images")
+    parser.add_argument("--filter", help="Only run cases whose name contains this text")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing samples per case")
+    parser.add_argument("--min-time", type=float, default=0.02, help="Minimum seconds per timing sample")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline file")
+    parser.add_argument("--update-baseline", action="store_true", help="Record the results as the new baseline")
+    parser.add_argument("--output", help="Also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    _configure_allocator()
+    sizes = [size for size in SIZES if not (args.quick and size == "8k")]
+    print(f"Generating corpus ({', '.join(sizes)})...", file=sys.stderr)
+    cases = build_cases(build_corpus(sizes))
+    if args.filter:
+        cases = [case for case in cases if args.filter in case[0]]
+
+    calibration = calibrate()
+    results: Dict[str, Dict[str, Any]] = {}
+    for name, func in cases:
+        elapsed = measure_time(func, args.repeat, args.min_time)
+        memory, memory_method = measure_memory(func)
+        results[name] = {"time": elapsed, "memory": memory, "memory_method": memory_method}
+        print(f"{name:<48}{elapsed * 1000:>10.2f}ms{memory / 1048576:>10.1f}MB", file=sys.stderr)
+
+    report = {
+        "calibration": calibration,
+        "machine": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "pillow": Image.__version__,
+        },
+        "cases": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.update_baseline:
+        previous: Dict[str, Any] = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                previous = json.load(f)
+        # Keep cases that were not run this time (e.g. with --quick)
+        cases_baseline = {**previous.get("cases", {}), **results}
+        baseline = {
+            "time_tolerance": previous.get("time_tolerance", DEFAULT_TIME_TOLERANCE),
+            "memory_tolerance": previous.get("memory_tolerance", DEFAULT_MEMORY_TOLERANCE),
+            **report,
+            "cases": dict(sorted(cases_baseline.items())),
+        }
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}", file=sys.stderr)
+        return
+
+    if not os.path.exists(args.baseline):
+        print("No baseline found, run with --update-baseline to record one", file=sys.stderr)
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, calibration)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s):", file=sys.stderr)
+        for message in regressions:
+            print(f"  {message}", file=sys.stderr)
+        sys.exit(1)
+    print(f"\nNo regressions against {args.baseline}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""
+End-to-end load benchmark of the generation API against a fake Gemini backend.
+
+Runs the FastAPI app in-process through httpx's ASGI transport (no server or
+network involved) with the Gemini clients replaced by FakeGeminiClient (one
+per simulated API key, optionally rate limited), drives
+POST /api/generate with a mix of prompt sizes and context images, and reports
+throughput, latency percentiles, event-loop lag and peak RSS as JSON. The
+clients share the event loop with the app, so the measured lag includes the
+(small) client overhead.
+
+Usage (from backend/):
+    python -m benchmarks.load_test --requests 200 --concurrency 16 --output before.json
+    python -m benchmarks.load_test --requests 200 --concurrency 16 --compare before.json
+    python -m benchmarks.load_test --keys 4 --key-rate-limit 20 --key-rate-window 5
+
+Application settings can be overridden with environment variables as usual
+(e.g. ADMISSION_INITIAL_LIMIT=32).
+"""
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+# Settings are read on import, so set the benchmark defaults first
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("DEBUG", "false")
+os.environ.setdefault("IMAGE_STORE_DIR", tempfile.mkdtemp(prefix="bench-image-store-"))
+
+import httpx
+
+from app.config import settings
+from benchmarks.fake_gemini import FakeGeminiClient, noise_image_bytes
+
+# Context images per scenario as (width, height, format)
+SCENARIOS: Dict[str, Dict[str, Any]] = {
+    "text_only": {"prompt_chars": 200, "images": []},
+    "small_context": {"prompt_chars": 500, "images": [(512, 512, "PNG")]},
+    "large_context": {"prompt_chars": 1000, "images": [(3000, 2000, "JPEG")]},
+    "multi_context": {
+        "prompt_chars": 2000,
+        "images": [(1024, 1024, "PNG"), (1024, 768, "JPEG"), (800, 800, "WEBP")]
+    },
+}
+
+# Metrics compared by --compare, and whether higher is better
+COMPARED_METRICS = {
+    "throughput": True,
+    "latency.p50": False,
+    "latency.p95": False,
+    "latency.p99": False,
+    "event_loop_lag.p99": False,
+    "peak_rss_bytes": False,
+}
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile, None for no values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    return {
+        "mean": sum(values) / len(values) if values else None,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else None,
+    }
+
+
+def peak_rss_bytes() -> int:
+    """Peak resident set size of this process."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def build_payloads(scenario_names: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Encode the context images of each scenario once.
+
+    The images are padded with trailing zero bytes (which decoders ignore)
+    to a multiple of 3 bytes, so a nonce can be appended to their base64
+    without encoding them again.
+    """
+    payloads = {}
+    for name in scenario_names:
+        scenario = SCENARIOS[name]
+        images = [
+            noise_image_bytes(width, height, image_format)
+            for width, height, image_format in scenario["images"]
+        ]
+        payloads[name] = {
+            "prompt": ("Draw a banana wearing sunglasses on a beach. " * 50)[:scenario["prompt_chars"]],
+            "context_images": [
+                base64.b64encode(image + b"\0" * (-len(image) % 3)).decode("ascii")
+                for image in images
+            ]
+        }
+    return payloads
+
+
+def with_nonce(context_images: List[str], index: int) -> List[str]:
+    """
+    Make the context images of a request unique by appending a nonce.
+
+    Otherwise every request after the first sends the same bytes, and the
+    preprocessed image cache answers them instead of decoding and resizing.
+
+    Args:
+        context_images: Base64 images from build_payloads()
+        index: Request number
+
+    Returns:
+        Base64 images ending with different bytes for every index
+    """
+    # 12 bytes: a whole number of base64 groups, so no padding in between
+    nonce = base64.b64encode(f"{index:012d}".encode("ascii")).decode("ascii")
+    return [image + nonce for image in context_images]
+
+
+async def monitor_event_loop(interval: float, samples: List[float], stop: asyncio.Event) -> None:
+    """Record how late the event loop wakes up from sleeps of interval seconds."""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - start - interval))
+
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    if args.disable_caches:
+        settings.image_cache_max_bytes = 0
+        settings.result_cache_max_bytes = 0
+
+    # Imported after the settings overrides so the services pick them up
+    from app.main import app
+    from app.services.gemini import get_gemini_service
+    from app.services.routing import RoutingPool, UpstreamBackend
+
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+
+    scenario_names = args.scenarios.split(",")
+    unknown = [name for name in scenario_names if name not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(unknown)} (choose from {', '.join(SCENARIOS)})")
+    payloads = build_payloads(scenario_names)
+
+    fake_clients = [
+        FakeGeminiClient(
+            latency=args.latency,
+            latency_jitter=args.latency_jitter,
+            error_rate=args.error_rate,
+            output_size=args.output_size,
+            seed=args.seed + index,
+            rate_limit=args.key_rate_limit,
+            rate_window=args.key_rate_window
+        )
+        for index in range(args.keys)
+    ]
+    gemini_service = get_gemini_service()
+    gemini_service.pool = RoutingPool(
+        [
+            UpstreamBackend(
+                f"key{index}",
+                lambda client=client: client,
+                rate_limit=args.key_rate_limit,
+                rate_window=args.key_rate_window
+            )
+            for index, client in enumerate(fake_clients)
+        ],
+        gemini_service.pool.models
+    )
+
+    latencies: List[float] = []
+    by_scenario: Dict[str, List[float]] = {name: [] for name in scenario_names}
+    status_codes: Dict[str, int] = {}
+    succeeded = 0
+    next_index = 0
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+
+            async def worker(stop_at: int, measure: bool) -> None:
+                nonlocal next_index, succeeded
+                while next_index < stop_at:
+                    index = next_index
+                    next_index += 1
+                    name = scenario_names[index % len(scenario_names)]
+                    payload = payloads[name]
+                    # Unique prompts and images, so requests are neither
+                    # coalesced nor cached
+                    body = {**payload, "prompt": f"[{index}] {payload['prompt']}"}
+                    if not args.repeat_images:
+                        body["context_images"] = with_nonce(payload["context_images"], index)
+
+                    start = time.perf_counter()
+                    response = await client.post("/api/generate", json=body)
+                    elapsed = time.perf_counter() - start
+                    if not measure:
+                        continue
+
+                    latencies.append(elapsed)
+                    by_scenario[name].append(elapsed)
+                    status = str(response.status_code)
+                    status_codes[status] = status_codes.get(status, 0) + 1
+                    if response.status_code == 200 and response.json().get("success"):
+                        succeeded += 1
+
+            # Warm-up requests are sent first and left out of the results
+            if args.warmup:
+                await asyncio.gather(*(
+                    worker(args.warmup, measure=False)
+                    for _ in range(min(args.concurrency, args.warmup))
+                ))
+
+            lag_samples: List[float] = []
+            stop = asyncio.Event()
+            monitor = asyncio.create_task(monitor_event_loop(args.lag_interval, lag_samples, stop))
+            start_time = time.perf_counter()
+            await asyncio.gather(*(
+                worker(args.warmup + args.requests, measure=True)
+                for _ in range(args.concurrency)
+            ))
+            duration = time.perf_counter() - start_time
+            stop.set()
+            await monitor
+
+    return {
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+            "scenarios": scenario_names,
+            "latency": args.latency,
+            "latency_jitter": args.latency_jitter,
+            "error_rate": args.error_rate,
+            "output_size": args.output_size,
+            "disable_caches": args.disable_caches,
+            "repeat_images": args.repeat_images,
+            "keys": args.keys,
+            "key_rate_limit": args.key_rate_limit,
+            "key_rate_window": args.key_rate_window,
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": {
+            "requests": len(latencies),
+            "succeeded": succeeded,
+            "failed": len(latencies) - succeeded,
+            "status_codes": status_codes,
+            "duration": duration,
+            "throughput": len(latencies) / duration if duration else None,
+            "latency": summarize(latencies),
+            "event_loop_lag": summarize(lag_samples),
+            "peak_rss_bytes": peak_rss_bytes(),
+            "upstream_calls": sum(client.aio.models.calls for client in fake_clients),
+            "upstream_errors": sum(client.aio.models.errors for client in fake_clients),
+            "upstream_rate_limited": sum(client.aio.models.rate_limited for client in fake_clients),
+            "upstream_calls_per_key": [client.aio.models.calls for client in fake_clients],
+        },
+        "scenarios": {name: summarize(values) for name, values in by_scenario.items()},
+    }
+
+
+def lookup(report: Dict[str, Any], path: str) -> Optional[float]:
+    value: Any = report["results"]
+    for key in path.split("."):
+        value = value.get(key) if isinstance(value, dict) else None
+    return value
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """Print the change of the key metrics against an earlier report."""
+    print(f"{'metric':<22}{'baseline':>14}{'current':>14}{'change':>10}", file=sys.stderr)
+    for path, higher_is_better in COMPARED_METRICS.items():
+        before, after = lookup(baseline, path), lookup(report, path)
+        if before is None or after is None:
+            continue
+        change = (after - before) / before * 100 if before else 0.0
+        better = change > 0 if higher_is_better else change < 0
+        marker = "" if abs(change) < 1 else (" better" if better else " worse")
+        print(f"{path:<22}{before:>14.4f}{after:>14.4f}{change:>+9.1f}%{marker}", file=sys.stderr)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients")
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests sent first")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated request mix")
+    parser.add_argument("--latency", type=float, default=0.5, help="Fake upstream latency in seconds")
+    parser.add_argument("--latency-jitter", type=float, default=0.1, help="Latency jitter in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of failing upstream calls")
+    parser.add_argument("--output-size", type=int, default=1048576, help="Generated image size in bytes")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed of the fake upstream")
+    parser.add_argument("--keys", type=int, default=1, help="Simulated API keys")
+    parser.add_argument("--key-rate-limit", type=int, default=0, help="Requests per window and key, 0 = unlimited")
+    parser.add_argument("--key-rate-window", type=float, default=60.0, help="Rate limit window in seconds")
+    parser.add_argument("--lag-interval", type=float, default=0.01, help="Event-loop lag sampling interval")
+    parser.add_argument("--disable-caches", action="store_true", help="Disable image and result caches")
+    parser.add_argument("--repeat-images", action="store_true", help="Send identical context images (cache hits)")
+    parser.add_argument("--verbose", action="store_true", help="Keep the application logs")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    parser.add_argument("--compare", help="Earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_benchmark(args))
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Cold start benchmark of the backend.
+
+Starts fresh interpreters and measures, in each:
+
+- import: importing app.main
+- lifespan: running the lifespan startup until the server would accept
+  connections
+- ready: from process start until the readiness check turns green, i.e.
+  the background warm-up and the first health probe are done
+- first_request: one /api/generate call right after readiness
+
+The upstream client is created for real (so the SDK import and client
+setup are paid as in production) but its calls are answered by the fake
+from fake_gemini.py, so no network access is needed. It also lists the
+import cost by top-level package, and fails when a module that should be
+imported lazily is loaded by ``import app.main`` or a time exceeds its
+budget.
+
+Usage (from backend/):
+    python -m benchmarks.startup_bench                     # 5 cold starts
+    python -m benchmarks.startup_bench --runs 10 --top 15
+    python -m benchmarks.startup_bench --max-import 0.6 --max-ready 1.5
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must not be loaded by importing the application; they are
+# imported on first use or by the background warm-up
+LAZY_MODULES = ["google.genai", "PIL.Image"]
+
+METRICS = ["import", "lifespan", "ready", "first_request"]
+
+
+async def _start_and_wait(process_start: float, timeout: float) -> Dict[str, Any]:
+    """Run the lifespan and one request in this (fresh) process."""
+    import httpx
+    from app.main import app
+    from app.services.gemini import GeminiService
+    from app.services.health import get_health_monitor
+
+    create_client = GeminiService._create_client
+
+    def create_fake_client(service: GeminiService, api_key: str) -> Any:
+        # Pay for the real SDK import and client setup, then talk to the fake
+        create_client(service, api_key)
+        from benchmarks.fake_gemini import FakeGeminiClient
+        return FakeGeminiClient(latency=0.0, output_size=16384)
+
+    GeminiService._create_client = create_fake_client
+
+    results: Dict[str, Any] = {}
+    start = time.perf_counter()
+    async with app.router.lifespan_context(app):
+        results["lifespan"] = time.perf_counter() - start
+
+        monitor = get_health_monitor()
+        deadline = time.perf_counter() + timeout
+        while not monitor.ready:
+            if time.perf_counter() > deadline:
+                raise RuntimeError(f"Not ready after {timeout}s: {monitor.snapshot()}")
+            await asyncio.sleep(0.002)
+        results["ready"] = time.perf_counter() - process_start
+        results["warm_up"] = monitor.warm_up_time
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            start = time.perf_counter()
+            response = await client.post("/api/generate", json={"prompt": "startup benchmark"})
+            results["first_request"] = time.perf_counter() - start
+            if response.status_code != 200:
+                raise RuntimeError(f"First request failed: {response.status_code} {response.text[:200]}")
+    return results
+
+
+def run_child(timeout: float) -> None:
+    """Measure one cold start and print the results as JSON."""
+    process_start = time.perf_counter()
+    import app.main  # noqa: F401
+
+    results: Dict[str, Any] = {
+        "import": time.perf_counter() - process_start,
+        "eager_modules": [name for name in LAZY_MODULES if name in sys.modules]
+    }
+    results.update(asyncio.run(_start_and_wait(process_start, timeout)))
+    print(json.dumps(results))
+
+
+def _child_env() -> Dict[str, str]:
+    env = dict(os.environ)
+    env.setdefault("GEMINI_API_KEY", "benchmark")
+    # Keep stdout for the results
+    env["ACCESS_LOG_ENABLED"] = "false"
+    env["DEBUG"] = "false"
+    return env
+
+
+def measure_cold_start(timeout: float) -> Dict[str, Any]:
+    """Run one cold start in a fresh interpreter."""
+    completed = subprocess.run(
+        [sys.executable, "-m", "benchmarks.startup_bench", "--child", "--timeout", str(timeout)],
+        cwd=BACKEND_DIR,
+        env=_child_env(),
+        capture_output=True,
+        text=True
+    )
+    if completed.returncode != 0:
+        raise SystemExit(f"Cold start failed:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def import_cost_by_package() -> Dict[str, float]:
+    """
+    Seconds spent importing each top-level package during ``import app.main``.
+
+    Returns:
+        Package name to self time of all its modules, most expensive first
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND_DIR,
+        env=_child_env(),
+        capture_output=True,
+        text=True
+    )
+    costs: Dict[str, float] = {}
+    for line in completed.stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+\d+ \|\s+(\S+)", line)
+        if match is None:
+            continue
+        package = match.group(2).split(".")[0]
+        costs[package] = costs.get(package, 0.0) + int(match.group(1)) / 1e6
+    return dict(sorted(costs.items(), key=lambda item: item[1], reverse=True))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Cold starts to measure")
+    parser.add_argument("--top", type=int, default=10, help="Packages listed by import cost")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Seconds to wait for readiness")
+    parser.add_argument("--max-import", type=float, help="Fail when the median import time exceeds this")
+    parser.add_argument("--max-ready", type=float, help="Fail when the median time to ready exceeds this")
+    parser.add_argument("--output", help="Also write the results as JSON to this file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.timeout)
+        return
+
+    runs: List[Dict[str, Any]] = []
+    for index in range(args.runs):
+        runs.append(measure_cold_start(args.timeout))
+        print(f"run {index + 1}/{args.runs}: ready in {runs[-1]['ready']:.3f}s", file=sys.stderr)
+
+    medians = {
+        metric: statistics.median(run[metric] for run in runs)
+        for metric in METRICS + ["warm_up"]
+        if all(run.get(metric) is not None for run in runs)
+    }
+    print(f"\n{'metric':<16}{'median':>10}{'min':>10}{'max':>10}", file=sys.stderr)
+    for metric in medians:
+        values = [run[metric] for run in runs]
+        print(
+            f"{metric:<16}{medians[metric]:>9.3f}s{min(values):>9.3f}s{max(values):>9.3f}s",
+            file=sys.stderr
+        )
+
+    costs = import_cost_by_package()
+    print(f"\n{'package':<24}{'import':>10}", file=sys.stderr)
+    for package, cost in list(costs.items())[:args.top]:
+        print(f"{package:<24}{cost * 1000:>8.1f}ms", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"medians": medians, "runs": runs, "import_cost": costs}, f, indent=2)
+
+    failures = []
+    eager = sorted({name for run in runs for name in run["eager_modules"]})
+    if eager:
+        failures.append(f"imported by app.main but should be lazy: {', '.join(eager)}")
+    budgets: Dict[str, Optional[float]] = {"import": args.max_import, "ready": args.max_ready}
+    for metric, budget in budgets.items():
+        if budget is not None and medians[metric] > budget:
+            failures.append(f"{metric} took {medians[metric]:.3f}s, budget {budget:.3f}s")
+    if failures:
+        print("\n" + "\n".join(failures), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+import os
+
+# Settings are read on import and need an API key; tests never call out
+os.environ.setdefault("GEMINI_API_KEY", "test")
@@ -0,0 +1,119 @@
+import base64
+import random
+from io import BytesIO
+from typing import List
+
+import pytest
+from PIL import Image, ImageChops
+
+from app.utils import image as image_utils
+from app.utils.image import (
+    RESIZE_QUALITY_TIERS,
+    decode_base64_image,
+    draft_for_downscale,
+    resize_image_if_needed
+)
+
+
+@pytest.fixture(scope="module")
+def noise_image() -> Image.Image:
+    """Detailed image, so every resampling shortcut shows in the result."""
+    width, height = 2048, 1536
+    return Image.frombytes("RGB", (width, height), random.Random(0).randbytes(width * height * 3))
+
+
+@pytest.fixture
+def reduce_factors(monkeypatch: pytest.MonkeyPatch) -> List[int]:
+    """Record the factor of every Image.reduce() call."""
+    factors: List[int] = []
+    reduce = Image.Image.reduce
+    
+    def recording_reduce(self: Image.Image, factor: int, *args, **kwargs) -> Image.Image:
+        factors.append(factor)
+        return reduce(self, factor, *args, **kwargs)
+    
+    monkeypatch.setattr(Image.Image, "reduce", recording_reduce)
+    return factors
+
+
+def test_resize_quality_tiers_differ(noise_image: Image.Image) -> None:
+    resized = {
+        quality: resize_image_if_needed(noise_image.copy(), 256, quality)
+        for quality in RESIZE_QUALITY_TIERS
+    }
+    
+    assert {image.size for image in resized.values()} == {(256, 192)}
+    for first, second in [("fast", "balanced"), ("balanced", "best"), ("fast", "best")]:
+        difference = ImageChops.difference(resized[first], resized[second])
+        assert difference.getbbox() is not None, f"{first} and {second} produced the same image"
+
+
+@pytest.mark.parametrize("quality, expected_factors", [
+    ("fast", [2]),
+    ("balanced", [2]),
+    ("best", []),
+])
+def test_resize_reduces_before_resampling(
+    reduce_factors: List[int],
+    quality: str,
+    expected_factors: List[int]
+) -> None:
+    # Downscale by less than twice the balanced gap, like 6000x4000 to 2048
+    image = Image.new("RGB", (3000, 2000))
+    
+    resized = resize_image_if_needed(image, 1024, quality)
+    
+    assert resized.size == (1024, 682)
+    assert reduce_factors == expected_factors
+
+
+def test_resize_never_reduces_below_target(reduce_factors: List[int]) -> None:
+    resize_image_if_needed(Image.new("RGB", (1900, 1000)), 1024, "balanced")
+    
+    assert reduce_factors == []
+
+
+@pytest.mark.parametrize("quality, expected_size", [
+    ("fast", (1500, 1000)),
+    ("balanced", (1500, 1000)),
+    ("best", (3000, 2000)),
+])
+def test_draft_scales_jpeg_while_decoding(quality: str, expected_size: tuple) -> None:
+    buffer = BytesIO()
+    Image.new("RGB", (3000, 2000)).save(buffer, format="JPEG")
+    image = Image.open(buffer)
+    
+    draft_for_downscale(image, 1024, quality)
+    image.load()
+    
+    assert image.size == expected_size
+
+
+def test_resize_skips_small_images() -> None:
+    image = Image.new("RGB", (100, 80))
+    
+    assert resize_image_if_needed(image, 256, "balanced") is image
+
+
+def test_resize_rejects_unknown_quality() -> None:
+    with pytest.raises(ValueError):
+        resize_image_if_needed(Image.new("RGB", (100, 80)), 256, "lossless")
+
+
+@pytest.mark.parametrize("encode", [
+    lambda data: base64.b64encode(data).decode(),
+    lambda data: "data:image/png;base64," + base64.b64encode(data).decode(),
+    lambda data: "data:image/png;base64," + base64.encodebytes(data).decode()
+], ids=["bare", "data_url", "data_url_wrapped"])
+def test_decode_base64_image_across_chunks(monkeypatch: pytest.MonkeyPatch, encode) -> None:
+    monkeypatch.setattr(image_utils, "BASE64_DECODE_CHUNK_LENGTH", 64)
+    data = b"\x89PNG\r\n\x1a\n" + random.Random(0).randbytes(1000)
+
+    assert decode_base64_image(encode(data)) == data
+
+
+def test_decode_base64_image_rejects_truncated_payload() -> None:
+    payload = base64.b64encode(b"\x89PNG\r\n\x1a\n" + bytes(100)).decode()
+
+    with pytest.raises(ValueError):
+        decode_base64_image("data:image/png;base64," + payload[:-1])
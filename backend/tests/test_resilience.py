@@ -0,0 +1,156 @@
+import asyncio
+import time
+from typing import Any, Dict
+
+import pytest
+from google.genai import errors
+
+from app.services.admission import AdmissionController, AdmissionRejected
+from app.services.coalescing import SingleFlight
+from app.services.resilience import DeadlineExceeded, LatencyTracker, UpstreamCaller
+from benchmarks.fake_gemini import FakeModels
+
+
+@pytest.fixture
+def models() -> FakeModels:
+    return FakeModels(latency=0.0, output_size=3000, seed=0)
+
+
+def make_caller(**kwargs: Any) -> UpstreamCaller:
+    options: Dict[str, Any] = {
+        "timeout": 5.0,
+        "max_retries": 2,
+        "base_delay": 0.01,
+        "max_delay": 0.01,
+        "hedge_enabled": False
+    }
+    options.update(kwargs)
+    return UpstreamCaller(**options)
+
+
+def failing_first(models: FakeModels, failures: int):
+    """Attempt whose first failures generations fail with a 503."""
+    async def attempt() -> Any:
+        models.error_rate = 1.0 if models.calls < failures else 0.0
+        return await models.generate_content(model="fake", contents="hi")
+    return attempt
+
+
+def test_transient_error_is_retried_until_success(models: FakeModels) -> None:
+    caller = make_caller()
+
+    response, stats = asyncio.run(caller.call(failing_first(models, 2)))
+
+    assert response.candidates
+    assert stats["attempts"] == 3
+    assert models.calls == 3
+    assert models.errors == 2
+
+
+def test_last_error_is_raised_once_retries_are_exhausted(models: FakeModels) -> None:
+    caller = make_caller()
+
+    with pytest.raises(errors.ServerError):
+        asyncio.run(caller.call(failing_first(models, 10)))
+
+    assert models.calls == 3
+
+
+def test_slow_upstream_is_cut_off_at_the_deadline(models: FakeModels) -> None:
+    models.latency = 5.0
+    caller = make_caller(timeout=0.1)
+    start_time = time.perf_counter()
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(caller.call(failing_first(models, 0)))
+
+    assert time.perf_counter() - start_time < 1.0
+    assert models.calls == 1
+
+
+def test_hedged_request_wins_and_the_slow_one_is_cancelled(models: FakeModels) -> None:
+    tracker = LatencyTracker()
+    tracker.record(0.05)
+    caller = make_caller(hedge_enabled=True, hedge_min_samples=1, latency_tracker=tracker)
+    cancelled = []
+
+    async def attempt() -> Any:
+        # Only the first request is slow
+        models.latency = 5.0 if models.calls == 0 else 0.0
+        try:
+            return await models.generate_content(model="fake", contents="hi")
+        except asyncio.CancelledError:
+            cancelled.append(models.latency)
+            raise
+
+    async def scenario() -> Dict[str, Any]:
+        _, stats = await caller.call(attempt)
+        # Let the cancelled loser unwind
+        await asyncio.sleep(0)
+        return stats
+
+    start_time = time.perf_counter()
+    stats = asyncio.run(scenario())
+
+    assert stats["hedged"]
+    assert stats["attempts"] == 1
+    assert models.calls == 2
+    assert len(cancelled) == 1
+    assert time.perf_counter() - start_time < 1.0
+
+
+def test_admission_rejections_do_not_leak_slots() -> None:
+    controller = AdmissionController(
+        initial_limit=1,
+        min_limit=1,
+        max_limit=1,
+        max_queue_size=1,
+        max_queue_wait=0.05
+    )
+
+    async def scenario() -> None:
+        async with controller.admit():
+            queued = asyncio.ensure_future(controller.acquire())
+            await asyncio.sleep(0)
+            assert controller.queue_depth == 1
+
+            with pytest.raises(AdmissionRejected) as full:
+                await controller.acquire()
+            assert full.value.status_code == 429
+
+            with pytest.raises(AdmissionRejected) as timed_out:
+                await queued
+            assert timed_out.value.status_code == 503
+
+    asyncio.run(scenario())
+
+    assert controller.in_flight == 0
+    assert controller.queue_depth == 0
+    assert controller.rejected == 1
+    assert controller.timed_out == 1
+
+
+def test_follower_survives_cancellation_of_the_leader(models: FakeModels) -> None:
+    models.latency = 0.05
+    flight = SingleFlight()
+
+    def generate() -> Any:
+        return models.generate_content(model="fake", contents="hi")
+
+    async def scenario() -> None:
+        leader = asyncio.ensure_future(flight.run("key", generate))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.run("key", generate))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        response, shared = await follower
+
+        assert leader.cancelled()
+        assert shared
+        assert response.candidates
+
+    asyncio.run(scenario())
+
+    assert models.calls == 1
+    assert flight.in_flight == 0
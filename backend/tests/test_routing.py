@@ -0,0 +1,92 @@
+import asyncio
+from typing import Any, List, Tuple
+
+import pytest
+from google.genai import errors
+
+from app.services.routing import RoutingPool, UpstreamBackend
+from benchmarks.fake_gemini import FakeGeminiClient
+
+MODEL = "fake-model"
+COOLDOWN = 0.2
+
+
+@pytest.fixture
+def pool() -> Tuple[RoutingPool, List[FakeGeminiClient]]:
+    fakes = [FakeGeminiClient(latency=0.05, output_size=3000, seed=index) for index in range(2)]
+    backends = [
+        UpstreamBackend(f"key{index}", lambda fake=fake: fake)
+        for index, fake in enumerate(fakes)
+    ]
+    return RoutingPool(backends, [MODEL], cooldown=COOLDOWN), fakes
+
+
+def generate(client: Any) -> Any:
+    return client.aio.models.generate_content(model=MODEL, contents="hi")
+
+
+def open_stream(client: Any) -> Any:
+    return client.aio.models.generate_content_stream(model=MODEL, contents="hi")
+
+
+def test_concurrent_calls_alternate_between_keys(pool) -> None:
+    routing_pool, fakes = pool
+
+    async def scenario() -> None:
+        await asyncio.gather(*(routing_pool.call(MODEL, generate) for _ in range(4)))
+
+    asyncio.run(scenario())
+
+    assert [fake.aio.models.calls for fake in fakes] == [2, 2]
+    assert all(backend.route(MODEL).in_flight == 0 for backend in routing_pool.backends)
+
+
+def test_rate_limited_key_is_skipped_until_its_cooldown_ends(pool) -> None:
+    routing_pool, fakes = pool
+    limited = fakes[0].aio.models
+    limited.rate_limit = 1
+
+    async def scenario() -> None:
+        # Use up the quota of the first key outside the pool
+        await generate(fakes[0])
+        with pytest.raises(errors.ClientError):
+            await routing_pool.call(MODEL, generate)
+
+        for _ in range(3):
+            await routing_pool.call(MODEL, generate)
+        assert fakes[1].aio.models.calls == 3
+
+        await asyncio.sleep(COOLDOWN)
+        limited.rate_limit = 0
+        await routing_pool.call(MODEL, generate)
+
+    asyncio.run(scenario())
+
+    route = routing_pool.backends[0].route(MODEL)
+    assert route.rate_limited == 1
+    assert limited.calls == 3
+
+
+def test_stream_holds_its_route_until_closed(pool) -> None:
+    routing_pool, fakes = pool
+    first, second = routing_pool.backends
+
+    async def scenario() -> None:
+        stream = await routing_pool.open_stream(MODEL, open_stream)
+        await stream.__anext__()
+        assert first.route(MODEL).in_flight == 1
+
+        # The open stream counts as load, so the next one goes elsewhere
+        other = await routing_pool.open_stream(MODEL, open_stream)
+        assert second.route(MODEL).in_flight == 1
+        async for _ in other:
+            pass
+        assert second.route(MODEL).in_flight == 0
+        assert second.route(MODEL).latency_ewma is not None
+
+        assert first.route(MODEL).in_flight == 1
+        await stream.aclose()
+        assert first.route(MODEL).in_flight == 0
+        assert first.route(MODEL).latency_ewma is None
+
+    asyncio.run(scenario())
@@ -0,0 +1,113 @@
+import asyncio
+from typing import Any, Dict, Iterable, Optional
+
+import pytest
+from starlette.requests import Request
+
+from app.utils.uploads import UploadRejected, parse_upload_form
+
+BOUNDARY = "test-boundary"
+CHUNK_SIZE = 65536
+MAX_FILE_SIZE = 1048576
+
+
+class StreamedRequest:
+    """Request whose body arrives in chunks, counting what was read."""
+
+    def __init__(self, chunks: Iterable[bytes], content_length: Optional[int] = None):
+        self.chunks = iter(chunks)
+        self.received = 0
+        headers = [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())]
+        if content_length is not None:
+            headers.append((b"content-length", str(content_length).encode()))
+        self.request = Request({"type": "http", "method": "POST", "headers": headers}, self.receive)
+
+    async def receive(self) -> Dict[str, Any]:
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            return {"type": "http.request", "body": b"", "more_body": False}
+        self.received += len(chunk)
+        return {"type": "http.request", "body": chunk, "more_body": True}
+
+
+def part(name: str, content: bytes, filename: Optional[str] = None) -> bytes:
+    disposition = f'form-data; name="{name}"'
+    if filename is not None:
+        disposition += f'; filename="{filename}"'
+    return f"--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n\r\n".encode() + content + b"\r\n"
+
+
+def streamed_file(filename: str, size: int) -> Iterable[bytes]:
+    """Body with a prompt field, then one file of size bytes sent in chunks."""
+    yield part("prompt", b"hi")
+    yield f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="context_images"; filename="{filename}"\r\n\r\n'.encode()
+    for _ in range(size // CHUNK_SIZE):
+        yield b"\0" * CHUNK_SIZE
+    yield f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def parse(streamed: StreamedRequest, max_files: int = 2) -> Any:
+    return asyncio.run(parse_upload_form(
+        streamed.request,
+        max_file_size=MAX_FILE_SIZE,
+        allowed_extensions=["png", "jpg"],
+        max_files=max_files
+    ))
+
+
+def test_parses_fields_and_files() -> None:
+    body = part("prompt", b"hi") + part("context_images", b"\x89PNG data", "a.png") + f"--{BOUNDARY}--\r\n".encode()
+    streamed = StreamedRequest([body], content_length=len(body))
+
+    form = parse(streamed)
+
+    assert form["prompt"] == "hi"
+    file = form["context_images"]
+    assert file.filename == "a.png"
+    assert asyncio.run(file.read()) == b"\x89PNG data"
+    asyncio.run(form.close())
+
+
+def test_oversized_file_is_rejected_while_streaming() -> None:
+    streamed = StreamedRequest(streamed_file("big.png", 40 * MAX_FILE_SIZE))
+
+    with pytest.raises(UploadRejected) as error:
+        parse(streamed)
+
+    assert error.value.status_code == 413
+    assert streamed.received < MAX_FILE_SIZE + 2 * CHUNK_SIZE
+
+
+def test_disallowed_extension_is_rejected_before_the_file_is_read() -> None:
+    streamed = StreamedRequest(streamed_file("payload.exe", 20 * MAX_FILE_SIZE))
+
+    with pytest.raises(UploadRejected) as error:
+        parse(streamed)
+
+    assert error.value.status_code == 415
+    assert streamed.received < 2 * CHUNK_SIZE
+
+
+def test_body_without_content_length_is_capped() -> None:
+    # Fields each within their limit, together over the body cap
+    def chunks() -> Iterable[bytes]:
+        for index in range(100):
+            yield part(f"field{index}", b"x" * 60000)
+
+    streamed = StreamedRequest(chunks())
+
+    with pytest.raises(UploadRejected) as error:
+        parse(streamed, max_files=0)
+
+    assert error.value.status_code == 413
+    assert streamed.received < 1048576 + 2 * 60000
+
+
+def test_declared_content_length_over_the_cap_is_rejected_up_front() -> None:
+    streamed = StreamedRequest(streamed_file("a.png", MAX_FILE_SIZE), content_length=10 * MAX_FILE_SIZE)
+
+    with pytest.raises(UploadRejected) as error:
+        parse(streamed)
+
+    assert error.value.status_code == 413
+    assert streamed.received == 0
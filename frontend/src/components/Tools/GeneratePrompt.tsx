@@ -48,6 +48,63 @@ const GeneratePrompt: React.FC = () => {
     });
   };
 
+  // Keep a local copy of a generated image: its URL stops working once the
+  // backend evicts it or when another server instance answers
+  const base64ToObjectUrl = (base64: string): string => {
+    const binary = atob(base64);
+    const bytes = new Uint8Array(binary.length);
+    for (let i = 0; i < binary.length; i++) {
+      bytes[i] = binary.charCodeAt(i);
+    }
+    return URL.createObjectURL(new Blob([bytes], { type: 'image/png' }));
+  };
+
+  const fetchLocalCopy = async (url: string): Promise<string> => {
+    const response = await fetch(url);
+    if (!response.ok) {
+      throw new Error(`Failed to fetch generated image: ${response.status}`);
+    }
+    return URL.createObjectURL(await response.blob());
+  };
+
+  const requestGeneration = async (reuseStoredImages: boolean) => {
+    // Images still stored by the backend are referenced by ID, the rest
+    // are sent as base64
+    const contextImageIds: string[] = [];
+    const contextImagesBase64: string[] = [];
+    for (const img of selectedImages) {
+      if (reuseStoredImages && img.serverImageId) {
+        contextImageIds.push(img.serverImageId);
+        continue;
+      }
+      try {
+        const base64 = await imageToBase64(img.url);
+        contextImagesBase64.push(base64);
+      } catch (err) {
+        console.error(`Failed to convert image ${img.id} to base64:`, err);
+      }
+    }
+    
+    // Prepare request body
+    const requestBody = {
+      prompt: prompt,
+      context_images: contextImagesBase64.length > 0 ? contextImagesBase64 : undefined,
+      context_image_ids: contextImageIds.length > 0 ? contextImageIds : undefined,
+      settings: {
+        temperature: 0.8
+      }
+    };
+    
+    // Call backend API
+    return fetch(`${API_URL}/api/generate`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify(requestBody),
+    });
+  };
+
   const handleGenerate = async () => {
     if (!prompt.trim()) return;
     
@@ -55,44 +112,25 @@ const GeneratePrompt: React.FC = () => {
     setError(null);
     
     try {
-      // Convert selected images to base64
-      const contextImagesBase64: string[] = [];
-      for (const img of selectedImages) {
-        try {
-          const base64 = await imageToBase64(img.url);
-          contextImagesBase64.push(base64);
-        } catch (err) {
-          console.error(`Failed to convert image ${img.id} to base64:`, err);
-        }
+      let response = await requestGeneration(true);
+      if (response.status === 404) {
+        // A referenced image expired from the backend store; send them all
+        response = await requestGeneration(false);
       }
       
-      // Prepare request body
-      const requestBody = {
-        prompt: prompt,
-        context_images: contextImagesBase64.length > 0 ? contextImagesBase64 : undefined,
-        settings: {
-          temperature: 0.8
-        }
-      };
-      
-      // Call backend API
-      const response = await fetch(`${API_URL}/api/generate`, {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify(requestBody),
-      });
-      
       const data = await response.json();
       
       if (!response.ok) {
         throw new Error(data.error || `HTTP error! status: ${response.status}`);
       }
       
-      if (data.success && data.image) {
-        // Convert base64 to data URL and add to workbench at the right-click position
-        const imageDataUrl = `data:image/png;base64,${data.image}`;
+      if (data.success && (data.image_url || data.image)) {
+        // Keep a local copy, from the inline image when the response has
+        // one so it is not downloaded twice, and add it to the workbench at
+        // the right-click position
+        const imageDataUrl = data.image
+          ? base64ToObjectUrl(data.image)
+          : await fetchLocalCopy(`${API_URL}${data.image_url}`);
         
         // Create generation context with the IDs of images used as context
         const generationContext = selectedImageIds.length > 0 ? {
@@ -101,7 +139,12 @@ const GeneratePrompt: React.FC = () => {
           prompt: prompt
         } : undefined;
         
-        addImageFromUrl(imageDataUrl, contextMenuCanvasPosition || undefined, generationContext);
+        addImageFromUrl(
+          imageDataUrl,
+          contextMenuCanvasPosition || undefined,
+          generationContext,
+          data.image_id || undefined
+        );
         
         // Clear the saved position after using it
         setContextMenuCanvasPosition(null);
@@ -28,7 +28,7 @@ interface WorkbenchState {
   setIsPanning: (panning: boolean) => void;
   setSpacePressed: (pressed: boolean) => void;
   addImage: (file: File, position?: Position) => void;
-  addImageFromUrl: (url: string, position?: Position, generationContext?: GenerationContext) => void;
+  addImageFromUrl: (url: string, position?: Position, generationContext?: GenerationContext, serverImageId?: string) => void;
   toggleFlowConnections: () => void;
   removeImage: (id: string) => void;
   updateImagePosition: (id: string, position: Position) => void;
@@ -56,6 +56,15 @@ interface WorkbenchState {
   closePromptViewer: () => void;
 }
 
+// Free the local copies (object URLs) of removed generated images
+const revokeLocalUrls = (images: WorkbenchImage[]) => {
+  images.forEach(img => {
+    if (img.url.startsWith('blob:')) {
+      URL.revokeObjectURL(img.url);
+    }
+  });
+};
+
 export const useWorkbenchStore = create<WorkbenchState>((set) => ({
   images: [],
   activeTool: 'select',
@@ -123,7 +132,7 @@ export const useWorkbenchStore = create<WorkbenchState>((set) => ({
     reader.readAsDataURL(file);
   },
   
-  addImageFromUrl: (url, position, generationContext) => {
+  addImageFromUrl: (url, position, generationContext, serverImageId) => {
     const id = uuidv4();
     const img = new Image();
     img.onload = () => {
@@ -148,7 +157,8 @@ export const useWorkbenchStore = create<WorkbenchState>((set) => ({
           selected: false,
           selectionAreas: [],
           zIndex: state.images.length,
-          generationContext
+          generationContext,
+          serverImageId
         }]
       }));
     };
@@ -156,10 +166,13 @@ export const useWorkbenchStore = create<WorkbenchState>((set) => ({
   },
   
   removeImage: (id) => {
-    set((state) => ({
-      images: state.images.filter(img => img.id !== id),
-      selectedImageIds: state.selectedImageIds.filter(sid => sid !== id)
-    }));
+    set((state) => {
+      revokeLocalUrls(state.images.filter(img => img.id === id));
+      return {
+        images: state.images.filter(img => img.id !== id),
+        selectedImageIds: state.selectedImageIds.filter(sid => sid !== id)
+      };
+    });
   },
   
   updateImagePosition: (id, position) => {
@@ -308,10 +321,13 @@ export const useWorkbenchStore = create<WorkbenchState>((set) => ({
   },
   
   deleteSelected: () => {
-    set((state) => ({
-      images: state.images.filter(img => !state.selectedImageIds.includes(img.id)),
-      selectedImageIds: []
-    }));
+    set((state) => {
+      revokeLocalUrls(state.images.filter(img => state.selectedImageIds.includes(img.id)));
+      return {
+        images: state.images.filter(img => !state.selectedImageIds.includes(img.id)),
+        selectedImageIds: []
+      };
+    });
   },
   
   setShowGenerateModal: (show) => set({ showGenerateModal: show }),
@@ -41,6 +41,7 @@ export interface WorkbenchImage {
   isCropping?: boolean;       // Whether in crop mode
   isCropped?: boolean;        // Whether image is currently cropped
   generationContext?: GenerationContext; // Track AI generation relationships
+  serverImageId?: string;     // ID in the backend image store, reused as generation context
 }
 
 export type Tool = 'select' | 'hand' | 'add' | 'generate' | 'selectArea';